@@ -0,0 +1,227 @@
+"""
+Benchmark the throughput of check mode on synthetic vaults
+
+Times CheckMode._check_dir, CheckMode._check_file and
+CheckMode._fix_doc_errors at a few scales (see SCALES, the vaults are
+generated with benchmarks.vault) and reports the files and megabytes
+checked per second. The results are compared with the stored baselines,
+a benchmark that is more than --tolerance slower is reported as a
+regression (and the exit code is 1).
+
+The baselines depend on the machine they are measured on, save new
+baselines (--save) before comparing changes on another machine. Fixing
+mostly writes files, so the fix_doc_errors benchmarks depend a lot on the
+file system and are more noisy than the others.
+
+Usage: python -m benchmarks.check_mode [--scale NAME] [--repeat N]
+                                       [--baselines PATH] [--save]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import TypedDict
+
+from benchmarks.vault import generate_vault
+from benchmarks.vault import vault_spec
+from benchmarks.vault import VaultSpec
+from notesystem.modes.check_mode.check_mode import CheckMode
+from notesystem.modes.check_mode.errors.base_errors import DocumentErrors
+
+BASELINES_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'baselines.json',
+)
+
+# The vaults the benchmarks are run on
+SCALES: Dict[str, VaultSpec] = {
+    'small': vault_spec(n_files=100, n_lines=50),
+    'many-files': vault_spec(n_files=1000, n_lines=50),
+    'large-files': vault_spec(n_files=10, n_lines=5000),
+}
+
+# Fast benchmarks are repeated until they ran for at least this long (in
+# seconds), so that the best time is not just noise
+MIN_TOTAL_TIME = 1.0
+
+
+class Result(TypedDict):
+    files_per_s: float
+    mb_per_s: float
+
+
+def _measure(
+    fn: Callable[[], object],
+    n_files: int,
+    n_bytes: int,
+    repeat: int,
+    setup: Callable[[], object] = lambda: None,
+) -> Result:
+    """Runs fn (after setup) and returns the best throughput
+
+    fn is run at least repeat times and at least MIN_TOTAL_TIME seconds.
+    """
+    times: List[float] = []
+    while len(times) < repeat or sum(times) < MIN_TOTAL_TIME:
+        setup()
+        times.append(timeit.timeit(fn, number=1))
+    best = min(times)
+    return Result(
+        files_per_s=round(n_files / best, 2),
+        mb_per_s=round(n_bytes / best / 1e6, 3),
+    )
+
+
+def run_scale(scale: str, spec: VaultSpec, repeat: int) -> Dict[str, Result]:
+    """Runs the benchmarks on a generated vault
+
+    Arguments:
+        scale {str}      -- The name of the scale (used in the names of the
+                            benchmarks)
+        spec {VaultSpec} -- The vault to generate
+        repeat {int}     -- How often every benchmark is run
+
+    Returns:
+        {Dict[str, Result]} -- The result of every benchmark
+
+    """
+    results: Dict[str, Result] = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vault_dir = os.path.join(tmp_dir, 'vault')
+        file_paths = generate_vault(vault_dir, spec)
+        n_files = len(file_paths)
+        n_bytes = sum(os.path.getsize(fp) for fp in file_paths)
+
+        results[f'check_dir/{scale}'] = _measure(
+            lambda: CheckMode()._check_dir(vault_dir),
+            n_files, n_bytes, repeat,
+        )
+
+        def check_files() -> List[DocumentErrors]:
+            check_mode = CheckMode()
+            return [check_mode._check_file(fp) for fp in file_paths]
+        results[f'check_file/{scale}'] = _measure(
+            check_files, n_files, n_bytes, repeat,
+        )
+
+        # The files are fixed in a copy of the vault, which is restored
+        # before every run
+        doc_errors = check_files()
+        fix_dir = os.path.join(tmp_dir, 'fix')
+        fix_errors = [
+            DocumentErrors(
+                file_path=os.path.join(
+                    fix_dir, os.path.relpath(d['file_path'], vault_dir),
+                ),
+                errors=d['errors'],
+            )
+            for d in doc_errors
+        ]
+
+        def restore() -> None:
+            shutil.rmtree(fix_dir, ignore_errors=True)
+            shutil.copytree(vault_dir, fix_dir)
+
+        def fix_files() -> None:
+            check_mode = CheckMode()
+            for d in fix_errors:
+                check_mode._fix_doc_errors(d)
+        results[f'fix_doc_errors/{scale}'] = _measure(
+            fix_files, n_files, n_bytes, repeat, setup=restore,
+        )
+    return results
+
+
+def load_baselines(path: str) -> Dict[str, Result]:
+    try:
+        with open(path, 'r', encoding='utf-8') as baselines_file:
+            return json.load(baselines_file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baselines(path: str, results: Dict[str, Result]) -> None:
+    baselines = load_baselines(path)
+    baselines.update(results)
+    with open(path, 'w', encoding='utf-8') as baselines_file:
+        json.dump(baselines, baselines_file, indent=2, sort_keys=True)
+        baselines_file.write('\n')
+
+
+def compare(
+    results: Dict[str, Result],
+    baselines: Dict[str, Result],
+    tolerance: float,
+) -> List[str]:
+    """Prints the results and the change compared to the baselines
+
+    Returns:
+        {List[str]} -- The benchmarks that are slower than the baseline
+                       by more than the tolerance
+
+    """
+    regressions: List[str] = []
+    print(
+        f"{'benchmark':<28} {'files/s':>10} {'MB/s':>8} "
+        f"{'baseline':>10} {'change':>8}",
+    )
+    for name, result in results.items():
+        line = (
+            f"{name:<28} {result['files_per_s']:10.1f} "
+            f"{result['mb_per_s']:8.2f}"
+        )
+        baseline = baselines.get(name)
+        if baseline is not None:
+            change = result['files_per_s'] / baseline['files_per_s'] - 1
+            line += f" {baseline['files_per_s']:10.1f} {change:+8.1%}"
+            if change < -tolerance:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.check_mode',
+        description='benchmark the throughput of check mode',
+    )
+    parser.add_argument(
+        '--scale', action='append', choices=list(SCALES),
+        help='the scale to run (can be repeated). Default: all scales',
+    )
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baselines', default=BASELINES_PATH)
+    parser.add_argument(
+        '--save', action='store_true',
+        help='store the results as the new baselines',
+    )
+    parser.add_argument(
+        '--tolerance', type=float, default=0.2,
+        help='the slowdown (0.2 is 20%%) that is reported as a regression',
+    )
+    args = parser.parse_args(argv)
+
+    results: Dict[str, Result] = {}
+    for scale in args.scale or SCALES:
+        results.update(run_scale(scale, SCALES[scale], args.repeat))
+
+    regressions = compare(
+        results, load_baselines(args.baselines), args.tolerance,
+    )
+    if args.save:
+        save_baselines(args.baselines, results)
+        print(f'Saved the baselines to {args.baselines}')
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Benchmark the per line overhead of checking the markdown errors
+
+Compares the old way of checking (calling validate for every error on
+every line) with the RuleEngine, line by line and on the whole document
+at once (check_document). On normal notes and on code heavy notes (where
+the RuleEngine skips the lines in code blocks).
+
+Usage: python -m benchmarks.line_rules [n_lines]
+"""
+import random
+import sys
+import timeit
+from typing import Callable
+from typing import List
+
+from notesystem.modes.check_mode.check_mode import CheckMode
+from notesystem.modes.check_mode.errors.base_errors import ErrorMeta
+from notesystem.modes.check_mode.errors.markdown_errors import MarkdownError
+from notesystem.modes.check_mode.errors.markdown_errors import NewlineBeforeHeaderError  # noqa: E501
+from notesystem.modes.check_mode.errors.markdown_errors import SeperatorError
+from notesystem.modes.check_mode.rule_engine import RuleEngine
+
+LINE_KINDS = [
+    'Some text in a note, with a few words in it.\n',
+    'Some more text with $inline$ math in it.\n',
+    '\n',
+    '# A heading\n',
+    '##Wrong heading\n',
+    '- A list item\n',
+    '    - An indented list item\n',
+    '[ ] A todo\n',
+    '- [x] A correct todo\n',
+    'Wrong $$math$$ here\n',
+    '---\n',
+]
+
+CODE_BLOCK = [
+    '```c\n',
+    '#include <stdio.h>\n',
+    '\n',
+    'int main(void) {\n',
+    '    printf("hello $$ world\\n");\n',
+    '    return 0;\n',
+    '}\n',
+    '```\n',
+]
+
+
+def generate_lines(n_lines: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [rng.choice(LINE_KINDS) for _ in range(n_lines)]
+
+
+def generate_code_heavy_lines(n_lines: int, seed: int = 0) -> List[str]:
+    """Generates a note that is mostly code blocks"""
+    rng = random.Random(seed)
+    lines: List[str] = []
+    while len(lines) < n_lines:
+        lines.extend((rng.choice(LINE_KINDS[:3]), '\n', CODE_BLOCK[0]))
+        for _ in range(rng.randint(1, 8)):
+            lines.extend(CODE_BLOCK[1:-1])
+        lines.extend((CODE_BLOCK[-1], '\n'))
+    return lines[:n_lines]
+
+
+def validate_per_line(
+    rules: List[MarkdownError],
+    lines: List[str],
+) -> List[ErrorMeta]:
+    """The way the errors were checked before the RuleEngine"""
+    errors: List[ErrorMeta] = []
+    for line_nr, line in enumerate(lines):
+        for err in rules:
+            if isinstance(err, SeperatorError):
+                if line_nr == len(lines) - 1:
+                    continue
+                valid = err.validate([line, lines[line_nr + 1]])
+            elif isinstance(err, NewlineBeforeHeaderError):
+                if line_nr == 0:
+                    continue
+                valid = err.validate([lines[line_nr - 1], line])
+            else:
+                valid = err.validate([line])
+            if not valid:
+                errors.append(
+                    ErrorMeta(line_nr=line_nr, line=line, error_type=err),
+                )
+    return errors
+
+
+def _time(name: str, fn: Callable[[], object], n_lines: int) -> None:
+    best = min(timeit.repeat(fn, number=1, repeat=5))
+    print(
+        f'{name:<30} {best * 1000:8.1f} ms '
+        f'{best / n_lines * 1e9:8.0f} ns/line',
+    )
+
+
+def main() -> None:
+    n_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rules = CheckMode.possible_markdown_errors
+    engine = RuleEngine(rules)
+
+    for title, lines in (
+        ('Normal notes', generate_lines(n_lines)),
+        ('Code heavy notes', generate_code_heavy_lines(n_lines)),
+    ):
+        print(title)
+        # The RuleEngine does not check the lines in code blocks
+        assert len(validate_per_line(rules, lines)) >= len(
+            engine.check(lines),
+        )
+        _time(
+            'validate() per rule per line',
+            lambda: validate_per_line(rules, lines),
+            n_lines,
+        )
+        assert engine.check_document(lines) == engine.check(lines)
+        _time('RuleEngine', lambda: engine.check(lines), n_lines)
+        _time(
+            'RuleEngine.check_document',
+            lambda: engine.check_document(lines),
+            n_lines,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+Deterministic generator for synthetic note vaults
+
+The notes are made of paragraphs of text, headers, todos, `$$` math and
+lists. The density of every kind of line can be set, as well as the part
+of them that is written wrong (so that check mode finds errors in them).
+The same arguments (and seed) always give the same vault.
+
+Usage: python -m benchmarks.vault OUT_DIR [--files N] [--lines N] ...
+"""
+import argparse
+import os
+import random
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import TypedDict
+
+WORDS = (
+    'note', 'system', 'markdown', 'the', 'a', 'of', 'check', 'error',
+    'header', 'list', 'math', 'todo', 'pandoc', 'convert', 'file', 'line',
+    'lorem', 'ipsum', 'dolor', 'sit', 'amet', 'with', 'and', 'in', 'is',
+)
+
+
+class VaultSpec(TypedDict):
+    """Describes the notes of a synthetic vault"""
+    # The amount of notes
+    n_files: int
+    # The amount of lines per note
+    n_lines: int
+    # The (average) length of a line of text
+    line_length: int
+    # The part of the lines that are a header, todo, math or list item
+    header_density: float
+    todo_density: float
+    math_density: float
+    list_density: float
+    # The part of the headers, todos and math that is written wrong
+    error_rate: float
+    seed: int
+
+
+def vault_spec(
+    n_files: int = 100,
+    n_lines: int = 100,
+    line_length: int = 60,
+    header_density: float = 0.05,
+    todo_density: float = 0.05,
+    math_density: float = 0.02,
+    list_density: float = 0.15,
+    error_rate: float = 0.2,
+    seed: int = 0,
+) -> VaultSpec:
+    """Creates a VaultSpec, with defaults that look like real notes"""
+    return VaultSpec(
+        n_files=n_files,
+        n_lines=n_lines,
+        line_length=line_length,
+        header_density=header_density,
+        todo_density=todo_density,
+        math_density=math_density,
+        list_density=list_density,
+        error_rate=error_rate,
+        seed=seed,
+    )
+
+
+def _text(rng: random.Random, length: int) -> str:
+    words: List[str] = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words)
+
+
+def generate_note(spec: VaultSpec, rng: random.Random) -> str:
+    """Generates the content of a single note
+
+    Arguments:
+        spec {VaultSpec}     -- The description of the notes
+        rng {random.Random}  -- The random generator to use
+
+    Returns:
+        {str} -- The content of the note
+
+    """
+    header = spec['header_density']
+    todo = header + spec['todo_density']
+    math = todo + spec['math_density']
+    list_item = math + spec['list_density']
+    length = spec['line_length']
+
+    lines = [f'# {_text(rng, 20)}\n', '\n']
+    while len(lines) < spec['n_lines']:
+        kind = rng.random()
+        wrong = rng.random() < spec['error_rate']
+        text = _text(rng, rng.randint(length // 2, length * 3 // 2))
+        if kind < header:
+            level = '#' * rng.randint(1, 3)
+            if wrong:
+                lines.append(f'{level}{text[:30]}\n')
+            else:
+                lines.extend(('\n', f'{level} {text[:30]}\n', '\n'))
+        elif kind < todo:
+            done = rng.choice(('x', ' '))
+            prefix = '' if wrong else '- '
+            lines.append(f'{prefix}[{done}] {text}\n')
+        elif kind < math:
+            if wrong:
+                lines.append(f'{text[:20]} $$x^2 + y^2$$ {text[20:]}\n')
+            else:
+                lines.append(f'{text[:20]} $x^2 + y^2$ {text[20:]}\n')
+        elif kind < list_item:
+            indent = '    ' * rng.randint(0, 1)
+            lines.append(f'{indent}- {text}\n')
+        elif rng.random() < 0.2:
+            # The end of a paragraph
+            lines.extend((f'{text}\n', '\n'))
+        else:
+            lines.append(f'{text}\n')
+    return ''.join(lines[:spec['n_lines']])
+
+
+def generate_vault(out_dir: str, spec: VaultSpec) -> List[str]:
+    """Writes the notes of a synthetic vault to a directory
+
+    The notes are spread over a few sub directories, like a real vault.
+
+    Arguments:
+        out_dir {str}    -- The directory to write the notes to
+        spec {VaultSpec} -- The description of the vault
+
+    Returns:
+        {List[str]} -- The paths of the written notes
+
+    """
+    rng = random.Random(spec['seed'])
+    file_paths: List[str] = []
+    for i in range(spec['n_files']):
+        sub_dir = os.path.join(out_dir, f'topic-{i % 8}')
+        os.makedirs(sub_dir, exist_ok=True)
+        file_path = os.path.join(sub_dir, f'note-{i}.md')
+        with open(file_path, 'w', encoding='utf-8') as note_file:
+            note_file.write(generate_note(spec, rng))
+        file_paths.append(file_path)
+    return file_paths
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    defaults = vault_spec()
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.vault',
+        description='generate a synthetic vault of notes',
+    )
+    parser.add_argument('out_dir', help='the directory to write to')
+    parser.add_argument('--files', type=int, default=defaults['n_files'])
+    parser.add_argument('--lines', type=int, default=defaults['n_lines'])
+    parser.add_argument(
+        '--line-length', type=int, default=defaults['line_length'],
+    )
+    for kind in ('header', 'todo', 'math', 'list'):
+        parser.add_argument(
+            f'--{kind}-density', type=float,
+            default=defaults[f'{kind}_density'],  # type: ignore
+        )
+    parser.add_argument(
+        '--error-rate', type=float, default=defaults['error_rate'],
+    )
+    parser.add_argument('--seed', type=int, default=defaults['seed'])
+    args = parser.parse_args(argv)
+
+    spec = vault_spec(
+        n_files=args.files,
+        n_lines=args.lines,
+        line_length=args.line_length,
+        header_density=args.header_density,
+        todo_density=args.todo_density,
+        math_density=args.math_density,
+        list_density=args.list_density,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    file_paths = generate_vault(args.out_dir, spec)
+    print(f'Wrote {len(file_paths)} notes to {args.out_dir}')
+
+
+if __name__ == '__main__':
+    main()
@@ -17,8 +17,12 @@ from typing import Tuple
 
 import toml
 
+from notesystem.modes.check_mode.check_cache import CACHE_DIR_NAME
 from notesystem.modes.check_mode.check_mode import ALL_ERRORS
 from notesystem.modes.check_mode.errors.base_errors import BaseError
+from notesystem.modes.check_mode.reporters import OUTPUT_FORMATS
+from notesystem.modes.check_mode.rule_profile import PROFILE_FORMATS
+from notesystem.modes.html_engine import ENGINES
 
 CONFIG_FILE_NAME = '.notesystem'
 CONFIG_FILE_LOCATIONS = [
@@ -27,6 +31,32 @@ CONFIG_FILE_LOCATIONS = [
 ]
 
 
+def _at_least(type_: type, minimum: Any):
+    """Creates an argparse type that rejects values below the minimum
+
+    Without it a value like 0 would be treated as not set, because the
+    falsy values are replaced by the default.
+
+    """
+    def convert(value: str):
+        converted = type_(value)
+        if converted < minimum:
+            raise argparse.ArgumentTypeError(
+                f'must be at least {minimum}, got {value}',
+            )
+        return converted
+    return convert
+
+
+def _check_min(name: str, value: Any, opts: Dict) -> None:
+    """Checks the minimum of a value from the config file"""
+    if 'min' in opts and value < opts['min']:
+        raise SystemExit(
+            f"notesystem: error: {name} must be at least {opts['min']}, "
+            f'got {value}',
+        )
+
+
 class Config:
 
     def __init__(
@@ -166,6 +196,52 @@ class Config:
                     'action': 'store_true',
                     'default': False,
                 },
+                'jobs': {
+                    'value': None,
+                    'flags': ['--jobs', '-j'],
+                    'dest': 'jobs',
+                    'config_name': 'jobs',
+                    'help': 'the number of pandoc processes used to \
+                             convert the files. Default: 1',
+                    'type': int,
+                    'metavar': 'N',
+                    'default': None,
+                },
+                'pandoc_server': {
+                    'value': None,
+                    'flags': ['--pandoc-server'],
+                    'dest': 'pandoc_server',
+                    'config_name': 'pandoc_server',
+                    'help': 'convert using a (single) pandoc server instead \
+                             of starting pandoc for every file',
+                    'type': bool,
+                    'action': 'store_true',
+                    'default': False,
+                },
+                'engine': {
+                    'value': None,
+                    'flags': ['--engine'],
+                    'dest': 'engine',
+                    'config_name': 'engine',
+                    'help': 'the engine that converts the notes to html: \
+                             pandoc or mistune (built in, pandoc is only \
+                             used for what mistune can not convert). \
+                             Default: pandoc',
+                    'type': str,
+                    'choices': ENGINES,
+                    'default': 'pandoc',
+                },
+                'force': {
+                    'value': None,
+                    'flags': ['--force'],
+                    'dest': 'force',
+                    'config_name': None,  # Only command line flag
+                    'help': 'convert all the files, also the ones that \
+                             are up to date',
+                    'type': bool,
+                    'action': 'store_true',
+                    'default': False,
+                },
             },
             'check': {
                 'in_path': {
@@ -202,6 +278,117 @@ class Config:
                     'type': bool,
                     'default': False,
                 },
+                'cache': {
+                    'value': None,
+                    'flags': ['--cache'],
+                    'dest': 'cache',
+                    'config_name': 'cache',
+                    'help': 'cache the results and only check files that \
+                             changed since the last run',
+                    'action': 'store_true',
+                    'type': bool,
+                    'default': False,
+                },
+                'cache_dir': {
+                    'value': None,
+                    'flags': ['--cache-dir'],
+                    'dest': 'cache_dir',
+                    'config_name': 'cache_dir',
+                    'help': 'the directory the cache is stored in. \
+                             Default: .notesystem-cache',
+                    'type': str,
+                    'metavar': 'DIR',
+                    'default': CACHE_DIR_NAME,
+                },
+                'jobs': {
+                    'value': None,
+                    'flags': ['--jobs', '-j'],
+                    'dest': 'jobs',
+                    'config_name': 'jobs',
+                    'help': 'the number of processes used to check the \
+                             files. Default: the number of cpus',
+                    'type': int,
+                    'metavar': 'N',
+                    'default': None,
+                },
+                'watch': {
+                    'value': None,
+                    'flags': ['--watch', '-w'],
+                    'dest': 'watch',
+                    'config_name': 'watch',
+                    'help': 'enables watch mode \
+                            (checks files again when they change)',
+                    'type': bool,
+                    'action': 'store_true',
+                    'default': False,
+                },
+                'changed_since': {
+                    'value': None,
+                    'flags': ['--changed-since'],
+                    'dest': 'changed_since',
+                    'config_name': None,  # Only command line flag
+                    'help': 'only check the files (and lines) that changed \
+                             in git since the given revision',
+                    'type': str,
+                    'metavar': 'REV',
+                    'default': None,
+                },
+                'staged': {
+                    'value': None,
+                    'flags': ['--staged'],
+                    'dest': 'staged',
+                    'config_name': None,  # Only command line flag
+                    'help': 'only check the files (and lines) that are \
+                             staged in git',
+                    'type': bool,
+                    'action': 'store_true',
+                    'default': False,
+                },
+                'output_format': {
+                    'value': None,
+                    'flags': ['--format'],
+                    'dest': 'output_format',
+                    'config_name': 'format',
+                    'help': 'the output format: text, jsonl, sarif or \
+                             checkstyle. Default: text',
+                    'type': str,
+                    'choices': OUTPUT_FORMATS,
+                    'default': 'text',
+                },
+                'fail_fast': {
+                    'value': None,
+                    'flags': ['--fail-fast'],
+                    'dest': 'fail_fast',
+                    'config_name': 'fail_fast',
+                    'help': 'stop checking after the first file with \
+                             errors (same as --max-errors 1)',
+                    'type': bool,
+                    'action': 'store_true',
+                    'default': False,
+                },
+                'max_errors': {
+                    'value': None,
+                    'flags': ['--max-errors'],
+                    'dest': 'max_errors',
+                    'config_name': 'max_errors',
+                    'help': 'stop checking after the file in which the Nth \
+                             error is found and exit with an error',
+                    'type': int,
+                    'min': 1,
+                    'metavar': 'N',
+                    'default': None,
+                },
+                'profile_rules': {
+                    'value': None,
+                    'flags': ['--profile-rules'],
+                    'dest': 'profile_rules',
+                    'config_name': 'profile_rules',
+                    'help': 'print the time spent per error (and reading \
+                             the files) to stderr, as a table or json',
+                    'type': str,
+                    'choices': PROFILE_FORMATS,
+                    'default': None,
+                },
             },
             'search': {
                 'pattern': {
@@ -285,6 +472,30 @@ class Config:
                     'type': bool,
                 },
             },
+            'lsp': {
+                'disabled_errors': [
+                    self._create_option_disabled_error(error)
+                    for error in ALL_ERRORS
+                ],
+            },
+            'daemon': {
+                'socket': {
+                    'value': None,
+                    'flags': ['--socket'],
+                    'dest': 'socket',
+                    'config_name': 'socket',
+                    'help': 'the path of the socket to listen on. \
+                             Default: notesystem-<uid>.sock in \
+                             $XDG_RUNTIME_DIR (or the temp directory)',
+                    'type': str,
+                    'metavar': 'PATH',
+                    'default': None,
+                },
+                'disabled_errors': [
+                    self._create_option_disabled_error(error)
+                    for error in ALL_ERRORS
+                ],
+            },
             'upload': {
                 'path': {
                     'value': None,
@@ -367,6 +578,20 @@ class Config:
 
         upload_parser.set_defaults(mode='upload')
 
+        lsp_parser = mode_parser.add_parser(
+            'lsp',
+            help='start a language server (over stdio) that checks \
+                 markdown files while editing',
+        )
+        lsp_parser.set_defaults(mode='lsp')
+
+        daemon_parser = mode_parser.add_parser(
+            'daemon',
+            help='keep checking notes in the background, the checks are \
+                 requested using notesystem-client',
+        )
+        daemon_parser.set_defaults(mode='daemon')
+
         # Parse the OPTIONS dict and create the argparser
         for section in self.OPTIONS:
             if section == 'general':
@@ -419,6 +644,31 @@ class Config:
                         self.OPTIONS[section][option],
                     )
                     upload_parser.add_argument(*sargs, **kwargs)
+            elif section == 'lsp':
+                # Only the disabled errors (which are a list)
+                for option in self.OPTIONS[section]:
+                    op = self.OPTIONS[section][option]
+                    new_group = lsp_parser.add_argument_group(
+                        op[0]['group_name'],
+                        op[0]['group_desc'],
+                    )
+                    for i in op:
+                        sargs, kwargs = self._gen_argparse_args(i)
+                        new_group.add_argument(*sargs, **kwargs)
+            elif section == 'daemon':
+                for option in self.OPTIONS[section]:
+                    op = self.OPTIONS[section][option]
+                    if isinstance(op, list):
+                        new_group = daemon_parser.add_argument_group(
+                            op[0]['group_name'],
+                            op[0]['group_desc'],
+                        )
+                        for i in op:
+                            sargs, kwargs = self._gen_argparse_args(i)
+                            new_group.add_argument(*sargs, **kwargs)
+                    else:
+                        sargs, kwargs = self._gen_argparse_args(op)
+                        daemon_parser.add_argument(*sargs, **kwargs)
             else:
                 # This should never be reached...
                 continue
@@ -472,6 +722,8 @@ class Config:
                 continue
             elif o == 'metavar':
                 fn_args['metavar'] = opts[o]
+            elif o == 'choices':
+                fn_args['choices'] = opts[o]
             elif o == 'dest':
                 fn_args['dest'] = opts[o]
             elif o == 'required':
@@ -486,6 +738,13 @@ class Config:
             else:
                 pass
 
+        # Numeric options are converted (and validated) by argparse,
+        # all other options are passed on as they are
+        if opts.get('type') in (int, float):
+            fn_args['type'] = opts['type']
+            if 'min' in opts:
+                fn_args['type'] = _at_least(opts['type'], opts['min'])
+
         return (flag_or_pos, fn_args)
 
     def _find_config_file(self):
@@ -572,6 +831,10 @@ class Config:
                                 self.OPTIONS[section][option]['config_name']
                             ):
                                 value = cf[section][cf_option]
+                                _check_min(
+                                    cf_option, value,
+                                    self.OPTIONS[section][option],
+                                )
                                 self.OPTIONS[section][option]['value'] = value
 
     def _parse_arguments(self):
@@ -668,6 +931,16 @@ class Config:
                 'general': self.OPTIONS['general'],
                 'upload': self.OPTIONS['upload'],
             }
+        elif self.argparse_args['mode'] == 'lsp':
+            return {
+                'general': self.OPTIONS['general'],
+                'lsp': self.OPTIONS['lsp'],
+            }
+        elif self.argparse_args['mode'] == 'daemon':
+            return {
+                'general': self.OPTIONS['general'],
+                'daemon': self.OPTIONS['daemon'],
+            }
         else:
             # Just for form... This code should never get executed
             parser.print_help()
@@ -0,0 +1,196 @@
+"""
+Helpers to find the changed files (and lines) in a local git repository
+
+Only git plumbing output is used (`git diff -U0`, `git ls-files` and
+`git cat-file`), which is fast even in very large repositories because
+git only has to look at the changed files.
+"""
+import codecs
+import os
+import re
+import subprocess
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+# A range of (0 based) line numbers: (start, end), end not included.
+# An empty range (start == end) means that lines were removed there.
+LineRange = Tuple[int, int]
+
+# The changed lines of every changed file. None means the whole file
+# changed (e.g. files that are not tracked yet).
+ChangedFiles = Dict[str, Optional[List[LineRange]]]
+
+_HUNK_RE = re.compile(rb'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+
+
+class GitError(Exception):
+    """Raised when a git command fails"""
+
+
+def _git(
+    args: Sequence[str],
+    cwd: str,
+    stdin: Optional[bytes] = None,
+) -> bytes:
+    """Runs git and returns the output
+
+    Raises:
+        {GitError} -- When git is not installed or the command fails
+
+    """
+    try:
+        result = subprocess.run(
+            ['git', '-c', 'core.quotePath=false', *args],
+            cwd=cwd,
+            input=stdin,
+            capture_output=True,
+        )
+    except OSError as e:
+        raise GitError(f'Could not run git: {e}')
+    if result.returncode != 0:
+        raise GitError(result.stderr.decode(errors='replace').strip())
+    return result.stdout
+
+
+def git_root(path: str) -> str:
+    """Returns the root directory of the repository that contains path"""
+    cwd = path if os.path.isdir(path) else os.path.dirname(path) or '.'
+    root = _git(['rev-parse', '--show-toplevel'], os.path.abspath(cwd))
+    return os.fsdecode(root.rstrip(b'\n'))
+
+
+def _unquote_path(path: bytes) -> bytes:
+    """Removes the quotes git puts around paths with special characters"""
+    if path.startswith(b'"') and path.endswith(b'"'):
+        return codecs.escape_decode(path[1:-1])[0]
+    return path
+
+
+def parse_diff(diff: bytes, root: str) -> ChangedFiles:
+    """Parses the output of `git diff -U0` into the changed line ranges
+
+    Arguments:
+        diff {bytes} -- The output of git diff (with a/ and b/ prefixes)
+        root {str}   -- The root of the repository
+
+    Returns:
+        {ChangedFiles} -- The changed lines of every (not deleted) file
+
+    """
+    changed: ChangedFiles = {}
+    ranges: Optional[List[LineRange]] = None
+    for line in diff.split(b'\n'):
+        if line.startswith(b'+++ '):
+            path = line[4:]
+            if path.endswith(b'\t'):
+                # Git ends the header with a tab when the path has a space
+                path = path[:-1]
+            path = _unquote_path(path)
+            if path == b'/dev/null':
+                # The file is deleted
+                ranges = None
+                continue
+            # Remove the b/ prefix
+            file_path = os.path.join(root, os.fsdecode(path[2:]))
+            ranges = changed.setdefault(file_path, [])
+        elif line.startswith(b'@@') and ranges is not None:
+            match = _HUNK_RE.match(line)
+            if match is None:
+                continue
+            start = int(match.group(1))
+            length = 1 if match.group(2) is None else int(match.group(2))
+            if length == 0:
+                # Only removed lines, after line `start` (1 based)
+                ranges.append((start, start))
+            else:
+                ranges.append((start - 1, start - 1 + length))
+    return changed
+
+
+def changed_files(
+    path: str,
+    rev: Optional[str] = None,
+    staged: bool = False,
+) -> ChangedFiles:
+    """Finds the files (and lines) that changed in the given path
+
+    Arguments:
+        path {str}          -- The file or directory to look for changes in
+        rev {Optional[str]} -- Find the changes since this revision (in the
+                               working tree, including untracked files)
+        staged {bool}       -- Find the changes that are staged (in the
+                               index) instead
+
+    Raises:
+        {GitError} -- When path is not in a git repository or the revision
+                      does not exist
+
+    Returns:
+        {ChangedFiles} -- The absolute paths of the changed files and the
+                          changed line ranges
+
+    """
+    root = git_root(path)
+    pathspec = ['--', os.path.realpath(path)]
+    diff_args = [
+        'diff', '-U0', '--no-color', '--no-ext-diff', '--diff-filter=d',
+        '--src-prefix=a/', '--dst-prefix=b/',
+    ]
+    if staged:
+        diff_args.append('--cached')
+    elif rev is not None:
+        diff_args.append(rev)
+    changed = parse_diff(_git(diff_args + pathspec, root), root)
+
+    if not staged:
+        untracked = _git(
+            ['ls-files', '-z', '--others', '--exclude-standard'] + pathspec,
+            root,
+        )
+        for file_path in untracked.split(b'\0'):
+            if file_path:
+                changed[os.path.join(root, os.fsdecode(file_path))] = None
+
+    return changed
+
+
+def read_staged_files(paths: List[str]) -> Dict[str, bytes]:
+    """Reads the content of files as they are in the index (staged)
+
+    All files are read using one `git cat-file --batch` process.
+
+    Arguments:
+        paths {List[str]} -- The absolute paths of the files
+
+    Raises:
+        {GitError} -- When the files could not be read
+
+    Returns:
+        {Dict[str, bytes]} -- The staged content of every file that is in
+                              the index
+
+    """
+    if not paths:
+        return {}
+    root = git_root(paths[0])
+    objects = b''.join(
+        b':' + os.fsencode(os.path.relpath(p, root)) + b'\n' for p in paths
+    )
+    output = _git(['cat-file', '--batch'], root, stdin=objects)
+
+    contents: Dict[str, bytes] = {}
+    pos = 0
+    for file_path in paths:
+        header_end = output.index(b'\n', pos)
+        header = output[pos:header_end].split()
+        pos = header_end + 1
+        if header[-1] == b'missing':
+            continue
+        size = int(header[2])
+        contents[file_path] = output[pos:pos + size]
+        # The content is followed by a newline
+        pos += size + 1
+    return contents
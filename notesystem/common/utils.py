@@ -1,9 +1,21 @@
 """Commonly used utility functions"""
+import codecs
+import hashlib
 import logging
 import os
 import re
+import stat
 import string
+import tempfile
+import threading
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
+from typing import Dict
+from typing import Iterable
 from typing import List
+from typing import Optional
+from typing import Tuple
 
 
 def find_all_md_files(path: str) -> List[str]:
@@ -40,6 +52,57 @@ def find_all_md_files(path: str) -> List[str]:
     return md_files
 
 
+def hash_file(in_file: BinaryIO) -> str:
+    """Returns the hash of the content of an open (binary) file
+
+    The file is read in chunks, so large files are not loaded in memory.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: in_file.read(1 << 20), b''):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def find_duplicate_files(file_paths: List[str]) -> Dict[str, str]:
+    """Finds the files that have the same content as an earlier file
+
+    Only files with the same size as another file are hashed, so most
+    files are not read.
+
+    Arguments:
+        file_paths {List[str]} -- The paths of the files
+
+    Returns:
+        Dict[str, str] -- The path of every duplicate file mapped to the
+                          first file (in file_paths) with the same content
+
+    """
+    by_size: Dict[int, List[str]] = {}
+    for file_path in file_paths:
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            continue
+        by_size.setdefault(size, []).append(file_path)
+
+    duplicate_of: Dict[str, str] = {}
+    for same_size in by_size.values():
+        if len(same_size) < 2:
+            continue
+        # content hash -> the first file with that content
+        originals: Dict[str, str] = {}
+        for file_path in same_size:
+            try:
+                with open(file_path, 'rb') as in_file:
+                    content_hash = hash_file(in_file)
+            except OSError:
+                continue
+            original = originals.setdefault(content_hash, file_path)
+            if original != file_path:
+                duplicate_of[file_path] = original
+    return duplicate_of
+
+
 def clean_str(inp_str: str) -> str:
     """Removes non printable characters from the string
 
@@ -53,3 +116,241 @@ def clean_str(inp_str: str) -> str:
         {str} -- The cleaned string
     """
     return re.sub(f'[^{re.escape(string.printable)}]', '', inp_str)
+
+
+# Byte order marks and the encoding of the content after them. The UTF-32
+# marks start with the UTF-16 marks, so they are checked first.
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+# The bytes that are not used by windows-1252
+_UNDEFINED_CP1252_RE = re.compile(b'[\x81\x8d\x8f\x90\x9d]')
+
+
+def encoding_candidates(
+    head: bytes,
+    encoding: Optional[str] = None,
+) -> List[str]:
+    """Returns the encodings to try for file content, most likely first
+
+    A byte order mark decides the encoding. Otherwise the given encoding
+    (e.g. the encoding found on a previous run) is tried first, followed
+    by UTF-8 and windows-1252. latin-1 is not included, it decodes any
+    content so it is the last resort.
+
+    Arguments:
+        head {bytes}             -- The first (at least 4) bytes of the
+                                    content
+        encoding {Optional[str]} -- The expected encoding
+
+    Returns:
+        {List[str]} -- The encodings to try in order
+
+    """
+    for bom, bom_encoding in _BOMS:
+        if head.startswith(bom):
+            return [bom_encoding]
+    candidates = ['utf-8', 'windows-1252']
+    if encoding == 'windows-1252':
+        candidates.reverse()
+    elif encoding is not None and encoding not in candidates and all(
+        # Without the mark the content is not in that encoding anymore
+        encoding != bom_encoding for _, bom_encoding in _BOMS
+    ):
+        candidates.insert(0, encoding)
+    return candidates
+
+
+def decode_bytes(
+    data: bytes,
+    encoding: Optional[str] = None,
+) -> Tuple[str, str]:
+    """Decodes file content, detecting the encoding
+
+    See encoding_candidates. Decoding UTF-8 stops at the first invalid
+    byte, so content in another encoding fails fast. windows-1252 is only
+    tried when the content has no bytes that are undefined in it, so
+    falling back never raises twice.
+
+    Arguments:
+        data {bytes}             -- The content to decode
+        encoding {Optional[str]} -- The expected encoding
+
+    Returns:
+        {Tuple[str, str]} -- The text and the encoding that was used
+
+    """
+    for candidate in encoding_candidates(data[:4], encoding):
+        if (
+            candidate == 'windows-1252' and
+            _UNDEFINED_CP1252_RE.search(data) is not None
+        ):
+            continue
+        try:
+            return data.decode(candidate), candidate
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return data.decode('latin-1'), 'latin-1'
+
+
+def atomic_write(
+    file_path: str,
+    content: str,
+    encoding: Optional[str] = None,
+) -> None:
+    """Writes the content to a file without ever leaving it half written
+
+    See atomic_write_lines.
+
+    Arguments:
+        file_path {str}          -- The path of the file to write
+        content {str}            -- The content to write
+        encoding {Optional[str]} -- The encoding to use (None for the
+                                    default encoding)
+
+    """
+    atomic_write_lines(file_path, (content,), encoding)
+
+
+def atomic_write_lines(
+    file_path: str,
+    lines: Iterable[str],
+    encoding: Optional[str] = None,
+) -> None:
+    """Writes lines to a file without ever leaving it half written
+
+    The lines are written to a temporary file in the same directory,
+    which then replaces the file using os.replace. The permissions of the
+    existing file are kept. The lines can be generated while writing, so
+    the content does not have to be in memory at once.
+
+    When the file is a symlink, the file it links to is written. A file
+    with more than one (hard) link is written in place, because replacing
+    it would disconnect it from its other links.
+
+    Arguments:
+        file_path {str}          -- The path of the file to write
+        lines {Iterable[str]}    -- The lines to write
+        encoding {Optional[str]} -- The encoding to use (None for the
+                                    default encoding)
+
+    """
+    file_path = os.path.realpath(file_path)
+    try:
+        n_links = os.stat(file_path).st_nlink
+    except FileNotFoundError:
+        n_links = 0
+    if n_links > 1:
+        with open(file_path, 'w', encoding=encoding) as md_file:
+            md_file.writelines(lines)
+        return
+
+    dir_name, base_name = os.path.split(file_path)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=dir_name, prefix=f'.{base_name}.', suffix='.tmp',
+    )
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding) as tmp_file:
+            tmp_file.writelines(lines)
+        try:
+            mode = stat.S_IMODE(os.stat(file_path).st_mode)
+            os.chmod(tmp_path, mode)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class FileWriter:
+    """Writes files atomically using a small pool of threads
+
+    Writing is mostly waiting on the disk, so the writes are handed off to
+    a few threads while the caller continues. The amount of writes that
+    can be waiting is limited, so that the content of the files does not
+    pile up in memory.
+
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 64):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='notesystem-writer',
+        )
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._errors: List[Tuple[str, BaseException]] = []
+        self.n_written = 0
+
+    def write(
+        self,
+        file_path: str,
+        content: str,
+        encoding: Optional[str] = None,
+    ) -> None:
+        """Schedules writing the content to the file (see atomic_write)
+
+        Blocks when too many writes are waiting.
+
+        """
+        self._pending.acquire()
+        future = self._executor.submit(
+            atomic_write, file_path, content, encoding,
+        )
+
+        def done(f: Future) -> None:
+            self._pending.release()
+            error = f.exception()
+            with self._lock:
+                if error is not None:
+                    self._errors.append((file_path, error))
+                else:
+                    self.n_written += 1
+
+        future.add_done_callback(done)
+
+    def close(self) -> List[Tuple[str, BaseException]]:
+        """Waits until all files are written
+
+        Returns:
+            List[Tuple[str, BaseException]] -- The files that could not be
+                                               written and the errors
+
+        """
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            return list(self._errors)
+
+    def __enter__(self) -> 'FileWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Merges overlapping and touching (start, end) ranges
+
+    Arguments:
+        ranges {List[Tuple[int, int]]} -- The ranges, end not included
+
+    Returns:
+        {List[Tuple[int, int]]} -- The merged ranges, sorted on start
+
+    """
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
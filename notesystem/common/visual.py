@@ -1,75 +1,201 @@
 """Helper functions for visual printing"""
 # from notesystem.modes.search_mode import SearchMatch
 # from notesystem.modes.search_mode import LineMatch
+import functools
 import os
+import shutil
+import sys
+from typing import List
 from typing import Optional
+from typing import TextIO
+from typing import Tuple
 
 from termcolor import colored
+from termcolor import RESET
 
 from notesystem.common.utils import clean_str
 from notesystem.modes.check_mode.errors.base_errors import DocumentErrors
+from notesystem.modes.check_mode.errors.base_errors import ErrorMeta
 
 
-def print_doc_error(
+@functools.lru_cache(maxsize=None)
+def terminal_columns() -> int:
+    """Returns the width of the terminal
+
+    The width is only looked up once, falls back to 80 columns when
+    stdout is not a terminal.
+
+    """
+    return shutil.get_terminal_size().columns
+
+
+def use_colors(stream: TextIO) -> bool:
+    """Returns wether colored output should be written to the stream
+
+    Colors are only used when the stream is a terminal and the NO_COLOR
+    (or ANSI_COLORS_DISABLED) environment variable is not set.
+
+    """
+    if 'NO_COLOR' in os.environ or 'ANSI_COLORS_DISABLED' in os.environ:
+        return False
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        # Not a real stream or a closed stream
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def _color_prefix(color: str, attrs: Tuple[str, ...]) -> str:
+    """Returns the escape codes termcolor.colored puts before the text"""
+    return colored('', color, attrs=list(attrs) or None)[:-len(RESET)]
+
+
+class _Painter:
+    """Colors text, or leaves it as it is when colors are disabled
+
+    Gives the same output as termcolor.colored, but the escape codes are
+    only created once for every color.
+
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+
+    def __call__(
+        self,
+        text: str,
+        color: str,
+        attrs: Optional[List[str]] = None,
+    ) -> str:
+        if not self.enabled:
+            return text
+        return _color_prefix(color, tuple(attrs or ())) + text + RESET
+
+
+def format_doc_error(
     doc_errs: DocumentErrors,
     err_fixed: Optional[bool] = False,
-) -> None:
-    """Pretty print document errors
+    color: bool = True,
+) -> str:
+    """Formats document errors the way print_doc_error shows them
 
     Arguments:
-        doc_errs {DocumentErrors} -- The document error to display
+        doc_errs {DocumentErrors} -- The document error to format
         err_fixed {bool}          -- Wether the errors are fixed (if possible)
+        color {bool}              -- Wether to add colors
+
+    Returns:
+        {str} -- The formatted errors, empty when there are no errors
 
     """
-    rows, columns = os.popen('stty size', 'r').read().split()
 
     # Gather information to print
-    file_path = doc_errs['file_path']
-    file_path = clean_str(file_path)
     n_errors = len(doc_errs['errors'])
-
     if n_errors == 0:
-        return
+        return ''
+
+    file_path = clean_str(doc_errs['file_path'])
 
-    max_s = int(columns) / 2
+    paint = _Painter(color)
+    max_s = terminal_columns() / 2
     n_dash = int(max_s - len(file_path)) - 1
 
-    print(
-        colored('-', 'cyan'), colored(
-            file_path, 'cyan',
-            attrs=['bold'],
-        ), colored('-' * n_dash, 'cyan'),
-    )
-    print(
-        colored(
-            '* Total errors: ', 'red',
-            attrs=['bold'],
-        ), colored(str(n_errors), 'red'),
-    )
+    out = [
+        paint('-', 'cyan'), ' ',
+        paint(file_path, 'cyan', attrs=['bold']), ' ',
+        paint('-' * n_dash, 'cyan'), '\n',
+        paint('* Total errors: ', 'red', attrs=['bold']), ' ',
+        paint(str(n_errors), 'red'), '\n',
+    ]
 
     for i, error in enumerate(doc_errs['errors']):
-        print(colored(f'  Error {i + 1}:', 'red'))
+        out.append(paint(f'  Error {i + 1}:', 'red') + '\n')
         if error['line_nr'] is not None:
-            print(colored(f"    Line nr: {error['line_nr']}", 'blue'))
+            line_nr = paint(f"    Line nr: {error['line_nr']}", 'blue')
         else:
-            print(colored('    Line nr: -', 'blue'))
-        print(colored(f"    Error type: {error['error_type']}", 'blue'))
+            line_nr = paint('    Line nr: -', 'blue')
+        out.append(line_nr + '\n')
+        out.append(
+            paint(f"    Error type: {error['error_type']}", 'blue') + '\n',
+        )
         if error['error_type'].is_fixable():
             if err_fixed:
-                print(colored('    Fixed', 'blue'), colored('Yes', 'green'))
+                label = paint('    Fixed', 'blue')
+            else:
+                label = paint('    Auto fixable', 'blue')
+            value = paint('Yes', 'green')
+        else:
+            if err_fixed:
+                label = paint('    Fixed:', 'blue')
+            else:
+                label = paint('    Auto fixable:', 'blue')
+            value = paint('No', 'red')
+        out.append(f'{label} {value}\n')
+
+    return ''.join(out)
+
+
+def print_doc_error(
+    doc_errs: DocumentErrors,
+    err_fixed: Optional[bool] = False,
+) -> None:
+    """Pretty print document errors
+
+    The errors of the document are written to stdout at once. Colors are
+    left out when stdout is not a terminal.
+
+    Arguments:
+        doc_errs {DocumentErrors} -- The document error to display
+        err_fixed {bool}          -- Wether the errors are fixed (if possible)
+
+    """
+    stream = sys.stdout
+    text = format_doc_error(doc_errs, err_fixed, use_colors(stream))
+    if text:
+        stream.write(text)
+
+
+def format_simple_doc_error(
+    doc_err: DocumentErrors,
+    err_fixed: Optional[bool] = False,
+    color: bool = True,
+) -> str:
+    """Formats the document errors the way print_simple_doc_error shows them
+
+    Arguments:
+        doc_errs {DocumentErrors} -- The errors in the document
+        err_fixed {bool}          -- Wether the error is fixed
+        color {bool}              -- Wether to add colors
+
+    Returns:
+        {str} -- The formatted errors, empty when there are no errors
+
+    """
+
+    paint = _Painter(color)
+    file_path = clean_str(doc_err['file_path'])
+    out = []
+    for e in doc_err['errors']:
+        e_line_nr = e['line_nr'] or ''
+        e_type = e['error_type'].get_error_name()
+
+        path_print_str = paint(f'{file_path}:{e_line_nr}', 'yellow')
+        type_print_str = paint(f'{e_type}', 'cyan')
+        if e['error_type'].is_fixable():
+            if err_fixed:
+                fix_print_str = paint('Fixed', 'green')
             else:
-                print(
-                    colored('    Auto fixable', 'blue'),
-                    colored('Yes', 'green'),
-                )
+                fix_print_str = paint('Fixable', 'green')
         else:
             if err_fixed:
-                print(colored('    Fixed:', 'blue'), colored('No', 'red'))
+                fix_print_str = paint('Not Fixed', 'red')
             else:
-                print(
-                    colored('    Auto fixable:', 'blue'),
-                    colored('No', 'red'),
-                )
+                fix_print_str = paint('Not fixable', 'red')
+
+        out.append(f'{path_print_str} - {type_print_str} - {fix_print_str}\n')
+
+    return ''.join(out)
 
 
 def print_simple_doc_error(
@@ -89,26 +215,83 @@ def print_simple_doc_error(
         err_fixed {bool}          -- Wether the error is fixed
 
     """
+    stream = sys.stdout
+    text = format_simple_doc_error(doc_err, err_fixed, use_colors(stream))
+    if text:
+        stream.write(text)
 
-    file_path = clean_str(doc_err['file_path'])
-    for e in doc_err['errors']:
-        e_line_nr = e['line_nr'] or ''
-        e_type = e['error_type'].get_error_name()
 
-        path_print_str = colored(f'{file_path}:{e_line_nr}', 'yellow')
-        type_print_str = colored(f'{e_type}', 'cyan')
+def format_error_diff(
+    file_path: str,
+    new_errors: List[ErrorMeta],
+    resolved_errors: List[ErrorMeta],
+    err_fixed: Optional[bool] = False,
+    color: bool = True,
+) -> str:
+    """Formats the errors that changed since the last check of a file
+
+    Format:
+    `+ notes/note1.md:15 - todo-error - Fixable`
+    `- notes/note1.md:3 - math-error - Resolved`
+
+    Arguments:
+        file_path {str}                   -- The path of the file
+        new_errors {List[ErrorMeta]}      -- The errors that are new
+        resolved_errors {List[ErrorMeta]} -- The errors that are resolved
+        err_fixed {bool}                  -- Wether the new errors are fixed
+        color {bool}                      -- Wether to add colors
+
+    Returns:
+        {str} -- The formatted errors, empty when nothing changed
+
+    """
+
+    paint = _Painter(color)
+    file_path = clean_str(file_path)
+    out = []
+    for e in new_errors:
+        e_line_nr = '' if e['line_nr'] is None else e['line_nr']
         if e['error_type'].is_fixable():
-            if err_fixed:
-                fix_print_str = colored('Fixed', 'green')
-            else:
-                fix_print_str = colored('Fixable', 'green')
+            status = 'Fixed' if err_fixed else 'Fixable'
         else:
-            if err_fixed:
-                fix_print_str = colored('Not Fixed', 'red')
-            else:
-                fix_print_str = colored('Not fixable', 'red')
+            status = 'Not fixed' if err_fixed else 'Not fixable'
+        out.append(
+            paint(f'+ {file_path}:{e_line_nr}', 'red') + ' - ' +
+            paint(e['error_type'].get_error_name(), 'cyan') + ' - ' +
+            paint(status, 'yellow') + '\n',
+        )
+    for e in resolved_errors:
+        e_line_nr = '' if e['line_nr'] is None else e['line_nr']
+        out.append(
+            paint(f'- {file_path}:{e_line_nr}', 'green') + ' - ' +
+            paint(e['error_type'].get_error_name(), 'cyan') + ' - ' +
+            paint('Resolved', 'green') + '\n',
+        )
+    return ''.join(out)
 
-        print(f'{path_print_str} - {type_print_str} - {fix_print_str}')
+
+def print_error_diff(
+    file_path: str,
+    new_errors: List[ErrorMeta],
+    resolved_errors: List[ErrorMeta],
+    err_fixed: Optional[bool] = False,
+) -> None:
+    """Prints the new and resolved errors of a file (used in watch mode)
+
+    Arguments:
+        file_path {str}                   -- The path of the file
+        new_errors {List[ErrorMeta]}      -- The errors that are new
+        resolved_errors {List[ErrorMeta]} -- The errors that are resolved
+        err_fixed {bool}                  -- Wether the new errors are fixed
+
+    """
+    stream = sys.stdout
+    text = format_error_diff(
+        file_path, new_errors, resolved_errors, err_fixed, use_colors(stream),
+    )
+    if text:
+        stream.write(text)
+        stream.flush()
 
 
 def print_search_result(match, pattern: str, show_full_path: bool) -> None:
@@ -0,0 +1,131 @@
+"""
+Thin client for the check mode daemon (see modes/daemon_mode.py)
+
+Sends a check or fix request to a running `notesystem daemon` and prints
+the output of the daemon. The client only uses the standard library and
+does not import the rest of notesystem, so it starts a lot faster than
+`notesystem check`.
+
+Usage: notesystem-client [--socket PATH] {check,fix,ping,stop} [paths ...]
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Sequence
+
+# The exit code when the daemon is not running or the request failed
+EXIT_NO_DAEMON = 2
+
+
+def default_socket_path() -> str:
+    """Returns the path of the socket the daemon listens on by default
+
+    The socket is placed in the runtime directory of the user (or the
+    temporary directory), one socket per user.
+
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(runtime_dir, f'notesystem-{os.getuid()}.sock')
+
+
+def send_request(
+    request: Dict[str, Any],
+    socket_path: str,
+) -> Dict[str, Any]:
+    """Sends a request to the daemon and returns the response
+
+    Every request is send over a new connection as a single line of json,
+    the daemon answers with a single line of json.
+
+    Arguments:
+        request {Dict[str, Any]} -- The request
+        socket_path {str}        -- The path of the socket of the daemon
+
+    Raises:
+        {OSError} -- When the daemon could not be reached
+
+    Returns:
+        {Dict[str, Any]} -- The response of the daemon
+
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(socket_path)
+        conn.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with conn.makefile('rb') as response_file:
+            line = response_file.readline()
+    if not line:
+        raise ConnectionError('The daemon closed the connection')
+    return json.loads(line.decode('utf-8'))
+
+
+def _use_colors() -> bool:
+    # Same as notesystem.common.visual.use_colors
+    if 'NO_COLOR' in os.environ or 'ANSI_COLORS_DISABLED' in os.environ:
+        return False
+    return sys.stdout.isatty()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='notesystem-client',
+        description='check or fix notes using a running notesystem daemon',
+    )
+    parser.add_argument(
+        'command', choices=['check', 'fix', 'ping', 'stop'],
+        help='check or fix the paths, ping or stop the daemon',
+    )
+    parser.add_argument(
+        'paths', nargs='*',
+        help='the files and directories to check. Default: .',
+    )
+    parser.add_argument(
+        '--socket', default=None, metavar='PATH',
+        help='the socket the daemon listens on',
+    )
+    parser.add_argument(
+        '--simple-errors', action='store_true',
+        help='show the errors in a shorter/simpler way',
+    )
+    parser.add_argument(
+        '--format', dest='output_format', default='text',
+        help='the output format: text, jsonl, sarif or checkstyle. \
+              Default: text',
+    )
+    args = parser.parse_args(argv)
+
+    request: Dict[str, Any] = {'command': args.command}
+    if args.command in ('check', 'fix'):
+        # The daemon can run in another directory
+        request['paths'] = [os.path.abspath(p) for p in args.paths or ['.']]
+        request['output_format'] = args.output_format
+        request['simple_errors'] = args.simple_errors
+        request['color'] = _use_colors()
+
+    socket_path = args.socket or default_socket_path()
+    try:
+        response = send_request(request, socket_path)
+    except (OSError, ValueError) as e:
+        print(
+            f'Could not reach the notesystem daemon at {socket_path} ({e}), '
+            'start it with: notesystem daemon',
+            file=sys.stderr,
+        )
+        return EXIT_NO_DAEMON
+
+    if 'error' in response:
+        print(response['error'], file=sys.stderr)
+        return EXIT_NO_DAEMON
+    if args.command == 'ping':
+        print(f"notesystem daemon {response['version']} is running")
+    sys.stdout.write(response.get('output', ''))
+    return response.get('exit_code', 0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+Persistent cache for the results of check mode
+
+The cache stores the errors of every checked file together with the size,
+modification time and content hash of the file. When a file has not
+changed since the last run the stored errors are used instead of checking
+the file again.
+
+The whole cache is invalidated when the enabled errors, the notesystem
+version or the implementation of the errors change.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TypedDict
+
+import notesystem
+from notesystem.common.utils import hash_file
+
+CACHE_DIR_NAME = '.notesystem-cache'
+CACHE_FILE_NAME = 'check.json'
+
+# Files that are modified this close (in ns) to the moment they are stored
+# could be modified again without the mtime changing. Their mtime is not
+# stored so that the content hash is always compared on the next run.
+RACY_MTIME_NS = 2 * 10**9
+
+# (line_nr, line, error_name), see CompactDocumentErrors in check_mode
+CompactError = Tuple[Optional[int], Optional[str], str]
+
+
+class CacheEntry(TypedDict):
+    """The cached information about a single file"""
+    size: int
+    mtime_ns: int
+    hash: str
+    errors: List[CompactError]
+    # The encoding the file was decoded with, None when unknown
+    encoding: Optional[str]
+
+
+def rules_fingerprint() -> str:
+    """Creates a hash of the source code of check mode
+
+    All python files of the check_mode package (which includes all the
+    errors) are hashed, so that any change to the implementation of the
+    rules invalidates the cache.
+
+    Returns:
+        {str} -- The hash of the source code
+
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.blake2b(digest_size=16)
+    for root, dirs, files in os.walk(package_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if not file.endswith('.py'):
+                continue
+            file_path = os.path.join(root, file)
+            h.update(os.path.relpath(file_path, package_dir).encode())
+            with open(file_path, 'rb') as src_file:
+                h.update(src_file.read())
+    return h.hexdigest()
+
+
+class CheckCache:
+    """On disk cache for the errors found in files"""
+
+    def __init__(self, cache_dir: str, enabled_errors: List[str]):
+        """Initialize the cache
+
+        Arguments:
+            cache_dir {str}            -- The directory the cache is stored in
+            enabled_errors {List[str]} -- The names of the enabled errors
+
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._cache_dir = cache_dir
+        self._cache_path = os.path.join(cache_dir, CACHE_FILE_NAME)
+        self._header = {
+            'version': notesystem.__version__,
+            'rules': sorted(enabled_errors),
+            'rules_hash': rules_fingerprint(),
+        }
+        self._entries: Dict[str, CacheEntry] = {}
+        # The (size, mtime_ns, hash) of files that missed the cache,
+        # used when storing the new errors
+        self._pending: Dict[str, Tuple[int, int, str]] = {}
+        self._changed = False
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> None:
+        """Loads the cache from disk
+
+        When the cache does not exist, can not be read or was created
+        with different rules, the cache starts empty.
+
+        """
+        try:
+            with open(self._cache_path, 'r', encoding='utf-8') as cache_file:
+                data = json.load(cache_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self._logger.warning(f'Could not read cache {self._cache_path}')
+            self._logger.info(e)
+            return
+
+        if not isinstance(data, dict) or data.get('header') != self._header:
+            self._logger.info('Check cache is outdated, ignoring it')
+            return
+
+        self._entries = data.get('entries', {})
+
+    def save(self) -> None:
+        """Writes the cache to disk (only when it changed)"""
+
+        if not self._changed:
+            return
+
+        os.makedirs(self._cache_dir, exist_ok=True)
+        data = {'header': self._header, 'entries': self._entries}
+        # Write to a temporary file first so that an interrupted
+        # write never leaves a broken cache behind
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+                json.dump(data, tmp_file, separators=(',', ':'))
+            os.replace(tmp_path, self._cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._changed = False
+
+    def lookup(self, file_path: str) -> Optional[List[CompactError]]:
+        """Returns the cached errors for the file if it has not changed
+
+        When the size and modification time are the same as when the file
+        was cached, the file is not read. Otherwise the content hash is
+        compared.
+
+        Arguments:
+            file_path {str} -- The path of the file
+
+        Returns:
+            {Optional[List[CompactError]]} -- The errors or None when the
+                                              file has to be checked
+
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        entry = self._entries.get(file_path)
+        if (
+            entry is not None and
+            entry['size'] == stat.st_size and
+            entry['mtime_ns'] == stat.st_mtime_ns
+        ):
+            self.hits += 1
+            return entry['errors']
+
+        try:
+            with open(file_path, 'rb') as in_file:
+                content_hash = hash_file(in_file)
+        except OSError:
+            self.misses += 1
+            return None
+
+        if entry is not None and entry['hash'] == content_hash:
+            # Only the metadata changed (e.g. the file was touched)
+            self._store(
+                file_path, stat.st_size, stat.st_mtime_ns,
+                content_hash, entry['errors'], entry.get('encoding'),
+            )
+            self.hits += 1
+            return entry['errors']
+
+        self._pending[file_path] = (
+            stat.st_size, stat.st_mtime_ns, content_hash,
+        )
+        self.misses += 1
+        return None
+
+    def encoding(self, file_path: str) -> Optional[str]:
+        """Returns the encoding the file was decoded with on the last run
+
+        Also known for files that changed since they were cached.
+
+        """
+        entry = self._entries.get(file_path)
+        return None if entry is None else entry.get('encoding')
+
+    def store(
+        self,
+        file_path: str,
+        errors: List[CompactError],
+        encoding: Optional[str] = None,
+    ) -> None:
+        """Stores the errors of a file that missed the cache
+
+        Arguments:
+            file_path {str}             -- The path of the file
+            errors {List[CompactError]} -- The errors found in the file
+            encoding {Optional[str]}    -- The encoding of the file
+
+        """
+        if file_path not in self._pending:
+            # The file could not be read by lookup
+            return
+        size, mtime_ns, content_hash = self._pending.pop(file_path)
+        self._store(
+            file_path, size, mtime_ns, content_hash, errors, encoding,
+        )
+
+    def _store(
+        self,
+        file_path: str,
+        size: int,
+        mtime_ns: int,
+        content_hash: str,
+        errors: List[CompactError],
+        encoding: Optional[str],
+    ) -> None:
+        if time.time_ns() - mtime_ns < RACY_MTIME_NS:
+            mtime_ns = 0
+        self._entries[file_path] = CacheEntry(
+            size=size,
+            mtime_ns=mtime_ns,
+            hash=content_hash,
+            errors=list(errors),
+            encoding=encoding,
+        )
+        self._changed = True
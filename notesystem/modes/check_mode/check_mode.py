@@ -1,15 +1,49 @@
+import copy
+import io
 import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import Deque
+from typing import Dict
+from typing import Generator
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Optional
+from typing import Tuple
 from typing import TypedDict
 
 from termcolor import colored
+from watchdog.observers.polling import PollingObserver as Observer
 
+from notesystem.common.git import changed_files
+from notesystem.common.git import GitError
+from notesystem.common.git import LineRange
+from notesystem.common.git import read_staged_files
+from notesystem.common.utils import atomic_write
+from notesystem.common.utils import atomic_write_lines
+from notesystem.common.utils import decode_bytes
+from notesystem.common.utils import encoding_candidates
+from notesystem.common.utils import FileWriter
 from notesystem.common.utils import find_all_md_files
+from notesystem.common.utils import find_duplicate_files
+from notesystem.common.utils import merge_ranges
 from notesystem.common.visual import print_doc_error
+from notesystem.common.visual import print_error_diff
 from notesystem.common.visual import print_simple_doc_error
 from notesystem.modes.base_mode import BaseMode
+from notesystem.modes.check_mode.check_cache import CheckCache
+from notesystem.modes.check_mode.check_watch import ChangedFiles
+from notesystem.modes.check_mode.check_watch import diff_errors
+from notesystem.modes.check_mode.check_watch import WatchHandler
 from notesystem.modes.check_mode.errors.ast_errors import AstError
+from notesystem.modes.check_mode.errors.ast_errors import AstPartSplitter
 from notesystem.modes.check_mode.errors.ast_errors import ListIndentError
+from notesystem.modes.check_mode.errors.base_errors import BaseError
 from notesystem.modes.check_mode.errors.base_errors import DocumentErrors
 from notesystem.modes.check_mode.errors.base_errors import ErrorMeta
 from notesystem.modes.check_mode.errors.markdown_errors import MarkdownError
@@ -18,6 +52,14 @@ from notesystem.modes.check_mode.errors.markdown_errors import NewlineBeforeHead
 from notesystem.modes.check_mode.errors.markdown_errors import RequiredSpaceAfterHeadersymbolError  # noqa: E501
 from notesystem.modes.check_mode.errors.markdown_errors import SeperatorError
 from notesystem.modes.check_mode.errors.markdown_errors import TodoError
+from notesystem.modes.check_mode.line_context import classify_lines
+from notesystem.modes.check_mode.reporters import create_reporter
+from notesystem.modes.check_mode.reporters import Reporter
+from notesystem.modes.check_mode.rule_engine import RuleEngine
+from notesystem.modes.check_mode.rule_profile import DECODE
+from notesystem.modes.check_mode.rule_profile import READ
+from notesystem.modes.check_mode.rule_profile import RuleProfile
+from notesystem.modes.check_mode.rule_profile import RuleStats
 
 ##########################
 # ----- CHECK MODE ----- #
@@ -34,6 +76,123 @@ ALL_ERRORS = [
     NewlineBeforeHeaderError,
 ]
 
+# Maps the name of an error to an instance of the error, used to turn
+# the error names in compact results back into error types
+ERRORS_BY_NAME: Dict[str, BaseError] = {
+    error.get_error_name(): error() for error in ALL_ERRORS
+}
+
+# The compact form of DocumentErrors that is send back by the worker
+# processes: (file_path, [(line_nr, line, error_name), ...])
+CompactDocumentErrors = Tuple[
+    str,
+    List[Tuple[Optional[int], Optional[str], str]],
+]
+
+
+def pack_doc_errors(doc_errors: DocumentErrors) -> CompactDocumentErrors:
+    """Converts DocumentErrors into their compact form
+
+    Only the name of the error type is kept, so that no error
+    instances have to be pickled.
+
+    Arguments:
+        doc_errors {DocumentErrors} -- The document errors to pack
+
+    Returns:
+        {CompactDocumentErrors} -- The compact document errors
+
+    """
+    return (
+        doc_errors['file_path'],
+        [
+            (err['line_nr'], err['line'], err['error_type'].get_error_name())
+            for err in doc_errors['errors']
+        ],
+    )
+
+
+def unpack_doc_errors(compact: CompactDocumentErrors) -> DocumentErrors:
+    """Converts compact document errors back into DocumentErrors
+
+    Arguments:
+        compact {CompactDocumentErrors} -- The compact document errors
+
+    Returns:
+        {DocumentErrors} -- The document errors
+
+    """
+    file_path, errors = compact
+    return DocumentErrors(
+        file_path=file_path,
+        errors=[
+            ErrorMeta(
+                line_nr=line_nr,
+                line=line,
+                error_type=ERRORS_BY_NAME[error_name],
+            )
+            for line_nr, line, error_name in errors
+        ],
+    )
+
+
+# The CheckMode instance used by a worker process, set by _init_worker
+_worker_check_mode: Optional['CheckMode'] = None
+
+
+def _init_worker(
+    disabled_errors: List[str],
+    fix: bool,
+    profile: bool = False,
+) -> None:
+    """Initializes a worker process of the check process pool"""
+    global _worker_check_mode
+    _worker_check_mode = CheckMode()
+    _worker_check_mode._disabled_errors = disabled_errors
+    _worker_check_mode._fix = fix
+    if profile:
+        _worker_check_mode._profile = RuleProfile()
+
+
+def _check_files_worker(
+    file_paths: List[str],
+    encodings: Dict[str, str],
+) -> Tuple[
+    List[CompactDocumentErrors],
+    Dict[str, str],
+    Optional[Dict[str, RuleStats]],
+]:
+    """Checks a chunk of files inside a worker process
+
+    Arguments:
+        file_paths {List[str]}     -- The files to check
+        encodings {Dict[str, str]} -- The known encodings of the files
+
+    Returns:
+        The compact errors of every file, the encodings of the files and
+        the profile stats of the chunk (None when the rules are not
+        profiled)
+
+    """
+    assert _worker_check_mode is not None
+    _worker_check_mode._encodings.update(encodings)
+    results = [
+        pack_doc_errors(_worker_check_mode._check_file(file_path))
+        for file_path in file_paths
+    ]
+    # The encodings are returned to the main process and not kept here
+    chunk_encodings = {
+        file_path: _worker_check_mode._encodings.pop(file_path)
+        for file_path in file_paths
+        if file_path in _worker_check_mode._encodings
+    }
+    profile = _worker_check_mode._profile
+    return (
+        results,
+        chunk_encodings,
+        None if profile is None else profile.pop_stats(),
+    )
+
 
 class CheckModeArgs(TypedDict):
     """Arguments for the check mode"""
@@ -45,23 +204,140 @@ class CheckModeArgs(TypedDict):
     simple_errors: bool
     # Disabled errors
     disabled_errors: List[str]
+    # Wether to use the (on disk) cache to skip unchanged files
+    cache: bool
+    # The directory the cache is stored in
+    cache_dir: str
+    # The amount of processes used to check the files (None: cpu count)
+    jobs: Optional[int]
+    # How the errors are shown: text or a machine readable format
+    output_format: str
+    # Wether to keep checking the files that change (until canceled)
+    watch: bool
+    # Only check the files changed since this git revision
+    changed_since: Optional[str]
+    # Only check the files that are staged in git
+    staged: bool
+    # Stop checking after the first file with errors
+    fail_fast: bool
+    # Stop checking once this many errors are found (None: no limit)
+    max_errors: Optional[int]
+    # Print the time spent per error in this format (None: not profiled)
+    profile_rules: Optional[str]
 
 
 class CheckMode(BaseMode):
     """Check markdown files for errors and fix them if nessesary"""
 
-    # The errors that can be found.
-    # TODO: Replace with a more modular way
-    possible_line_markdown_errors: List[MarkdownError] = [
-        MathError(), TodoError(), RequiredSpaceAfterHeadersymbolError(),
-    ]
-    possible_multi_line_markdown_errors: List[MarkdownError] = [
+    # The amount of files a worker process checks per task
+    PARALLEL_CHUNK_SIZE = 16
+
+    # The time (in seconds) between looking for changed files in watch mode
+    WATCH_INTERVAL = 0.1
+
+    # The lines around changed lines that are checked as well when only
+    # the changed lines are checked (a line can cause errors on the lines
+    # before and after it)
+    CHANGED_CONTEXT_LINES = 1
+
+    # Documents with at least this many lines are checked at once (see
+    # RuleEngine.check_document), shorter documents are checked line by
+    # line, because joining and searching the document only pays off for
+    # longer documents
+    BATCH_MIN_LINES = 100
+
+    # Files larger than this (in bytes) are checked while they are read
+    # (see _check_large_file), so they are never loaded in memory at once
+    STREAM_THRESHOLD = 32 * 1024 * 1024
+
+    # The errors that can be found on a line (using the previous and next
+    # line). Errors on the same line are reported in this order.
+    possible_markdown_errors: List[MarkdownError] = [
+        MathError(),
+        TodoError(),
+        RequiredSpaceAfterHeadersymbolError(),
         SeperatorError(),
         NewlineBeforeHeaderError(),
     ]
 
     possible_ast_errors: List[AstError] = [ListIndentError()]
 
+    def __init__(self) -> None:
+        super().__init__()
+        # Set by _run, defaults allow calling the check methods directly
+        self._disabled_errors: List[str] = []
+        self._jobs = 1
+        self._fix = False
+        self._output_format = 'text'
+        # Only check the files that changed in git (see _iter_check_changed)
+        self._changed_since: Optional[str] = None
+        self._staged = False
+        # Used to write the fixed files in the background (see _run)
+        self._writer: Optional[FileWriter] = None
+        self._cache: Optional[CheckCache] = None
+        self._rule_engine: Optional[RuleEngine] = None
+        self._rule_engine_disabled: List[str] = []
+        # Collects the time spent per error when profiling (see _run)
+        self._profile: Optional[RuleProfile] = None
+        # The errors of every checked file (absolute path), used in watch
+        # mode to find out which errors are new and which are resolved
+        self._error_table: Dict[str, List[ErrorMeta]] = {}
+        # The encoding of every read file, used to write the fixed files
+        # and stored in the cache (see _decode_lines)
+        self._encodings: Dict[str, str] = {}
+
+    def configure(
+        self,
+        disabled_errors: List[str],
+        cache: Optional[CheckCache] = None,
+    ) -> None:
+        """Sets the errors that are not checked and the cache to use
+
+        Used when the files are checked with check_files instead of
+        running the mode (e.g. by daemon mode).
+
+        Arguments:
+            disabled_errors {List[str]}   -- The names of the errors that
+                                             are not checked
+            cache {Optional[CheckCache]}  -- The cache of the results,
+                                             None to check every file
+
+        """
+        self._disabled_errors = disabled_errors
+        self._cache = cache
+
+    def check_files(
+        self,
+        file_paths: List[str],
+        fix: bool = False,
+        writer: Optional[FileWriter] = None,
+    ) -> Iterator[DocumentErrors]:
+        """Checks (and fixes) the given files
+
+        Nothing is printed and the settings of the mode are not changed,
+        so the same mode can be used for checking and fixing. The cache,
+        the rule engine and the encodings of the files are shared.
+
+        Arguments:
+            file_paths {List[str]}        -- The paths of the files to
+                                             check
+            fix {bool}                    -- Wether to fix the errors
+            writer {Optional[FileWriter]} -- Writes the fixed files, when
+                                             None they are written before
+                                             the errors are yielded
+
+        Returns:
+            Iterator[DocumentErrors] -- The errors of every file, in the
+                                        same order as file_paths
+
+        """
+        # Created first, so the rule engine is kept for the next checks
+        self._get_rule_engine()
+        check_mode = copy.copy(self)
+        check_mode._fix = fix
+        check_mode._writer = writer
+        yield from check_mode._check_files(file_paths)
+
     def _check_dir(self, dir_path: str) -> List[DocumentErrors]:
         """Checks all the markdown files in the given directory for errors
 
@@ -76,6 +352,26 @@ class CheckMode(BaseMode):
         Returns:
             List[DocumentError] -- The found document errors
 
+        """
+        return list(self._iter_check_dir(dir_path))
+
+    def _iter_check_dir(self, dir_path: str) -> Iterator[DocumentErrors]:
+        """Checks all the markdown files in the given directory for errors
+
+        Same as _check_dir, but the errors of every file are yielded as
+        soon as the file is checked.
+
+        Arguments:
+            dir_path {str} -- The path to the directory containing the
+                              markdown files to check.
+
+        Raises:
+            {NotADirectoryError} -- When the given dir_path does not exist,
+                                    NotADirectoryError is raised.
+
+        Returns:
+            Iterator[DocumentErrors] -- The found document errors
+
         """
 
         if not os.path.isdir(os.path.abspath(dir_path)):
@@ -85,23 +381,251 @@ class CheckMode(BaseMode):
             )
             raise NotADirectoryError
 
-        md_files = find_all_md_files(dir_path)
+        # Sorted so that the output is in the same order on every run
+        md_files = sorted(find_all_md_files(dir_path))
         self._logger.info(f'Found {len(md_files)} to check')
 
-        errors: List[DocumentErrors] = []
-        for file in md_files:
-            doc_errors = self._check_file(file)
+        for doc_errors in self._check_files(md_files):
+            self._logger.info(
+                f"Found {len(doc_errors['errors'])} errors in "
+                f"{doc_errors['file_path']}",
+            )
+            yield doc_errors
+
+    def _check_files(self, file_paths: List[str]) -> Iterator[DocumentErrors]:
+        """Checks the given files, skipping files that are cached
+
+        The results are yielded in the same order as file_paths.
+
+        Arguments:
+            file_paths {List[str]} -- The paths of the files to check
+
+        Returns:
+            Iterator[DocumentErrors] -- The errors of every file
+
+        """
+
+        if self._cache is None:
+            yield from self._check_uncached_files(file_paths)
+            return
+
+        cached: Dict[str, DocumentErrors] = {}
+        for file_path in file_paths:
+            cached_errors = self._cache.lookup(file_path)
+            # Decode the file like on the last run (also when it changed)
+            encoding = self._cache.encoding(file_path)
+            if encoding is not None:
+                self._encodings.setdefault(file_path, encoding)
+            if cached_errors is not None:
+                cached[file_path] = unpack_doc_errors(
+                    (file_path, cached_errors),
+                )
+                # Checked files are fixed while checking,
+                # cached files still have to be fixed
+                if self._fix:
+                    self._fix_doc_errors(cached[file_path])
+        self._logger.info(
+            f'{len(cached)} of {len(file_paths)} files are unchanged',
+        )
+
+        checked = self._check_uncached_files(
+            [fp for fp in file_paths if fp not in cached],
+        )
+        for file_path in file_paths:
+            if file_path in cached:
+                yield cached[file_path]
+            else:
+                doc_errors = next(checked)
+                self._cache.store(
+                    file_path,
+                    pack_doc_errors(doc_errors)[1],
+                    self._encodings.get(file_path),
+                )
+                yield doc_errors
+
+    def _check_uncached_files(
+        self,
+        file_paths: List[str],
+    ) -> Iterator[DocumentErrors]:
+        """Checks the given files, checking identical files only once
+
+        Files with the same content (e.g. copies of a template) have the
+        same errors, so only the first of them is checked. The errors are
+        copied to the others, which are fixed as well when fixing.
+        The results are yielded in the same order as file_paths.
+
+        Arguments:
+            file_paths {List[str]} -- The paths of the files to check
+
+        Returns:
+            Iterator[DocumentErrors] -- The errors of every file
+
+        """
+
+        duplicate_of = find_duplicate_files(file_paths)
+        if duplicate_of:
             self._logger.info(
-                f"Found {len(doc_errors['errors'])} errors in {file}",
+                f'{len(duplicate_of)} files are copies of other files',
+            )
+        have_duplicates = set(duplicate_of.values())
+        checked = self._check_unique_files(
+            [fp for fp in file_paths if fp not in duplicate_of],
+        )
+        # The errors of the files that have duplicates
+        originals: Dict[str, DocumentErrors] = {}
+        for file_path in file_paths:
+            original = duplicate_of.get(file_path)
+            if original is None:
+                doc_errors = next(checked)
+                if file_path in have_duplicates:
+                    originals[file_path] = doc_errors
+                yield doc_errors
+                continue
+
+            doc_errors = DocumentErrors(
+                file_path=file_path,
+                errors=[err.copy() for err in originals[original]['errors']],
             )
-            errors.append(doc_errors)
+            if original in self._encodings:
+                self._encodings[file_path] = self._encodings[original]
+            if self._fix:
+                self._fix_doc_errors(doc_errors)
+            yield doc_errors
+
+    def _check_unique_files(
+        self,
+        file_paths: List[str],
+    ) -> Iterator[DocumentErrors]:
+        """Checks the given files, using a process pool when self._jobs > 1
+
+        The results are yielded in the same order as file_paths.
+
+        Arguments:
+            file_paths {List[str]} -- The paths of the files to check
+
+        Returns:
+            Iterator[DocumentErrors] -- The errors of every file
+
+        """
+
+        # Starting processes is only worth it when there is enough work
+        if self._jobs <= 1 or len(file_paths) <= self.PARALLEL_CHUNK_SIZE:
+            for file_path in file_paths:
+                yield self._check_file(file_path)
+            return
 
-        return errors
+        chunks = [
+            file_paths[i:i + self.PARALLEL_CHUNK_SIZE]
+            for i in range(0, len(file_paths), self.PARALLEL_CHUNK_SIZE)
+        ]
+        self._logger.info(
+            f'Checking {len(file_paths)} files using {self._jobs} processes',
+        )
+
+        # Only a limited amount of chunks is scheduled at once, the results
+        # are collected in the order the chunks were submitted
+        max_pending = self._jobs * 2
+        pending: Deque[Future] = deque()
+        with ProcessPoolExecutor(
+            max_workers=self._jobs,
+            initializer=_init_worker,
+            initargs=(
+                self._disabled_errors, self._fix, self._profile is not None,
+            ),
+        ) as executor:
+            try:
+                for chunk in chunks:
+                    encodings = {
+                        file_path: self._encodings[file_path]
+                        for file_path in chunk
+                        if file_path in self._encodings
+                    }
+                    pending.append(
+                        executor.submit(
+                            _check_files_worker, chunk, encodings,
+                        ),
+                    )
+                    if len(pending) >= max_pending:
+                        yield from self._chunk_results(pending.popleft())
+                while pending:
+                    yield from self._chunk_results(pending.popleft())
+            finally:
+                # When checking stopped early (e.g. --fail-fast), the
+                # chunks that did not start yet are not checked
+                for future in pending:
+                    future.cancel()
+
+    def _chunk_results(self, future: Future) -> Iterator[DocumentErrors]:
+        """Yields the results of a chunk checked by a worker process"""
+        results, encodings, stats = future.result()
+        self._encodings.update(encodings)
+        if self._profile is not None and stats is not None:
+            self._profile.merge(stats)
+        for compact in results:
+            yield unpack_doc_errors(compact)
+
+    def _get_rule_engine(self) -> RuleEngine:
+        """Returns the rule engine for the enabled markdown errors
+
+        The engine is created once and recreated when the
+        disabled errors change.
+
+        """
+        if (
+            self._rule_engine is None or
+            self._rule_engine_disabled != self._disabled_errors
+        ):
+            rules = [
+                err for err in self.possible_markdown_errors
+                if err.get_error_name() not in self._disabled_errors
+            ]
+            self._rule_engine = RuleEngine(
+                rules,
+                self._profile.record_rule
+                if self._profile is not None else None,
+            )
+            self._rule_engine_disabled = list(self._disabled_errors)
+        return self._rule_engine
+
+    def _read_file(self, file_path: str) -> Optional[List[str]]:
+        """Reads the lines of a file
+
+        Arguments:
+            file_path {str} -- The path to the file to read
+
+        Returns:
+            Optional[List[str]] -- The lines of the file, None when the
+                                   file could not be read
+
+        """
+
+        profile = self._profile
+        if profile is not None:
+            profile.start_file(file_path)
+        start = perf_counter()
+        try:
+            with open(file_path, 'rb') as md_file:
+                data = md_file.read()
+        except OSError as error:
+            self._logger.warning(
+                f'Could not open {file_path}. Skipping the file...',
+            )
+            self._logger.info(error)
+            return None
+        if profile is None:
+            return self._decode_lines(file_path, data)
+
+        read_end = perf_counter()
+        profile.record(READ, read_end - start)
+        lines = self._decode_lines(file_path, data)
+        profile.record(DECODE, perf_counter() - read_end)
+        return lines
 
     def _check_file(self, file_path: str) -> DocumentErrors:
         """Opens a file and checks it for errors
 
-        Uses the possible_errors list to check every line if a error is present
+        When fixing is enabled the errors are fixed directly, using the
+        lines that are already read.
 
         Arguments:
             file_path {str} -- Absolute path to the file to check
@@ -113,133 +637,367 @@ class CheckMode(BaseMode):
 
         # TODO: Check if file exists
 
+        if self._is_large_file(file_path):
+            return self._check_large_file(file_path)
+
+        lines = self._read_file(file_path)
+        if lines is None:
+            return DocumentErrors(file_path=file_path, errors=[])
+
+        doc_errors = self._check_lines(file_path, lines)
+        if self._fix:
+            self._fix_doc_errors(doc_errors, lines)
+
+        return doc_errors
+
+    def _check_lines(
+        self,
+        file_path: str,
+        lines: List[str],
+        ranges: Optional[List[LineRange]] = None,
+    ) -> DocumentErrors:
+        """Checks the lines of a file for errors
+
+        Uses the rule engine to check every line for the possible markdown
+        errors and checks the whole document for the possible ast errors.
+
+        Arguments:
+            file_path {str}   -- The path of the file the lines are from
+            lines {List[str]} -- The lines to check
+            ranges {Optional[List[LineRange]]} -- When given, only these
+                                                  line ranges (and the
+                                                  lines around them) are
+                                                  checked for markdown
+                                                  errors
+
+        Returns:
+            List[DocumentError] -- The errors that are found in the lines.
+
+        """
+
+        profile = self._profile
+        if profile is not None:
+            profile.start_file(file_path)
+        engine = self._get_rule_engine()
         errors: List[ErrorMeta] = []
-        # Open file
-        lines: List[str] = []
+        if ranges is None:
+            if len(lines) >= self.BATCH_MIN_LINES:
+                errors.extend(engine.check_document(lines))
+            else:
+                errors.extend(engine.check(lines))
+        else:
+            # The contexts depend on the lines before the ranges as well
+            contexts = classify_lines(lines)
+            context = self.CHANGED_CONTEXT_LINES
+            for start, end in merge_ranges(
+                [(start - context, end + context) for start, end in ranges],
+            ):
+                errors.extend(
+                    engine.iter_range_errors(lines, start, end, contexts),
+                )
 
-        try:
-            with open(file_path, 'r') as md_file:
-                lines = md_file.readlines()
-        except UnicodeDecodeError as e:
-            # Try different reading mode
-            # when UnicodeDecodeError error is thrown
-            self._logger.debug(
-                'Caught UnicodeDecodeError, swithcing read mode',
-            )
-            self._logger.debug(e)
-            try:
-                with open(file_path, 'r', encoding='windows-1252') as m_file:
-                    lines = m_file.readlines()
-            except Exception as e2:
-                self._logger.warning(
-                    f'Could not open {file_path}. Skipping the file...',
+        # Check ast errors
+        for ast_err in self._enabled_ast_errors():
+            if not self._validate_ast(ast_err, lines):
+                new_err = ErrorMeta(
+                    # AstErrors do not need line nummers or line values
+                    # When applying the fix the whole doc will be fixed
+                    line_nr=None,
+                    line=None,
+                    error_type=ast_err,
                 )
-                self._logger.info(e2)
-                return DocumentErrors(file_path=file_path, errors=errors)
-        except Exception as error:
+                errors.append(new_err)
+
+        return DocumentErrors(file_path=file_path, errors=errors)
+
+    def _enabled_ast_errors(self) -> List[AstError]:
+        return [
+            err for err in self.possible_ast_errors
+            if err.get_error_name() not in self._disabled_errors
+        ]
+
+    def _validate_ast(self, ast_err: AstError, lines: List[str]) -> bool:
+        """Validates the lines with the ast error, profiling when enabled"""
+        validate_start = perf_counter()
+        valid = ast_err.validate(lines)
+        if self._profile is not None:
+            self._profile.record(
+                ast_err.get_error_name(),
+                perf_counter() - validate_start,
+                hits=0 if valid else 1,
+            )
+        return valid
+
+    def _is_large_file(self, file_path: str) -> bool:
+        try:
+            return os.path.getsize(file_path) > self.STREAM_THRESHOLD
+        except OSError:
+            # _read_file reports the error
+            return False
+
+    def _check_large_file(self, file_path: str) -> DocumentErrors:
+        """Checks a (very large) file while it is read
+
+        The file is read line by line. The markdown errors are checked
+        while reading and the ast errors are checked on parts of the
+        file (see AstPartSplitter), so only a part of the file is in
+        memory at once. Errors that are fixable are fixed in a second
+        pass over the file.
+
+        Arguments:
+            file_path {str} -- Absolute path to the file to check
+
+        Returns:
+            List[DocumentError] -- The errors that are found in the file.
+
+        """
+
+        try:
+            with open(file_path, 'rb') as md_file:
+                head = md_file.read(4)
+            # The whole file can not be checked for bytes that are not
+            # valid, so decoding is restarted with the next encoding
+            # when it fails. latin-1 decodes any file.
+            for encoding in [
+                *encoding_candidates(head, self._encodings.get(file_path)),
+                'latin-1',
+            ]:
+                try:
+                    with open(file_path, 'r', encoding=encoding) as md_file:
+                        doc_errors = self._check_stream(file_path, md_file)
+                except UnicodeDecodeError:
+                    continue
+                self._encodings[file_path] = encoding
+                break
+        except OSError as error:
             self._logger.warning(
                 f'Could not open {file_path}. Skipping the file...',
             )
             self._logger.info(error)
-            return DocumentErrors(file_path=file_path, errors=errors)
-
-        for line_nr, line in enumerate(lines):
-            # Go through the errors that can occur on the current line
-            for err in self.possible_line_markdown_errors:
-                if not err.validate([line]):
-                    if err.get_error_name() not in self._disabled_errors:
-                        new_err = ErrorMeta(
-                            line_nr=line_nr, line=line, error_type=err,
-                        )
-                        errors.append(new_err)
-
-            # Go through the errors that need multiple lines
-            # to check for errors
-            for m_err in self.possible_multi_line_markdown_errors:
-                # SeperatorError needs access to multiple lines
-                if isinstance(m_err, SeperatorError):
-                    if line_nr == len(lines) - 1:
-                        continue
-                    if not m_err.validate([line, lines[line_nr + 1]]):
-                        if m_err.get_error_name() not in self._disabled_errors:
-                            new_err = ErrorMeta(
-                                line_nr=line_nr, line=line, error_type=m_err,
-                            )
-                            errors.append(new_err)
-                elif isinstance(m_err, NewlineBeforeHeaderError):
-                    # NewlineBeforeHeaderError needs acces to the current
-                    # and the previous line
-                    if line_nr == 0:
-                        continue
-                    if not m_err.validate([lines[line_nr - 1], line]):
-                        new_err = ErrorMeta(
-                            line_nr=line_nr, line=line, error_type=m_err,
-                        )
-                        errors.append(new_err)
+            return DocumentErrors(file_path=file_path, errors=[])
 
-        # Check ast errors
-        for ast_err in self.possible_ast_errors:
-            if not ast_err.validate(lines):
-                if ast_err.get_error_name() not in self._disabled_errors:
-                    new_err = ErrorMeta(
-                        # AstErrors do not need line nummers or line values
-                        # When applying the fix the whole doc will be fixed
-                        line_nr=None,
-                        line=None,
-                        error_type=ast_err,
-                    )
-                    errors.append(new_err)
+        if self._fix:
+            self._fix_large_file(doc_errors)
+        return doc_errors
+
+    def _check_stream(
+        self,
+        file_path: str,
+        lines: Iterable[str],
+    ) -> DocumentErrors:
+        """Checks the lines of a file, reading them only once
+
+        Gives the same errors as _check_lines.
+
+        Arguments:
+            file_path {str}       -- The path of the file the lines are from
+            lines {Iterable[str]} -- The lines to check
 
+        Returns:
+            List[DocumentError] -- The errors that are found in the lines.
+
+        """
+
+        if self._profile is not None:
+            self._profile.start_file(file_path)
+        # The ast errors that are not found yet, once an error is found
+        # in a part the other parts do not have to be checked for it
+        ast_errors = self._enabled_ast_errors()
+        found: List[AstError] = []
+        splitter = AstPartSplitter()
+
+        def validate_part(part: List[str]) -> None:
+            for ast_err in list(ast_errors):
+                if not self._validate_ast(ast_err, part):
+                    ast_errors.remove(ast_err)
+                    found.append(ast_err)
+
+        def split_parts(lines: Iterable[str]) -> Iterator[str]:
+            for line in lines:
+                if ast_errors:
+                    part = splitter.push(line)
+                    if part is not None:
+                        validate_part(part)
+                yield line
+            if ast_errors:
+                validate_part(splitter.finish())
+
+        engine = self._get_rule_engine()
+        errors = list(engine.iter_errors(split_parts(lines)))
+        errors.extend(
+            ErrorMeta(line_nr=None, line=None, error_type=ast_err)
+            for ast_err in self.possible_ast_errors if ast_err in found
+        )
         return DocumentErrors(file_path=file_path, errors=errors)
 
-    def _fix_doc_errors(self, doc_errors: DocumentErrors):
+    def _index_fixes(
+        self,
+        errors: List[ErrorMeta],
+    ) -> Tuple[Dict[int, List[BaseError]], List[AstError]]:
+        """Indexes the fixable errors on line number
+
+        The errors on a line are sorted in the order of
+        possible_markdown_errors (so the errors that add new lines
+        are fixed last).
+
+        Arguments:
+            errors {List[ErrorMeta]}  -- The errors found in a document
+
+        Returns:
+            Tuple[Dict[int, List[BaseError]], List[AstError]] -- The errors
+                to fix per line number and the fixable ast errors
+
+        """
+
+        fix_order = {
+            err.get_error_name(): i
+            for i, err in enumerate(self.possible_markdown_errors)
+        }
+        # Other errors are fixed after the known errors
+        last = len(fix_order)
+
+        # line_nr -> the errors to fix on that line
+        line_fixes: Dict[int, List[BaseError]] = {}
+        ast_errors: List[AstError] = []
+        for err in errors:
+            error_type = err['error_type']
+            if not error_type.is_fixable():
+                continue
+            if isinstance(error_type, AstError):
+                # AstErrors have no line number
+                ast_errors.append(error_type)
+            elif err['line_nr'] is not None:
+                fixes = line_fixes.setdefault(err['line_nr'], [])
+                if not any(type(f) is type(error_type) for f in fixes):
+                    fixes.append(error_type)
+
+        for fixes in line_fixes.values():
+            fixes.sort(key=lambda f: fix_order.get(f.get_error_name(), last))
+        return line_fixes, ast_errors
+
+    def _fix_line(self, line: str, fixes: List[BaseError]) -> str:
+        for fix in fixes:
+            line = ''.join(fix.fix([line]))
+        return line
+
+    def _apply_fixes(
+        self,
+        lines: List[str],
+        errors: List[ErrorMeta],
+    ) -> List[str]:
+        """Applies the fixes for the errors to the lines
+
+        All fixable errors on a line are applied (see _index_fixes). The
+        fixes are indexed on line number so the lines are only visited
+        once.
+
+        Arguments:
+            lines {List[str]}         -- The lines of the document
+            errors {List[ErrorMeta]}  -- The errors found in the lines
+
+        Returns:
+            List[str] -- The fixed lines (a fixed line can contain
+                         multiple newlines)
+
+        """
+
+        line_fixes, ast_errors = self._index_fixes(errors)
+
+        correct_lines = list(lines)
+        for line_nr, fixes in line_fixes.items():
+            if line_nr >= len(correct_lines):
+                continue
+            correct_lines[line_nr] = self._fix_line(
+                correct_lines[line_nr], fixes,
+            )
+
+        # Because AstErrors.fix returns all the lines of the file
+        # correct_lines can be set to the return of the fix
+        for ast_err in ast_errors:
+            correct_lines = ast_err.fix(correct_lines)
+
+        return correct_lines
+
+    def _fix_large_file(self, doc_errors: DocumentErrors) -> None:
+        """Fixes the errors in a (very large) file while it is read
+
+        The fixed lines are written to a new file that replaces the file,
+        so the file is never in memory at once. AstErrors need the whole
+        file to be fixed, so they are not fixed.
+
+        Arguments:
+            doc_errors {DocumentErrors} -- The document errors to fix
+
+        """
+        file_path = doc_errors['file_path']
+        line_fixes, ast_errors = self._index_fixes(doc_errors['errors'])
+        for ast_err in ast_errors:
+            self._logger.warning(
+                f'{file_path} is too large to fix '
+                f'{ast_err.get_error_name()}',
+            )
+        if not line_fixes:
+            self._logger.debug(f'Nothing to fix in {file_path}')
+            return
+
+        self._logger.info(f'Fixing {file_path}')
+        encoding = self._encodings.get(file_path)
+        try:
+            with open(file_path, 'r', encoding=encoding) as md_file:
+                atomic_write_lines(
+                    file_path,
+                    (
+                        self._fix_line(line, line_fixes[line_nr])
+                        if line_nr in line_fixes else line
+                        for line_nr, line in enumerate(md_file)
+                    ),
+                    encoding,
+                )
+        except OSError as error:
+            self._logger.warning(f'Could not fix {file_path}')
+            self._logger.info(error)
+
+    def _fix_doc_errors(
+        self,
+        doc_errors: DocumentErrors,
+        lines: Optional[List[str]] = None,
+    ) -> None:
         """Fixes the erros in the given document
 
+        The file is only written when the content changes. It is written
+        atomically, using self._writer when it is set.
+
         Arguments:
             doc_errors {DocumentErrors}  -- The document errors to fix
+            lines {Optional[List[str]]}  -- The lines of the document, when
+                                            not given they are read from
+                                            the file
 
         Returns:
             None
         """
         # Get the file path of the current document
         file_path = doc_errors['file_path']
-        wrong_line_nrs = [err['line_nr'] for err in doc_errors['errors']]
-        error_types = [err['error_type'] for err in doc_errors['errors']]
-        ast_errors = [et for et in error_types if isinstance(et, AstError)]
 
         self._logger.info(f'Fixing {file_path}')
 
-        # Loop over lines
-        with open(file_path, 'r') as read_file:
-            lines = read_file.readlines()
-
-        correct_lines: List[str] = []
-        for line_nr, line in enumerate(lines):
-            # If current line is in linenumbers
-            # AstErrors have no line number so these should be skipped
-            if line_nr in wrong_line_nrs:
-                # Replace the current line with the correct line
-                error_type = error_types[wrong_line_nrs.index(line_nr)]
-                if error_type.fixable:
-                    fixed_lines = error_type.fix([line])
-                    for fl in fixed_lines:
-                        correct_lines.append(fl)
-                else:
-                    correct_lines.append(line)
-            else:
-                correct_lines.append(line)
+        if lines is None:
+            lines = self._read_file(file_path)
+            if lines is None:
+                return
 
-        # Loop over all the ast errors and check if they can be fixes
-        # If they can apply the fix
-        # Because AstErrors.fix returns all the lines of the file
-        # correct_lines can be set to the return of the fix
-        for ast_err in ast_errors:
-            if ast_err.fixable:
-                correct_lines = ast_err.fix(lines)
+        correct_lines = self._apply_fixes(lines, doc_errors['errors'])
+        content = ''.join(correct_lines)
+        if content == ''.join(lines):
+            self._logger.debug(f'Nothing to fix in {file_path}')
+            return
 
-        # Write the fixed doc
-        with open(file_path, 'w') as out_file:
-            out_file.writelines(correct_lines)
+        # Write the fixed doc, in the encoding it was read with
+        encoding = self._encodings.get(file_path)
+        if self._writer is not None:
+            self._writer.write(file_path, content, encoding)
+        else:
+            atomic_write(file_path, content, encoding)
 
     def _run(self, args: CheckModeArgs) -> None:
         """The internal entry point for CheckMode
@@ -256,19 +1014,34 @@ class CheckMode(BaseMode):
         self._disabled_errors = args['disabled_errors']
         # The default is set in the config
         self.simple_errors = args['simple_errors']
-
-        errors: List[DocumentErrors] = []
-        if os.path.isdir(os.path.abspath(args['in_path'])):
-            self._logger.info(f'Checking directory {args["in_path"]}')
-            errors = self._check_dir(args['in_path'])
-        elif os.path.isfile(os.path.abspath(args['in_path'])):
-            self._logger.info(f'Checking file {args["in_path"]}')
-            doc_err = self._check_file(args['in_path'])
-            self._logger.info(
-                f"Found {len(doc_err['errors'])} errors in {args['in_path']}",
+        self._jobs = args['jobs'] or os.cpu_count() or 1
+        # The files are fixed while they are checked
+        self._fix = args['fix']
+        self._output_format = args['output_format']
+        self._changed_since = args['changed_since']
+        self._staged = args['staged']
+        if args['profile_rules'] is not None:
+            self._profile = RuleProfile()
+        max_errors = 1 if args['fail_fast'] else args['max_errors']
+        if max_errors is not None and args['watch']:
+            self._logger.warning(
+                '--fail-fast and --max-errors are ignored in watch mode',
             )
-            errors.append(doc_err)
-        else:
+            max_errors = None
+        if args['cache']:
+            self._cache = CheckCache(
+                args['cache_dir'],
+                [
+                    error.get_error_name() for error in ALL_ERRORS
+                    if error.get_error_name() not in self._disabled_errors
+                ],
+            )
+            self._cache.load()
+
+        if not (
+            os.path.isdir(os.path.abspath(args['in_path'])) or
+            os.path.isfile(os.path.abspath(args['in_path']))
+        ):
             warning_msg = (
                 'Could not find file or directory: ',
                 os.path.abspath(args['in_path']),
@@ -284,18 +1057,307 @@ class CheckMode(BaseMode):
 
             raise SystemExit(1)
 
-        if args['fix']:
-            for error in errors:
-                self._fix_doc_errors(error)
-                if self._visual:
-                    if self.simple_errors:
-                        print_simple_doc_error(error, True)
-                    else:
-                        print_doc_error(error, True)
+        reporter: Optional[Reporter] = None
+        if self._output_format != 'text':
+            try:
+                reporter = create_reporter(self._output_format, ALL_ERRORS)
+            except ValueError as e:
+                print(colored(str(e), 'red'), file=sys.stderr)
+                raise SystemExit(1)
+
+        # The fixed files are written in the background while checking
+        if self._fix:
+            self._writer = FileWriter()
+        if reporter is not None:
+            reporter.start()
+        write_errors: List[Tuple[str, BaseException]] = []
+        results = self._check_in_path(args['in_path'])
+        n_errors = 0
+        try:
+            # Every document is reported as soon as it is checked,
+            # so the results are never all kept in memory
+            for doc_errors in results:
+                self._show_doc_errors(doc_errors, reporter)
+                if args['watch']:
+                    file_path = os.path.abspath(doc_errors['file_path'])
+                    self._error_table[file_path] = doc_errors['errors']
+                n_errors += len(doc_errors['errors'])
+                if max_errors is not None and n_errors >= max_errors:
+                    break
+
+            if args['watch']:
+                # While watching the fixed files are written directly
+                write_errors = self._close_writer()
+                self._start_watch_mode(args['in_path'], reporter)
+        finally:
+            # Stops the files that are still being checked when the
+            # checking stopped early
+            results.close()
+            if reporter is not None:
+                reporter.finish()
+            write_errors += self._close_writer()
+
+        if self._profile is not None and args['profile_rules'] is not None:
+            # Written to stderr so it can be used with machine readable output
+            sys.stderr.write(self._profile.format(args['profile_rules']))
+
+        if max_errors is not None and n_errors >= max_errors:
+            msg = f'Stopped checking after finding {n_errors} errors'
+            if self._visual:
+                # Written to stderr when stdout has machine readable output
+                print(
+                    colored(msg, 'red'),
+                    file=sys.stdout if reporter is None else sys.stderr,
+                )
+            else:
+                self._logger.error(msg)
+            raise SystemExit(1)
+
+        if write_errors:
+            raise SystemExit(1)
+
+    def _iter_check_changed(self, in_path: str) -> Iterator[DocumentErrors]:
+        """Checks only the markdown files (and lines) that changed in git
+
+        Uses self._changed_since or self._staged to find the changes. With
+        self._staged the staged content of the files is checked.
+
+        Arguments:
+            in_path {str} -- The file or directory in the git repository
+
+        Returns:
+            Iterator[DocumentErrors] -- The errors of the changed files
+
+        """
+        abs_in_path = os.path.realpath(in_path)
+        try:
+            changed = changed_files(
+                in_path, self._changed_since, self._staged,
+            )
+            md_files = sorted(
+                file_path for file_path in changed
+                if file_path.endswith('.md') and (
+                    file_path == abs_in_path or
+                    file_path.startswith(abs_in_path + os.sep)
+                )
+            )
+            staged = read_staged_files(md_files) if self._staged else {}
+        except GitError as e:
+            msg = f'Could not find the changed files using git: {e}'
+            if self._visual:
+                print(colored(msg, 'red'))
+            else:
+                self._logger.error(msg)
+            raise SystemExit(1)
+
+        self._logger.info(f'Found {len(md_files)} changed files to check')
+        for file_path in md_files:
+            lines: Optional[List[str]]
+            if self._staged:
+                if file_path not in staged:
+                    continue
+                lines = self._decode_lines(file_path, staged[file_path])
+            else:
+                lines = self._read_file(file_path)
+            if lines is None:
+                continue
+
+            doc_errors = self._check_lines(
+                file_path, lines, changed[file_path],
+            )
+            if self._fix:
+                if self._staged and not self._is_unchanged_on_disk(
+                        file_path, staged[file_path],
+                ):
+                    # The fixes would be applied to the staged content
+                    self._logger.warning(
+                        f'Not fixing {file_path}, it has unstaged changes',
+                    )
+                else:
+                    self._fix_doc_errors(doc_errors, lines)
+            yield doc_errors
+
+    def _decode_lines(self, file_path: str, data: bytes) -> List[str]:
+        """Decodes file content, detecting the encoding (see decode_bytes)
+
+        The encoding of the file is remembered, it is tried first the next
+        time the file is decoded and used to write the fixed file.
+
+        """
+        text, encoding = decode_bytes(data, self._encodings.get(file_path))
+        if encoding != 'utf-8':
+            self._logger.debug(f'Decoded {file_path} as {encoding}')
+        self._encodings[file_path] = encoding
+        # Translate the line endings like open() does
+        return io.StringIO(text, newline=None).readlines()
+
+    def _is_unchanged_on_disk(self, file_path: str, data: bytes) -> bool:
+        try:
+            with open(file_path, 'rb') as in_file:
+                return in_file.read() == data
+        except OSError:
+            return False
+
+    def _show_doc_errors(
+        self,
+        doc_errors: DocumentErrors,
+        reporter: Optional[Reporter],
+    ) -> None:
+        """Shows the errors using the reporter or the visual output"""
+        if reporter is not None:
+            reporter.report(doc_errors, self._fix)
+        elif self._visual:
+            if self.simple_errors:
+                print_simple_doc_error(doc_errors, self._fix)
+            else:
+                print_doc_error(doc_errors, self._fix)
+
+    def _start_watch_mode(
+        self,
+        in_path: str,
+        reporter: Optional[Reporter] = None,
+    ) -> None:
+        """Checks files again when they change, until canceled
+
+        Arguments:
+            in_path {str}                -- The file or directory to watch
+            reporter {Optional[Reporter]} -- When given, the errors of
+                                             changed files are reported
+                                             with it
+
+        """
+        abs_in_path = os.path.abspath(in_path)
+        if os.path.isdir(abs_in_path):
+            watch_dir = abs_in_path
+
+            def accept(path: str) -> bool:
+                return True
+        else:
+            # Watch the directory of the file, but only check the file
+            watch_dir = os.path.dirname(abs_in_path)
+
+            def accept(path: str) -> bool:
+                return os.path.abspath(path) == abs_in_path
+
+        changed_files = ChangedFiles()
+        observer = Observer()
+        observer.schedule(
+            WatchHandler(changed_files, accept),
+            watch_dir,
+            recursive=True,
+        )
+
+        self._logger.debug(f'Starting watch mode for: {in_path}')
+        if self._visual and reporter is None:
+            print(
+                colored('Watching for changes in:', 'blue', attrs=['bold']),
+                colored(abs_in_path, 'blue'),
+                colored('(use Ctrl+c to exit)', 'red'),
+            )
+
+        observer.start()
+        try:
+            while True:
+                time.sleep(self.WATCH_INTERVAL)
+                for file_path in changed_files.pop_settled():
+                    self._recheck_file(file_path, reporter)
+        except KeyboardInterrupt:
+            self._logger.debug('Got a KeyboardInterrupt, stopping watcher.')
+        finally:
+            observer.stop()
+            observer.join()
+
+        self._logger.debug(f'Stopped watching {in_path}')
+
+    def _recheck_file(
+        self,
+        file_path: str,
+        reporter: Optional[Reporter] = None,
+    ) -> Tuple[List[ErrorMeta], List[ErrorMeta]]:
+        """Checks a changed file again and shows what changed
+
+        The error table is updated with the new errors. Deleted files
+        are removed from the error table.
+
+        Arguments:
+            file_path {str}               -- The absolute path of the file
+            reporter {Optional[Reporter]} -- When given, the errors of the
+                                             file are reported with it
+
+        Returns:
+            Tuple[List[ErrorMeta], List[ErrorMeta]] -- The new and the
+                                                       resolved errors
+
+        """
+        old_errors = self._error_table.get(file_path, [])
+        if os.path.isfile(file_path):
+            try:
+                doc_errors = self._check_file(file_path)
+            except OSError as e:
+                # The fixed file could not be written
+                self._logger.error(f'Could not fix {file_path}: {e}')
+                return [], []
+            self._error_table[file_path] = doc_errors['errors']
+        else:
+            doc_errors = DocumentErrors(file_path=file_path, errors=[])
+            self._error_table.pop(file_path, None)
+
+        new_errors, resolved_errors = diff_errors(
+            old_errors, doc_errors['errors'],
+        )
+        if reporter is not None:
+            reporter.report(doc_errors, self._fix)
+        elif self._visual:
+            print_error_diff(
+                file_path, new_errors, resolved_errors, self._fix,
+            )
         else:
+            self._logger.info(
+                f'{file_path}: {len(new_errors)} new errors, '
+                f'{len(resolved_errors)} resolved errors',
+            )
+        return new_errors, resolved_errors
+
+    def _check_in_path(
+        self,
+        in_path: str,
+    ) -> Generator[DocumentErrors, None, None]:
+        """Checks the in_path, which can be a directory or a file"""
+        if self._changed_since is not None or self._staged:
+            self._logger.info(f'Checking changed files in {in_path}')
+            yield from self._iter_check_changed(in_path)
+        elif os.path.isdir(os.path.abspath(in_path)):
+            self._logger.info(f'Checking directory {in_path}')
+            try:
+                yield from self._iter_check_dir(in_path)
+            finally:
+                # Also when checking stopped early
+                if self._cache is not None:
+                    self._cache.save()
+        else:
+            self._logger.info(f'Checking file {in_path}')
+            doc_err = self._check_file(in_path)
+            self._logger.info(
+                f"Found {len(doc_err['errors'])} errors in {in_path}",
+            )
+            yield doc_err
+
+    def _close_writer(self) -> List[Tuple[str, BaseException]]:
+        """Waits for the fixed files to be written
+
+        Returns:
+            List[Tuple[str, BaseException]] -- The files that could not be
+                                               written and the errors
+
+        """
+        if self._writer is None:
+            return []
+        write_errors = self._writer.close()
+        self._writer = None
+        for file_path, error in write_errors:
+            msg = f'Could not write the fixed file {file_path}: {error}'
             if self._visual:
-                for error in errors:
-                    if self.simple_errors:
-                        print_simple_doc_error(error)
-                    else:
-                        print_doc_error(error)
+                print(colored(msg, 'red'))
+            else:
+                self._logger.error(msg)
+        return write_errors
@@ -0,0 +1,149 @@
+"""
+Helpers for the watch mode of check mode
+
+File system events are collected by WatchHandler in ChangedFiles. A file
+is only checked again once no new events for it came in for a short while
+(debouncing), so a burst of saves results in a single check. The errors
+found by the new check are compared to the errors of the previous check
+using diff_errors, so that only the new and resolved errors are shown.
+"""
+import os
+import threading
+import time
+from collections import Counter
+from typing import Callable
+from typing import cast
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from watchdog.events import FileMovedEvent
+from watchdog.events import FileSystemEvent
+from watchdog.events import FileSystemEventHandler
+
+from notesystem.modes.check_mode.errors.base_errors import ErrorMeta
+
+# The time (in seconds) without new events before a file is checked again
+DEBOUNCE_SECONDS = 0.3
+
+
+class ChangedFiles:
+    """Keeps track of the files that changed (thread safe)"""
+
+    def __init__(self, debounce: float = DEBOUNCE_SECONDS):
+        """Initialize the changed files
+
+        Arguments:
+            debounce {float} -- The time without new events before a changed
+                                file is settled
+
+        """
+        self._debounce = debounce
+        self._lock = threading.Lock()
+        # file_path -> time of the last event
+        self._changed: Dict[str, float] = {}
+
+    def add(self, file_path: str, now: Optional[float] = None) -> None:
+        """Marks the file as changed"""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self._changed[os.path.abspath(file_path)] = now
+
+    def pop_settled(self, now: Optional[float] = None) -> List[str]:
+        """Returns (and forgets) the files that stopped changing
+
+        Arguments:
+            now {Optional[float]} -- The current (time.monotonic) time
+
+        Returns:
+            {List[str]} -- The settled files, sorted on path
+
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            settled = [
+                file_path for file_path, last_event in self._changed.items()
+                if now - last_event >= self._debounce
+            ]
+            for file_path in settled:
+                del self._changed[file_path]
+        return sorted(settled)
+
+
+class WatchHandler(FileSystemEventHandler):
+    """Adds the markdown files that changed to ChangedFiles"""
+
+    def __init__(
+        self,
+        changed_files: ChangedFiles,
+        accept: Callable[[str], bool],
+    ):
+        """Initialize the handler
+
+        Arguments:
+            changed_files {ChangedFiles}  -- Where the changes are added
+            accept {Callable[[str], bool]} -- Wether a path should be checked
+
+        """
+        super().__init__()
+        self._changed_files = changed_files
+        self._accept = accept
+
+    def on_any_event(self, event: FileSystemEvent):
+        if event.is_directory:
+            return None
+        paths = [os.fsdecode(event.src_path)]
+        if event.event_type == 'moved':
+            # The old path is checked as well, so it is seen as deleted
+            paths.append(os.fsdecode(cast(FileMovedEvent, event).dest_path))
+        for path in paths:
+            if path.endswith('.md') and self._accept(path):
+                self._changed_files.add(path)
+
+
+def _error_key(error: ErrorMeta) -> Tuple[str, Optional[str]]:
+    # The line number is not used, so errors that only moved (because
+    # lines were added or removed above them) are not seen as changed
+    return (error['error_type'].get_error_name(), error['line'])
+
+
+def diff_errors(
+    old_errors: List[ErrorMeta],
+    new_errors: List[ErrorMeta],
+) -> Tuple[List[ErrorMeta], List[ErrorMeta]]:
+    """Compares the errors of two checks of the same file
+
+    Errors are the same when they have the same type and line content.
+
+    Arguments:
+        old_errors {List[ErrorMeta]} -- The errors of the previous check
+        new_errors {List[ErrorMeta]} -- The errors of the new check
+
+    Returns:
+        {Tuple[List[ErrorMeta], List[ErrorMeta]]} -- The new errors and the
+                                                     resolved errors
+
+    """
+    old_keys = Counter(_error_key(e) for e in old_errors)
+    new_keys = Counter(_error_key(e) for e in new_errors)
+
+    added = []
+    for error in new_errors:
+        key = _error_key(error)
+        if old_keys[key] > 0:
+            old_keys[key] -= 1
+        else:
+            added.append(error)
+
+    resolved = []
+    for error in old_errors:
+        key = _error_key(error)
+        if new_keys[key] > 0:
+            new_keys[key] -= 1
+        else:
+            resolved.append(error)
+
+    return added, resolved
@@ -1,7 +1,12 @@
 import enum
+import re
+import threading
+from collections import OrderedDict
 from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Pattern
+from typing import Tuple
 from typing import TypedDict
 
 import mistune
@@ -36,27 +41,246 @@ class AstNode(TypedDict):
     title: Optional[str]
 
 
+# It is easier to (accuractly) detect a ListIndentError
+# using the ast and reasoning about that then using a regex
+# that matches any indented list.
+# The parser is created once, because creating it is (relatively) slow.
+# The parser keeps no state between documents, so it can be shared.
+markdown_parser = mistune.create_markdown(
+    escape=False, renderer=mistune.AstRenderer(),
+    # TODO: Add plugnis
+)
+
+
+class AstCache:
+    """Caches the ast of the most recently parsed documents
+
+    All AstErrors validate the same list of lines when a document is
+    checked, so the document only has to be parsed once.
+    The cache uses the identity of the lines list as key, so the list
+    should not be changed after it is validated.
+
+    """
+
+    def __init__(self, max_size: int = 4):
+        self._max_size = max_size
+        # id(lines) -> (lines, ast), the lines are kept so that the
+        # id can not be reused while the entry is in the cache
+        self._entries: 'OrderedDict[int, Tuple[List[str], List[AstNode]]]' = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, lines: List[str]) -> List[AstNode]:
+        """Returns the ast of the lines, parsing them when not cached
+
+        Arguments:
+            lines {List[str]} -- The lines of the document
+
+        Returns:
+            {List[AstNode]} -- The ast of the document
+
+        """
+        key = id(lines)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is lines:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        ast: List[AstNode] = markdown_parser('\n'.join(lines))  # type: ignore
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (lines, ast)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        return ast
+
+    def clear(self) -> None:
+        """Removes all documents from the cache"""
+        with self._lock:
+            self._entries.clear()
+
+
+# The ast cache shared by all AstErrors
+ast_cache = AstCache()
+
+
+# The block level constructs (of the markdown parser) that can span
+# multiple lines, used by AstPartSplitter. Matched on lines without the
+# line ending.
+_THEMATIC_BREAK_RE = re.compile(
+    r' {0,3}(?:(?:-[ \t]*){3,}|(?:_[ \t]*){3,}|(?:\*[ \t]*){3,})$',
+)
+_FENCE_START_RE = re.compile(r' {0,3}(`{3,}|~{3,})[^`]*$')
+_HTML_BLOCK_START_RE = re.compile(
+    r' {0,3}(?:<(script|pre|style)(?:[\s>]|$)|(<!--)(?!-?>)|(<\?)|'
+    r'(<![A-Z])|(<!\[CDATA\[))',
+    re.I,
+)
+# The end of the html blocks, in the order of the groups in the regex
+_HTML_BLOCK_ENDS = (None, '-->', '?>', '>', ']]>')
+_LIST_START_RE = re.compile(r'( {0,3})([*+-]|\d{1,9}[.)])(?:[ \t]*|[ \t].+)$')
+_LIST_HR_RE = re.compile(r' *(?:(?:-[ \t]*){3,}|(?:\*[ \t]*){3,})$')
+_LEADING_TAB_RE = re.compile(r'^( {0,3})\t')
+# The first characters of the lines that can start one of the blocks above
+_BLOCK_START_CHARS = frozenset('-_*+`~<0123456789')
+
+
+class AstPartSplitter:
+    """Splits the lines of a document into parts that can be parsed alone
+
+    Used to check very large documents for AstErrors without parsing the
+    whole document at once. A new part is only started at a line that is
+    not indented, outside of code blocks, multi line html blocks and lists,
+    so the top level blocks of every part are the same as in the ast of
+    the whole document. Lines are collected until a part is at least
+    min_part_size characters.
+
+    """
+
+    def __init__(self, min_part_size: int = 1 << 18):
+        self._min_part_size = min_part_size
+        self._part: List[str] = []
+        self._part_size = 0
+        # The closing fence (pattern) while in a code block
+        self._fence_end: Optional[Pattern[str]] = None
+        # The end of the html block while in a multi line html block
+        self._html_end: Optional[str] = None
+        # While in a list: the pattern of the next item, the marker of the
+        # first item and the indentation of the content of the items
+        self._list_item: Optional[Pattern[str]] = None
+        self._list_marker = ''
+        self._list_indent = 0
+
+    def push(self, line: str) -> Optional[List[str]]:
+        """Adds the next line of the document
+
+        Arguments:
+            line {str} -- The next line
+
+        Returns:
+            {Optional[List[str]]} -- The lines of the finished part when the
+                                     line starts a new part, otherwise None
+
+        """
+        part = None
+        if (
+            self._part and self._part_size >= self._min_part_size and
+            self._fence_end is None and self._html_end is None and
+            line[:1] not in ('', ' ', '\t', '\n') and (
+                # The items of a list depend on the first item
+                self._list_item is None or not self._list_item.match(line)
+            )
+        ):
+            part = self._part
+            self._part = []
+            self._part_size = 0
+        self._part.append(line)
+        self._part_size += len(line)
+        line = line.rstrip('\n')
+        if '\u2424' in line:
+            # The parser replaces \u2424 with a newline
+            for sub_line in line.split('\u2424'):
+                self._update_state(sub_line)
+        else:
+            self._update_state(line)
+        return part
+
+    def finish(self) -> List[str]:
+        """Returns the lines of the last part"""
+        part = self._part
+        self._part = []
+        self._part_size = 0
+        return part
+
+    def _update_state(self, line: str) -> None:
+        if '\t' in line[:4]:
+            # Like the parser, a leading tab is 4 spaces
+            line = _LEADING_TAB_RE.sub(
+                lambda m: m.group(1) + ' ' * (4 - len(m.group(1))), line,
+            )
+        if self._fence_end is not None:
+            if self._fence_end.match(line):
+                self._fence_end = None
+            return
+        if self._html_end is not None:
+            if self._html_end in line.lower():
+                self._html_end = None
+            return
+        stripped = line.lstrip(' ')
+        if not stripped:
+            return
+        indent = len(line) - len(stripped)
+        if self._list_item is not None:
+            if indent >= self._list_indent or stripped[0] == '\t':
+                # The content of a list item can not change the top level
+                return
+            match = self._list_item.match(line)
+            if match is not None and not _LIST_HR_RE.match(line):
+                # The next item of the same list
+                self._start_list_item(match.group(1))
+                return
+            self._list_item = None
+        if indent > 3 or stripped[0] not in _BLOCK_START_CHARS:
+            # Most lines (e.g. text and headers) can not start a block
+            # that spans multiple lines
+            return
+        if _THEMATIC_BREAK_RE.match(line):
+            return
+
+        match = _FENCE_START_RE.match(line)
+        if match is not None:
+            self._fence_end = re.compile(
+                r' {0,3}' + re.escape(match.group(1)) + r'[~`]* *$',
+            )
+            return
+        match = _HTML_BLOCK_START_RE.match(line)
+        if match is not None:
+            index = match.lastindex or 1
+            end = _HTML_BLOCK_ENDS[index - 1] or f'</{match.group(1)}>'
+            if end.lower() not in line[match.end():].lower():
+                self._html_end = end.lower()
+            return
+        match = _LIST_START_RE.match(line)
+        if match is not None:
+            self._list_marker = match.group(2)
+            self._start_list_item(match.group(1))
+
+    def _start_list_item(self, spaces: str) -> None:
+        # Like the markdown parser, the marker of the first item is used
+        # for all items of the list
+        marker = self._list_marker
+        if len(marker) > 1:
+            marker_re = r'\d{0,9}' + re.escape(marker[-1])
+        else:
+            marker_re = re.escape(marker)
+        self._list_item = re.compile(
+            r'( {0,' + str(len(spaces) + len(marker)) + r'})' + marker_re +
+            r'(?:[ \t]*|[ \t].+)$',
+        )
+        self._list_indent = len(spaces) + len(marker) + 1
+
+
 class AstError(BaseError):
     """
     An error in a markdown file that can be found by checking
     the the ast of the file.
+
+    Very large files are validated in parts (see AstPartSplitter), the
+    file is valid when all parts are valid.
     """
     # Wether the error (type) is fixable
 
     fixable = False
 
     def _create_ast(self, lines: List[str]) -> List[AstNode]:
-        # It is easier to (accuractly) detect a ListIndentError
-        # using the ast and reasoning about that then using a regex
-        # that matches any indented list
-        create_ast = mistune.create_markdown(
-            escape=False, renderer=mistune.AstRenderer(),
-            # TODO: Add plugnis
-        )
-
-        ast: List[AstNode] = create_ast('\n'.join(lines))  # type: ignore
-
-        return ast
+        # The ast is shared between all AstErrors
+        return ast_cache.get(lines)
 
     def validate(self, file_lines: List[str]) -> bool:
         """Validates the AST of the file
@@ -1,7 +1,12 @@
 import re
+from typing import FrozenSet
 from typing import List
+from typing import Optional
+from typing import Pattern
 
 from notesystem.modes.check_mode.errors.base_errors import BaseError
+from notesystem.modes.check_mode.line_context import MATH
+from notesystem.modes.check_mode.line_context import PROSE
 
 ####################################
 # ----- MARKDOWN ERRORS ----- #
@@ -21,9 +26,46 @@ class MarkdownError(BaseError):
 
     fixable = False
 
+    # The characters a line has to start with for the error to be possible.
+    # None means that the error can occur on any line.
+    # Used by the RuleEngine to skip rules that can not match a line.
+    trigger_chars: Optional[FrozenSet[str]] = None
+    # Wether leading whitespace is ignored when matching the trigger_chars
+    trigger_lstrip = False
+    # The contexts (see line_context) of the lines the error is checked on.
+    # Lines in code blocks and front matter are not markdown.
+    contexts: FrozenSet[str] = frozenset((PROSE,))
+    # A pattern that is searched in the whole document, used by
+    # RuleEngine.check_document. The error can only be present on the lines
+    # on which a match starts. A newline is put before the document, so a
+    # pattern starting with a newline matches at the start of a line (the
+    # line after the newline). None means every line has to be checked.
+    document_pattern: Optional[Pattern[str]] = None
+
     def validate(self, line: List[str]) -> bool:
         """Validates the line"""
 
+    def check(
+        self,
+        prev_line: Optional[str],
+        line: str,
+        next_line: Optional[str],
+    ) -> bool:
+        """Checks if the error is present on the line
+
+        Arguments:
+            prev_line {Optional[str]} -- The previous line (None for the
+                                         first line)
+            line {str}                -- The line to check
+            next_line {Optional[str]} -- The next line (None for the
+                                         last line)
+
+        Returns:
+            {bool} -- Wether the error is present on the line
+
+        """
+        return False
+
     def fix(self, lines: List[str]) -> List[str]:
         """Fixes the errors of it's type in the given lines"""
 
@@ -51,6 +93,9 @@ class MathError(MarkdownError):
     """
     fixable = True
     regex_pattern = r'\$\$(.*?)\$\$'
+    _regex = re.compile(regex_pattern)
+    contexts = frozenset((PROSE, MATH))
+    document_pattern = re.compile(regex_pattern)
 
     def validate(self, lines: List[str]) -> bool:
         """Check if there is a math error present
@@ -65,10 +110,16 @@ class MathError(MarkdownError):
         if len(lines) > 1:
             raise Exception('MathError only takes one line to validate')
 
-        matches = re.search(self.regex_pattern, lines[0])
-        if not matches:
-            return True
-        return False
+        return not self.check(None, lines[0], None)
+
+    def check(
+        self,
+        prev_line: Optional[str],
+        line: str,
+        next_line: Optional[str],
+    ) -> bool:
+        # The substring test is a lot cheaper than the regex
+        return '$$' in line and self._regex.search(line) is not None
 
     def fix(self, lines: List[str]) -> List[str]:
         """Fixes the math errors in the current line
@@ -121,6 +172,8 @@ class SeperatorError(MarkdownError):
     """
     fixable = True
     regex_pattern = r'^---$'
+    trigger_chars = frozenset('-')
+    document_pattern = re.compile(r'\n---')
 
     def validate(self, lines: List[str]) -> bool:
         """Check if there is a seperator error
@@ -136,12 +189,21 @@ class SeperatorError(MarkdownError):
 
         if len(lines) != 2:
             raise Exception('SeperatorError requires 2 lines to validate')
-        if not lines[0].startswith('---'):
-            return True
-        if lines[1] == '\n':
-            return True
 
-        return False
+        return not self.check(None, lines[0], lines[1])
+
+    def check(
+        self,
+        prev_line: Optional[str],
+        line: str,
+        next_line: Optional[str],
+    ) -> bool:
+        # The last line can not have a seperator error
+        return (
+            next_line is not None and
+            line.startswith('---') and
+            next_line != '\n'
+        )
 
     def fix(self, lines: List[str]) -> List[str]:
         """Fixes the seperator error on the current line
@@ -194,6 +256,10 @@ class TodoError(MarkdownError):
     fixable = True
     # No regex needed
     regex_pattern = r'^\[(x|\s)\]'
+    _regex = re.compile(regex_pattern)
+    trigger_chars = frozenset('[')
+    trigger_lstrip = True
+    document_pattern = re.compile(r'\n[^\S\n]*\[(x|\s)\]')
 
     def validate(self, lines: List[str]) -> bool:
         """Check if there is a todo error
@@ -212,12 +278,17 @@ class TodoError(MarkdownError):
         if len(lines) != 1:
             raise Exception('TodoError requires 1 line to validate')
 
+        return not self.check(None, lines[0], None)
+
+    def check(
+        self,
+        prev_line: Optional[str],
+        line: str,
+        next_line: Optional[str],
+    ) -> bool:
         # Check if the regex_pattern pattern matches the string
         # If it does not there is no TodoError present in the line
-        matches = re.search(self.regex_pattern, lines[0].strip())
-        if not matches:
-            return True
-        return False
+        return self._regex.match(line.strip()) is not None
 
     def fix(self, lines: List[str]) -> List[str]:
 
@@ -249,6 +320,8 @@ class NewlineBeforeHeaderError(MarkdownError):
 
     """
     fixable = True
+    trigger_chars = frozenset('#')
+    document_pattern = re.compile(r'\n#')
 
     def validate(self, lines: List[str]) -> bool:
         """Check if there is a error
@@ -267,12 +340,21 @@ class NewlineBeforeHeaderError(MarkdownError):
         if len(lines) != 2:
             raise Exception('NewlineBeforeHeaderError requires 2\
                             lines to validate')
-        if not lines[1].startswith('#'):
-            return True
-        if lines[0] == '\n':
-            return True
 
-        return False
+        return not self.check(lines[0], lines[1], None)
+
+    def check(
+        self,
+        prev_line: Optional[str],
+        line: str,
+        next_line: Optional[str],
+    ) -> bool:
+        # The first line does not need a newline before it
+        return (
+            prev_line is not None and
+            line.startswith('#') and
+            prev_line != '\n'
+        )
 
     def fix(self, lines: List[str]) -> List[str]:
         """Fixes the seperator error on the current line
@@ -322,6 +404,10 @@ class RequiredSpaceAfterHeadersymbolError(MarkdownError):
     # Note that this regex is for a valid heading
     regex = r'^#{1,} '
     regex_wrong_heading = r'^(#{1,})'
+    _regex = re.compile(regex)
+    _regex_wrong_heading = re.compile(regex_wrong_heading)
+    trigger_chars = frozenset('#')
+    document_pattern = re.compile(r'\n#+(?![ #])')
 
     def validate(self, lines: List[str]) -> bool:
         """
@@ -344,15 +430,15 @@ class RequiredSpaceAfterHeadersymbolError(MarkdownError):
             raise Exception('RequiredSpaceAfterHeadersymbolError\
                             only takes one line to validate')
 
-        line = lines[0]
-        if not line.startswith('#'):
-            return True
-
-        header = re.search(self.regex, line)
-        if header is None:
-            return False
+        return not self.check(None, lines[0], None)
 
-        return True
+    def check(
+        self,
+        prev_line: Optional[str],
+        line: str,
+        next_line: Optional[str],
+    ) -> bool:
+        return line.startswith('#') and self._regex.match(line) is None
 
     def fix(self, lines: List[str]) -> List[str]:
         """
@@ -373,7 +459,7 @@ class RequiredSpaceAfterHeadersymbolError(MarkdownError):
                             only takes one line to validate')
 
         line = lines[0]
-        matched = re.search(self.regex_wrong_heading, line)
+        matched = self._regex_wrong_heading.match(line)
         assert matched
 
         n_symbols = len(matched.group())
@@ -0,0 +1,228 @@
+"""
+Labels every line of a document with the context (region) it is in
+
+The line based errors are only meaningful in normal text (prose). Lines
+in fenced code blocks, the yaml front matter or a multi line math block
+are not markdown, so checking them is wasted work and gives false
+positives (e.g. `#include <stdio.h>` in a C code block is not a header).
+
+The labeling is done in a single linear pass (see iter_line_contexts), so
+it can be done while a document is checked. For a document that is in
+memory the regions can be found without looking at every line (see
+find_regions).
+"""
+import re
+from bisect import bisect_right
+from typing import FrozenSet
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Pattern
+from typing import Sequence
+from typing import Tuple
+
+PROSE = 'prose'
+FENCE = 'fence'
+FRONT_MATTER = 'front_matter'
+MATH = 'math'
+
+ALL_CONTEXTS: FrozenSet[str] = frozenset((PROSE, FENCE, FRONT_MATTER, MATH))
+
+# An opening code fence: at least 3 backticks or tildes and an optional
+# info string. Leading whitespace is allowed, so fences in lists work.
+_FENCE_RE = re.compile(r'^[ \t]*(`{3,}|~{3,})(.*)$', re.DOTALL)
+
+FRONT_MATTER_START = '---'
+FRONT_MATTER_ENDS = ('---', '...')
+
+# Matches (the newline before) the lines that can start a code block or a
+# math block, see LineClassifier.classify
+_REGION_START_RE = re.compile(r'\n[^\S\n]*[`~$]')
+
+
+class LineClassifier:
+    """Labels lines with their context, one line at a time
+
+    Front matter is not recognized by the classifier, because it can only
+    be at the start of a document (see iter_line_contexts).
+    """
+
+    def __init__(self) -> None:
+        # The opening fence (e.g. ```) while in a code block
+        self._fence: Optional[str] = None
+        self._in_math = False
+
+    def classify(self, line: str) -> str:
+        """Returns the context of the line
+
+        The line has to be the line after the previously classified line.
+
+        Arguments:
+            line {str} -- The line to classify
+
+        Returns:
+            {str} -- PROSE, FENCE or MATH
+
+        """
+        fence = self._fence
+        if fence is not None:
+            stripped = line.strip()
+            # The closing fence has to be at least as long as the opening
+            # fence and can not have an info string
+            if stripped.startswith(fence) and not stripped.strip(fence[0]):
+                self._fence = None
+            return FENCE
+
+        if self._in_math:
+            # Math (like all inline elements) ends at the end of a paragraph
+            if not line.strip():
+                self._in_math = False
+                return PROSE
+            if line.count('$$') % 2 == 1:
+                self._in_math = False
+            return MATH
+
+        first = line.lstrip()[:1]
+        if first == '`' or first == '~':
+            match = _FENCE_RE.match(line)
+            # An info string with backticks means it is inline code
+            if match is not None and not (
+                first == '`' and '`' in match.group(2)
+            ):
+                self._fence = match.group(1)
+                return FENCE
+        elif first == '$' and line.count('$$') % 2 == 1:
+            # A `$$` that is not closed on the same line opens a math block
+            self._in_math = True
+            return MATH
+
+        return PROSE
+
+    def in_region(self) -> bool:
+        """Wether the next line is in a code block or math block"""
+        return self._fence is not None or self._in_math
+
+
+def _closing_fence_re(fence: str) -> Pattern[str]:
+    """Returns a pattern that matches (the newline before) a closing fence
+
+    See LineClassifier.classify. Compiled patterns are cached by re.
+    """
+    return re.compile(
+        r'\n[^\S\n]*' + re.escape(fence) + re.escape(fence[0]) +
+        r'*[^\S\n]*(?:\n|\Z)',
+    )
+
+
+def iter_line_contexts(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Yields every line together with its context
+
+    Front matter is a block at the start of the document that starts with
+    `---` (not followed by an empty line) and ends with `---` or `...`.
+    Only the lines of a (possible) front matter block are buffered, all
+    other lines are labeled as soon as they are read.
+
+    Arguments:
+        lines {Iterable[str]} -- The lines of the document
+
+    Returns:
+        {Iterator[Tuple[str, str]]} -- The lines and their contexts
+
+    """
+    it = iter(lines)
+    classify = LineClassifier().classify
+    first_line = next(it, None)
+    if first_line is None:
+        return
+
+    buffered = [first_line]
+    if first_line.rstrip() == FRONT_MATTER_START:
+        for line in it:
+            buffered.append(line)
+            if len(buffered) == 2 and not line.strip():
+                # A seperator followed by an empty line
+                break
+            if line.rstrip() in FRONT_MATTER_ENDS:
+                for front_matter_line in buffered:
+                    yield front_matter_line, FRONT_MATTER
+                buffered = []
+                break
+    # Not front matter (or not closed), so the lines are normal lines
+    for line in buffered:
+        yield line, classify(line)
+
+    for line in it:
+        yield line, classify(line)
+
+
+def classify_lines(lines: Iterable[str]) -> List[str]:
+    """Returns the context of every line of the document"""
+    return [context for _, context in iter_line_contexts(lines)]
+
+
+def find_regions(
+    lines: Sequence[str],
+    text: str,
+    starts: Sequence[int],
+) -> List[Tuple[int, int, str]]:
+    """Finds the regions of a document that are not prose
+
+    Gives the same contexts as classify_lines, but the prose in between
+    the regions is skipped: the lines that can start a region are found
+    with a regex, so only the lines in the regions are classified one by
+    one. All lines of a region have the same context.
+
+    Arguments:
+        lines {Sequence[str]}  -- The lines of the document
+        text {str}             -- The lines joined, with a newline before
+                                  the first line
+        starts {Sequence[int]} -- The offset (in text) of the newline
+                                  before every line
+
+    Returns:
+        {List[Tuple[int, int, str]]} -- The first line, the line after the
+                                        last line and the context of every
+                                        region, ordered on line number
+
+    """
+    regions: List[Tuple[int, int, str]] = []
+    n_lines = len(lines)
+    line_nr = 0
+    if n_lines > 1 and lines[0].rstrip() == FRONT_MATTER_START and (
+        lines[1].strip()
+    ):
+        # Same as iter_line_contexts
+        for end, line in enumerate(lines[1:], 2):
+            if line.rstrip() in FRONT_MATTER_ENDS:
+                regions.append((0, end, FRONT_MATTER))
+                line_nr = end
+                break
+
+    while line_nr < n_lines:
+        match = _REGION_START_RE.search(text, starts[line_nr])
+        if match is None:
+            break
+        line_nr = bisect_right(starts, match.start()) - 1
+        classifier = LineClassifier()
+        context = classifier.classify(lines[line_nr])
+        start = line_nr
+        line_nr += 1
+        if context == PROSE:
+            continue
+        fence = classifier._fence
+        if fence is not None:
+            # Skip the content of the code block at once
+            closing = _closing_fence_re(fence).search(text, starts[line_nr])
+            line_nr = n_lines if closing is None else (
+                bisect_right(starts, closing.start())
+            )
+            regions.append((start, line_nr, context))
+            continue
+        while line_nr < n_lines and classifier.in_region():
+            if classifier.classify(lines[line_nr]) == PROSE:
+                # The empty line that ends a math block
+                break
+            line_nr += 1
+        regions.append((start, line_nr, context))
+    return regions
@@ -0,0 +1,231 @@
+"""
+Machine readable output for check mode
+
+Every reporter writes the errors of a document as soon as the document is
+checked, so the output can be read while notesystem is still running and
+no results have to be kept in memory.
+"""
+import abc
+import json
+import os
+import sys
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import TextIO
+from typing import Type
+from xml.sax.saxutils import quoteattr
+
+import notesystem
+from notesystem.modes.check_mode.errors.base_errors import BaseError
+from notesystem.modes.check_mode.errors.base_errors import DocumentErrors
+from notesystem.modes.check_mode.errors.base_errors import ErrorMeta
+
+# The output formats that can be used (text is the default visual output)
+OUTPUT_FORMATS = ['text', 'jsonl', 'sarif', 'checkstyle']
+
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+
+
+class Reporter(abc.ABC):
+    """Writes the found errors to a stream (stdout by default)"""
+
+    def __init__(
+        self,
+        rules: List[Type[BaseError]],
+        out: Optional[TextIO] = None,
+    ):
+        """Initialize the reporter
+
+        Arguments:
+            rules {List[Type[BaseError]]} -- All errors that can be reported
+            out {Optional[TextIO]}        -- The stream to write to
+
+        """
+        self._rules = rules
+        self._out = out if out is not None else sys.stdout
+
+    def start(self) -> None:
+        """Called before the first document is reported"""
+
+    @abc.abstractmethod
+    def report(self, doc_errors: DocumentErrors, fixed: bool) -> None:
+        """Reports the errors of a single document
+
+        Arguments:
+            doc_errors {DocumentErrors} -- The errors of the document
+            fixed {bool}                -- Wether the fixable errors are fixed
+
+        """
+
+    def finish(self) -> None:
+        """Called after the last document is reported"""
+
+    def _write(self, text: str) -> None:
+        self._out.write(text)
+        # Flush so that the output can be read while checking
+        self._out.flush()
+
+
+def _error_to_dict(error: ErrorMeta, fixed: bool) -> Dict:
+    fixable = error['error_type'].is_fixable()
+    return {
+        # Note: line numbers start at 0, like in the other output
+        'line_nr': error['line_nr'],
+        'line': error['line'],
+        'error': error['error_type'].get_error_name(),
+        'message': str(error['error_type']),
+        'fixable': fixable,
+        'fixed': bool(fixable and fixed),
+    }
+
+
+class JsonLinesReporter(Reporter):
+    """Writes one json object per document"""
+
+    def report(self, doc_errors: DocumentErrors, fixed: bool) -> None:
+        record = {
+            'file_path': doc_errors['file_path'],
+            'errors': [
+                _error_to_dict(error, fixed)
+                for error in doc_errors['errors']
+            ],
+        }
+        self._write(json.dumps(record) + '\n')
+
+
+def _relative_uri(file_path: str) -> str:
+    """Returns the path relative to the cwd (when possible) using '/'"""
+    try:
+        path = os.path.relpath(file_path)
+    except ValueError:
+        # On windows paths on different drives can not be relative
+        path = os.path.abspath(file_path)
+    return path.replace(os.sep, '/')
+
+
+class SarifReporter(Reporter):
+    """Writes a SARIF 2.1.0 log
+
+    The log is written in parts: the header in start(), every result as
+    soon as it is reported and the closing brackets in finish().
+
+    """
+
+    def start(self) -> None:
+        self._first_result = True
+        driver = {
+            'name': 'notesystem',
+            'version': notesystem.__version__,
+            'informationUri': 'https://github.com/twanh/note-system',
+            'rules': [
+                {
+                    'id': rule.get_error_name(),
+                    'shortDescription': {'text': rule.get_help_text()},
+                }
+                for rule in self._rules
+            ],
+        }
+        header = json.dumps({
+            '$schema': SARIF_SCHEMA,
+            'version': '2.1.0',
+            'runs': [{'tool': {'driver': driver}, 'results': []}],
+        })
+        # Leave the results array open, the results are added later
+        self._write(header[:-len(']}]}')])
+
+    def report(self, doc_errors: DocumentErrors, fixed: bool) -> None:
+        uri = _relative_uri(doc_errors['file_path'])
+        parts = []
+        for error in doc_errors['errors']:
+            location: Dict = {
+                'physicalLocation': {'artifactLocation': {'uri': uri}},
+            }
+            if error['line_nr'] is not None:
+                location['physicalLocation']['region'] = {
+                    'startLine': error['line_nr'] + 1,
+                }
+            result = {
+                'ruleId': error['error_type'].get_error_name(),
+                'level': 'warning',
+                'message': {'text': str(error['error_type'])},
+                'locations': [location],
+                'properties': {
+                    'fixable': error['error_type'].is_fixable(),
+                    'fixed': bool(error['error_type'].is_fixable() and fixed),
+                },
+            }
+            prefix = '' if self._first_result else ','
+            self._first_result = False
+            parts.append(prefix + json.dumps(result))
+        if parts:
+            self._write(''.join(parts))
+
+    def finish(self) -> None:
+        self._write(']}]}\n')
+
+
+class CheckstyleReporter(Reporter):
+    """Writes a checkstyle xml report
+
+    Errors without a line number (e.g. ListIndentError) are written
+    without the line attribute.
+
+    """
+
+    def start(self) -> None:
+        self._write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<checkstyle version="4.3">\n',
+        )
+
+    def report(self, doc_errors: DocumentErrors, fixed: bool) -> None:
+        parts = [f'<file name={quoteattr(doc_errors["file_path"])}>\n']
+        for error in doc_errors['errors']:
+            line = ''
+            if error['line_nr'] is not None:
+                line = f' line="{error["line_nr"] + 1}"'
+            message = quoteattr(str(error['error_type']))
+            source = quoteattr(
+                f'notesystem.{error["error_type"].get_error_name()}',
+            )
+            parts.append(
+                f'  <error{line} severity="warning" message={message} '
+                f'source={source}/>\n',
+            )
+        parts.append('</file>\n')
+        self._write(''.join(parts))
+
+    def finish(self) -> None:
+        self._write('</checkstyle>\n')
+
+
+REPORTERS: Dict[str, Type[Reporter]] = {
+    'jsonl': JsonLinesReporter,
+    'sarif': SarifReporter,
+    'checkstyle': CheckstyleReporter,
+}
+
+
+def create_reporter(
+    output_format: str,
+    rules: List[Type[BaseError]],
+    out: Optional[TextIO] = None,
+) -> Reporter:
+    """Creates the reporter for the output format
+
+    Arguments:
+        output_format {str}           -- One of the REPORTERS keys
+        rules {List[Type[BaseError]]} -- All errors that can be reported
+        out {Optional[TextIO]}        -- The stream to write to
+
+    Raises:
+        {ValueError} -- When there is no reporter for the format
+
+    Returns:
+        {Reporter} -- The reporter
+
+    """
+    if output_format not in REPORTERS:
+        raise ValueError(f'No reporter for output format: {output_format}')
+    return REPORTERS[output_format](rules, out)
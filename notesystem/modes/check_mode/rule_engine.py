@@ -0,0 +1,393 @@
+"""
+Runs the line based (markdown) errors over a document in a single pass
+
+Instead of running every error on every line, the errors are grouped on
+the context of the line (see line_context) and the characters a line has
+to start with for the error to be possible (see MarkdownError.contexts and
+MarkdownError.trigger_chars). For every line only the errors that can
+match are run, using a sliding window of the previous, current and next
+line. Whole regions (e.g. code blocks) without errors to check are skipped.
+
+Documents that are completely in memory can also be checked at once (see
+RuleEngine.check_document): the errors are searched in the whole document
+with a regex and only the lines with a match are checked.
+
+The time spent in every rule can be measured by giving the engine a timer
+(see RuleTimer), which is used by --profile-rules.
+"""
+from bisect import bisect_right
+from itertools import accumulate
+from itertools import chain
+from itertools import repeat
+from time import perf_counter
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Pattern
+from typing import Sequence
+from typing import Tuple
+
+from notesystem.modes.check_mode.errors.base_errors import ErrorMeta
+from notesystem.modes.check_mode.errors.markdown_errors import MarkdownError
+from notesystem.modes.check_mode.line_context import ALL_CONTEXTS
+from notesystem.modes.check_mode.line_context import classify_lines
+from notesystem.modes.check_mode.line_context import find_regions
+from notesystem.modes.check_mode.line_context import iter_line_contexts
+from notesystem.modes.check_mode.line_context import PROSE
+
+# Marks the end of a document
+_END: Tuple[Tuple[None, str]] = ((None, PROSE),)
+
+# Called once per rule for every checked document (or range) with the
+# rule, the time (in seconds) spent in the rule, the amount of lines the
+# rule was run on and the amount of errors it found
+RuleTimer = Callable[[MarkdownError, float, int, int], None]
+
+
+class RuleEngine:
+    """Checks documents for markdown errors in a single pass"""
+
+    def __init__(
+        self,
+        rules: List[MarkdownError],
+        timer: Optional[RuleTimer] = None,
+    ):
+        """Initialize the engine
+
+        Arguments:
+            rules {List[MarkdownError]} -- The errors to check for. Errors
+                                           found on the same line are
+                                           returned in this order.
+            timer {Optional[RuleTimer]} -- When given, the time spent in
+                                           every rule is measured and
+                                           passed to the timer (which
+                                           makes checking slower)
+
+        """
+        self.rules = list(rules)
+        self.timer = timer
+        # The rules that are checked on the lines of every context
+        self._context_rules: Dict[str, Tuple[MarkdownError, ...]] = {
+            context: tuple(
+                rule for rule in self.rules if context in rule.contexts
+            )
+            for context in ALL_CONTEXTS
+        }
+        # The contexts of which the lines do not have to be checked at all
+        self._skipped_contexts = frozenset(
+            context for context, rules in self._context_rules.items()
+            if not rules
+        )
+        # Maps (context, first char, first non whitespace char) of a line
+        # to the rules that need to be run on that line
+        self._dispatch: Dict[
+            Tuple[str, str, str],
+            Tuple[MarkdownError, ...],
+        ] = {}
+
+    def _rules_for(
+        self,
+        context: str,
+        first: str,
+        first_stripped: str,
+    ) -> Tuple[MarkdownError, ...]:
+        """Returns (and caches) the rules that can match a line"""
+        rules = tuple(
+            rule for rule in self._context_rules[context]
+            if rule.trigger_chars is None or (
+                first_stripped if rule.trigger_lstrip else first
+            ) in rule.trigger_chars
+        )
+        self._dispatch[(context, first, first_stripped)] = rules
+        return rules
+
+    def iter_errors(
+        self,
+        lines: Iterable[str],
+        start_line_nr: int = 0,
+        contexts: Optional[Iterable[str]] = None,
+    ) -> Iterator[ErrorMeta]:
+        """Checks the lines and yields the errors that are found
+
+        The lines are only iterated once, so any iterable (e.g. an open
+        file) can be checked.
+
+        Arguments:
+            lines {Iterable[str]}              -- The lines of the document
+            start_line_nr {int}                -- The line number of the
+                                                  first line
+            contexts {Optional[Iterable[str]]} -- The contexts of the lines,
+                                                  when None the lines are
+                                                  seen as a whole document
+
+        Returns:
+            {Iterator[ErrorMeta]} -- The found errors, ordered on line number
+
+        """
+        dispatch = self._dispatch
+        skipped_contexts = self._skipped_contexts
+        timer = self.timer
+        # [time, calls, hits] per rule (by id), only used with a timer
+        totals = {id(rule): [0.0, 0.0, 0.0] for rule in self.rules}
+        if contexts is None:
+            pairs: Iterable[Tuple[str, str]] = iter_line_contexts(lines)
+        else:
+            pairs = zip(lines, contexts)
+        prev_line: Optional[str] = None
+        line: Optional[str] = None
+        context = PROSE
+        line_nr = start_line_nr - 1
+        try:
+            # The line is checked once the next line is known, the end of
+            # the document is marked with a None line
+            for next_line, next_context in chain(pairs, _END):
+                if line is not None and context not in skipped_contexts:
+                    first = line[:1]
+                    if first.isspace():
+                        first_stripped = line.lstrip()[:1]
+                    else:
+                        first_stripped = first
+                    rules = dispatch.get((context, first, first_stripped))
+                    if rules is None:
+                        rules = self._rules_for(
+                            context, first, first_stripped,
+                        )
+
+                    if timer is None:
+                        for rule in rules:
+                            if rule.check(prev_line, line, next_line):
+                                yield ErrorMeta(
+                                    line_nr=line_nr, line=line,
+                                    error_type=rule,
+                                )
+                    else:
+                        # The end of a check is the start of the next one,
+                        # so the clock is only read once per check
+                        start = perf_counter()
+                        for rule in rules:
+                            found = rule.check(prev_line, line, next_line)
+                            end = perf_counter()
+                            total = totals[id(rule)]
+                            total[0] += end - start
+                            total[1] += 1
+                            if found:
+                                total[2] += 1
+                                yield ErrorMeta(
+                                    line_nr=line_nr, line=line,
+                                    error_type=rule,
+                                )
+                                # Not the time spent by the caller
+                                end = perf_counter()
+                            start = end
+
+                prev_line = line
+                line = next_line
+                context = next_context
+                line_nr += 1
+        finally:
+            if timer is not None:
+                for rule in self.rules:
+                    elapsed, calls, hits = totals[id(rule)]
+                    timer(rule, elapsed, int(calls), int(hits))
+
+    def iter_range_errors(
+        self,
+        lines: Sequence[str],
+        start: int,
+        end: int,
+        contexts: Optional[Sequence[str]] = None,
+    ) -> Iterator[ErrorMeta]:
+        """Checks only the lines from start up to (not including) end
+
+        The lines around the range are used as the previous and next line,
+        so the errors are the same as when the whole document is checked.
+
+        Arguments:
+            lines {Sequence[str]}              -- All lines of the document
+            start {int}                        -- The first line to check
+            end {int}                          -- The line after the last
+                                                  line to check
+            contexts {Optional[Sequence[str]]} -- The contexts of all lines
+                                                  (see classify_lines), when
+                                                  None the lines are
+                                                  classified first
+
+        Returns:
+            {Iterator[ErrorMeta]} -- The found errors, ordered on line number
+
+        """
+        start = max(start, 0)
+        end = min(end, len(lines))
+        if start >= end:
+            return
+        if contexts is None:
+            contexts = classify_lines(lines)
+        window_start = max(start - 1, 0)
+        window = lines[window_start:end + 1]
+        window_contexts = contexts[window_start:end + 1]
+        for error in self.iter_errors(window, window_start, window_contexts):
+            line_nr = error['line_nr']
+            assert line_nr is not None
+            if start <= line_nr < end:
+                yield error
+
+    def check_document(self, lines: Sequence[str]) -> List[ErrorMeta]:
+        """Checks a whole document at once
+
+        Finds the same errors as check. Instead of going through the lines
+        one by one, the document_pattern of every rule is searched in the
+        joined document, which is done by the (C) regex engine. Only the
+        lines on which a match starts are checked with the rule. The line
+        of a match is found by bisecting the offsets of the line starts.
+
+        The patterns start with a newline instead of using ^ with re.M,
+        because the regex engine tries ^ at every position of the document
+        but can skip ahead to the next newline.
+
+        Arguments:
+            lines {Sequence[str]} -- The lines of the document (every line
+                                     but the last has to end with a
+                                     newline, otherwise check is used)
+
+        Returns:
+            {List[ErrorMeta]} -- The found errors, ordered on line number
+
+        """
+        n_lines = len(lines)
+        if n_lines == 0 or not all(
+            map(str.endswith, lines[:-1], repeat('\n')),
+        ):
+            # The offsets of the matches can not be mapped to lines
+            return self.check(lines)
+        # The newline before the first line lets patterns match at the start
+        # of the first line as well
+        text = '\n' + ''.join(lines)
+        if text.count('\n') != n_lines + lines[-1].endswith('\n'):
+            # A line contains more than one newline
+            return self.check(lines)
+
+        # starts[i] is the offset (in text) of the newline before line i
+        starts = [0, *accumulate(map(len, lines))]
+        regions = find_regions(lines, text, starts)
+
+        found: List[Tuple[int, int]] = []
+        last = n_lines - 1
+        timer = self.timer
+        for rule_index, rule in enumerate(self.rules):
+            # The time of a rule includes searching its pattern
+            start_time = perf_counter()
+            n_found = len(found)
+            calls = 0
+            pattern = rule.document_pattern
+            for start, end in self._rule_spans(rule, regions, n_lines):
+                candidates: Iterable[int]
+                if pattern is None:
+                    candidates = range(start, end)
+                else:
+                    candidates = self._matched_lines(
+                        pattern, text, starts, start, end,
+                    )
+                if timer is not None:
+                    candidates = list(candidates)
+                    calls += len(candidates)
+                for line_nr in candidates:
+                    if rule.check(
+                        lines[line_nr - 1] if line_nr > 0 else None,
+                        lines[line_nr],
+                        lines[line_nr + 1] if line_nr < last else None,
+                    ):
+                        found.append((line_nr, rule_index))
+            if timer is not None:
+                timer(
+                    rule, perf_counter() - start_time, calls,
+                    len(found) - n_found,
+                )
+
+        # Ordered like check: on line number, then in the order of the rules
+        found.sort()
+        return [
+            ErrorMeta(
+                line_nr=line_nr, line=lines[line_nr],
+                error_type=self.rules[rule_index],
+            )
+            for line_nr, rule_index in found
+        ]
+
+    def _rule_spans(
+        self,
+        rule: MarkdownError,
+        regions: List[Tuple[int, int, str]],
+        n_lines: int,
+    ) -> List[Tuple[int, int]]:
+        """Returns the (start, end) lines the rule has to be checked on
+
+        Arguments:
+            rule {MarkdownError}                   -- The rule
+            regions {List[Tuple[int, int, str]]}   -- The regions of the
+                                                      document (see
+                                                      find_regions)
+            n_lines {int}                          -- The number of lines
+
+        Returns:
+            {List[Tuple[int, int]]} -- The spans of lines (end not included)
+                                       in a context of the rule
+
+        """
+        spans: List[Tuple[int, int]] = []
+        check_prose = PROSE in rule.contexts
+
+        def add(start: int, end: int) -> None:
+            if start >= end:
+                return
+            if spans and spans[-1][1] == start:
+                spans[-1] = (spans[-1][0], end)
+            else:
+                spans.append((start, end))
+
+        prose_start = 0
+        for start, end, context in regions:
+            if check_prose:
+                add(prose_start, start)
+            if context in rule.contexts:
+                add(start, end)
+            prose_start = end
+        if check_prose:
+            add(prose_start, n_lines)
+        return spans
+
+    def _matched_lines(
+        self,
+        pattern: Pattern[str],
+        text: str,
+        starts: List[int],
+        start: int,
+        end: int,
+    ) -> Iterator[int]:
+        """Yields the lines (from start to end) on which a match starts
+
+        The search includes the newline after the last line, so that the
+        end of the last line can be matched.
+        """
+        prev_line_nr = -1
+        for match in pattern.finditer(text, starts[start], starts[end] + 1):
+            line_nr = bisect_right(starts, match.start(), start, end + 1) - 1
+            if line_nr >= end:
+                break
+            if line_nr != prev_line_nr:
+                yield line_nr
+                prev_line_nr = line_nr
+
+    def check(self, lines: Iterable[str]) -> List[ErrorMeta]:
+        """Checks the lines and returns all errors that are found
+
+        Arguments:
+            lines {Iterable[str]} -- The lines of the document
+
+        Returns:
+            {List[ErrorMeta]} -- The found errors, ordered on line number
+
+        """
+        return list(self.iter_errors(lines))
@@ -0,0 +1,166 @@
+"""
+Profiling of the time spent per error (rule) in check mode
+
+Enabled with --profile-rules. Only the checks that are profiled pay for the
+timing: the RuleEngine only measures the rules when it is given a timer
+(see RuleProfile.record_rule). Next to the errors, the time spent reading
+and decoding the files is recorded as well.
+"""
+import json
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TypedDict
+
+from notesystem.modes.check_mode.errors.markdown_errors import MarkdownError
+
+PROFILE_FORMATS = ['table', 'json']
+
+# The names used for the time spent outside of the errors
+READ = 'read'
+DECODE = 'decode'
+
+
+class RuleStats(TypedDict):
+    # The total time (in seconds) spent in the rule
+    time: float
+    # The amount of times the rule was run (lines for markdown errors,
+    # files for the others)
+    calls: int
+    # The amount of errors that were found
+    hits: int
+    # The file the most time was spent on and the time spent on it
+    worst_file: Optional[str]
+    worst_time: float
+
+
+class RuleProfile:
+    """Collects the time spent per rule"""
+
+    def __init__(self) -> None:
+        self.stats: Dict[str, RuleStats] = {}
+        self._file_path: Optional[str] = None
+        # The time spent per rule on the current file
+        self._file_times: Dict[str, float] = {}
+
+    def start_file(self, file_path: str) -> None:
+        """Marks that the next recorded times are spent on file_path"""
+        if file_path == self._file_path:
+            return
+        self._end_file()
+        self._file_path = file_path
+
+    def _end_file(self) -> None:
+        for name, elapsed in self._file_times.items():
+            stats = self.stats[name]
+            if elapsed > stats['worst_time']:
+                stats['worst_time'] = elapsed
+                stats['worst_file'] = self._file_path
+        self._file_times = {}
+
+    def record(
+        self,
+        name: str,
+        elapsed: float,
+        calls: int = 1,
+        hits: int = 0,
+    ) -> None:
+        """Records time spent in a rule for the current file
+
+        Arguments:
+            name {str}      -- The name of the rule (error name, READ or
+                               DECODE)
+            elapsed {float} -- The time spent (in seconds)
+            calls {int}     -- The amount of times the rule was run
+            hits {int}      -- The amount of errors found
+
+        """
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = RuleStats(
+                time=0.0, calls=0, hits=0, worst_file=None, worst_time=0.0,
+            )
+        stats['time'] += elapsed
+        stats['calls'] += calls
+        stats['hits'] += hits
+        self._file_times[name] = self._file_times.get(name, 0.0) + elapsed
+
+    def record_rule(
+        self,
+        rule: MarkdownError,
+        elapsed: float,
+        calls: int,
+        hits: int,
+    ) -> None:
+        """Records the time spent in a markdown error (see RuleTimer)"""
+        self.record(rule.get_error_name(), elapsed, calls, hits)
+
+    def pop_stats(self) -> Dict[str, RuleStats]:
+        """Returns the collected stats and starts over (used by workers)"""
+        self._end_file()
+        stats = self.stats
+        self.stats = {}
+        return stats
+
+    def merge(self, other: Dict[str, RuleStats]) -> None:
+        """Adds the stats collected by another profile (e.g. a worker)"""
+        self._end_file()
+        for name, other_stats in other.items():
+            stats = self.stats.get(name)
+            if stats is None:
+                self.stats[name] = other_stats.copy()
+                continue
+            stats['time'] += other_stats['time']
+            stats['calls'] += other_stats['calls']
+            stats['hits'] += other_stats['hits']
+            if other_stats['worst_time'] > stats['worst_time']:
+                stats['worst_time'] = other_stats['worst_time']
+                stats['worst_file'] = other_stats['worst_file']
+
+    def sorted_stats(self) -> List[Tuple[str, RuleStats]]:
+        """Returns the stats of every rule, the slowest rule first"""
+        self._end_file()
+        return sorted(
+            self.stats.items(),
+            key=lambda item: (-item[1]['time'], item[0]),
+        )
+
+    def format_table(self) -> str:
+        """Formats the stats as a table (one rule per row)"""
+        rows = [
+            (
+                name,
+                f"{stats['time'] * 1000:.1f}",
+                str(stats['calls']),
+                str(stats['hits']),
+                f"{stats['worst_file']} ({stats['worst_time'] * 1000:.1f} ms)"
+                if stats['worst_file'] is not None else '-',
+            )
+            for name, stats in self.sorted_stats()
+        ]
+        header = ('Rule', 'Time (ms)', 'Calls', 'Hits', 'Worst file')
+        widths = [
+            max(len(row[i]) for row in [header, *rows]) for i in range(4)
+        ]
+        lines = []
+        for row in [header, *rows]:
+            lines.append(
+                f'{row[0]:<{widths[0]}}  {row[1]:>{widths[1]}}  '
+                f'{row[2]:>{widths[2]}}  {row[3]:>{widths[3]}}  {row[4]}',
+            )
+        return '\n'.join(lines) + '\n'
+
+    def format_json(self) -> str:
+        """Formats the stats as JSON (times in seconds)"""
+        return json.dumps({
+            'rules': [
+                {'name': name, **stats} for name, stats in self.sorted_stats()
+            ],
+        }) + '\n'
+
+    def format(self, profile_format: str) -> str:
+        """Formats the stats in the given format (see PROFILE_FORMATS)"""
+        if profile_format == 'json':
+            return self.format_json()
+        return self.format_table()
@@ -0,0 +1,439 @@
+"""
+Build manifest for the outputs of convert mode
+
+Like the database of make or ninja, the manifest stores for every output
+file the note it was converted from (size, modification time and content
+hash), the pandoc command that was used and the files the output depends
+on (the template, its partials and the files passed to pandoc, like css
+files). When none of them changed since the last run, the output is up to
+date and the note is not converted again.
+
+All the outputs are out of date when the notesystem version or the pandoc
+version change.
+"""
+import json
+import logging
+import os
+import re
+import shlex
+import subprocess
+import tempfile
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TypedDict
+
+import notesystem
+from notesystem.common.utils import hash_file
+
+MANIFEST_FILE_NAME = '.notesystem-manifest.json'
+
+# Notes that are modified this close (in ns) to the moment they are stored
+# could be modified again without the mtime changing. Their mtime is not
+# stored so that the content hash is always compared on the next run.
+RACY_MTIME_NS = 2 * 10**9
+
+# The pandoc arguments that take a file which the output depends on
+FILE_ARGUMENTS = {
+    '--css', '-c',
+    '--include-in-header', '-H',
+    '--include-before-body', '-B',
+    '--include-after-body', '-A',
+    '--lua-filter', '-L',
+    '--filter', '-F',
+    '--metadata-file',
+    '--defaults', '-d',
+    '--reference-doc',
+    '--bibliography',
+    '--csl',
+    '--citation-abbreviations',
+    '--abbreviations',
+    '--syntax-definition',
+    '--highlight-style',
+}
+
+# A partial in a template, e.g. $styles.html()$ or ${ item:entry() }
+PARTIAL_RE = re.compile(r'\$\{?\s*(?:[\w.-]+:)?([\w./-]+)\(\)')
+# A (possibly local) file referenced in a template, e.g. a css file
+RESOURCE_RE = re.compile(r'(?:href|src)="([^"$:?#]+)"')
+
+
+class PandocInfo(TypedDict):
+    """Information about the installed pandoc"""
+    # The first line of `pandoc --version`, e.g. 'pandoc 3.1.9'
+    version: str
+    # The directory pandoc looks for (user) templates in, None when unknown
+    data_dir: Optional[str]
+
+
+class ManifestEntry(TypedDict):
+    """The information about how a single output was made"""
+    # The path of the note the output was converted from
+    in_path: str
+    size: int
+    mtime_ns: int
+    hash: str
+    # The pandoc command (with all the effective arguments)
+    command: str
+    # The path -> hash of every file (other than the note) the output
+    # depends on
+    dependencies: Dict[str, str]
+
+
+def pandoc_info() -> PandocInfo:
+    """Asks pandoc for its version and user data directory
+
+    Returns:
+        {PandocInfo} -- The information, the version is 'unknown' when
+                        pandoc could not be run
+
+    """
+    try:
+        output = subprocess.check_output(
+            ['pandoc', '--version'],
+        ).decode('utf-8', errors='replace')
+    except (OSError, subprocess.CalledProcessError) as e:
+        logging.getLogger(__name__).warning(
+            'Could not get the pandoc version',
+        )
+        logging.getLogger(__name__).debug(e)
+        return PandocInfo(version='unknown', data_dir=None)
+
+    lines = output.splitlines()
+    data_dir = re.search(r'data directory: (.+)', output)
+    return PandocInfo(
+        version=lines[0].strip() if lines else 'unknown',
+        data_dir=data_dir.group(1).strip() if data_dir else None,
+    )
+
+
+def find_template(
+    template: str,
+    output_format: str,
+    data_dir: Optional[str],
+) -> Optional[str]:
+    """Finds the template file pandoc uses
+
+    Like pandoc, the template is looked for relative to the current
+    directory first and then in the templates directory of the user data
+    directory. When the template has no extension, the extension of the
+    output format is added.
+
+    Arguments:
+        template {str}           -- The template as passed to pandoc
+        output_format {str}      -- The output format (html or pdf)
+        data_dir {Optional[str]} -- The user data directory of pandoc
+
+    Returns:
+        {Optional[str]} -- The path of the template, None when it could not
+                           be found (e.g. the templates built into pandoc)
+
+    """
+    names = [template]
+    if not os.path.splitext(template)[1]:
+        names.append(f'{template}.{output_format}')
+    candidates = list(names)
+    if data_dir is not None:
+        candidates.extend(
+            os.path.join(data_dir, 'templates', name) for name in names
+        )
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def _template_dependencies(template_path: str, found: List[str]) -> None:
+    """Adds the partials (recursively) and local resources of a template"""
+    try:
+        with open(template_path, 'r', encoding='utf-8') as template_file:
+            template = template_file.read()
+    except (OSError, UnicodeDecodeError):
+        return
+
+    template_dir = os.path.dirname(template_path)
+    extension = os.path.splitext(template_path)[1]
+    for name in PARTIAL_RE.findall(template):
+        # Like pandoc, partials are found next to the template and get the
+        # extension of the template when they do not have one
+        if not os.path.splitext(name)[1]:
+            name += extension
+        partial_path = os.path.join(template_dir, name)
+        if os.path.isfile(partial_path) and partial_path not in found:
+            found.append(partial_path)
+            _template_dependencies(partial_path, found)
+
+    # Local resources are read by pandoc (relative to the working
+    # directory) when they are embedded
+    for resource in RESOURCE_RE.findall(template):
+        if os.path.isfile(resource) and resource not in found:
+            found.append(resource)
+
+
+def find_dependencies(
+    template_path: Optional[str],
+    arguments: Optional[str],
+) -> List[str]:
+    """Finds the files (other than the note) pandoc reads
+
+    These are the template, the partials used in the template (and their
+    partials), the local files referenced in the templates and the files
+    passed to pandoc in the (extra) arguments, like --css FILE.
+
+    Arguments:
+        template_path {Optional[str]} -- The path of the template file
+        arguments {Optional[str]}     -- The extra arguments for pandoc
+
+    Returns:
+        {List[str]} -- The paths of the files that exist
+
+    """
+    found: List[str] = []
+    if template_path is not None:
+        found.append(template_path)
+        _template_dependencies(template_path, found)
+
+    try:
+        tokens = shlex.split(arguments or '')
+    except ValueError:
+        tokens = (arguments or '').split()
+    for i, token in enumerate(tokens):
+        value = None
+        if '=' in token and token.split('=', 1)[0] in FILE_ARGUMENTS:
+            value = token.split('=', 1)[1]
+        elif token in FILE_ARGUMENTS and i + 1 < len(tokens):
+            value = tokens[i + 1]
+        elif (
+            len(token) > 2 and not token.startswith('--') and
+            token[:2] in FILE_ARGUMENTS
+        ):
+            value = token[2:]
+        if value is not None and os.path.isfile(value) and (
+            value not in found
+        ):
+            found.append(value)
+    return found
+
+
+class ConvertManifest:
+    """On disk manifest of the outputs of convert mode"""
+
+    def __init__(
+        self,
+        out_dir: str,
+        pandoc_version: str,
+        dependencies: List[str],
+    ):
+        """Initialize the manifest
+
+        Arguments:
+            out_dir {str}             -- The directory the outputs (and the
+                                         manifest) are written to
+            pandoc_version {str}      -- The version of pandoc
+            dependencies {List[str]}  -- The files the outputs depend on
+                                         (see find_dependencies)
+
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._out_dir = out_dir
+        self._manifest_path = os.path.join(out_dir, MANIFEST_FILE_NAME)
+        self._header = {
+            'version': notesystem.__version__,
+            'pandoc_version': pandoc_version,
+        }
+        self._dependencies = self._hash_dependencies(dependencies)
+        # The output path (relative to out_dir) -> entry
+        self._entries: Dict[str, ManifestEntry] = {}
+        # The (size, mtime_ns, hash) of the notes of outputs that are out
+        # of date, used when recording the new output
+        self._pending: Dict[str, Tuple[int, int, str]] = {}
+        self._changed = False
+        self.up_to_date = 0
+        self.out_of_date = 0
+
+    def _key(self, out_file: str) -> str:
+        """The path of the output relative to the out directory"""
+        prefix = os.path.join(self._out_dir, '')
+        if out_file.startswith(prefix):
+            # Much faster than relpath, which makes both paths absolute
+            return out_file[len(prefix):]
+        return os.path.relpath(out_file, self._out_dir)
+
+    def _hash_dependencies(self, dependencies: List[str]) -> Dict[str, str]:
+        hashes: Dict[str, str] = {}
+        for dependency in dependencies:
+            try:
+                with open(dependency, 'rb') as dependency_file:
+                    hashes[os.path.abspath(dependency)] = hash_file(
+                        dependency_file,
+                    )
+            except OSError:
+                # Pandoc will fail as well, which is shown when converting
+                continue
+        return hashes
+
+    def load(self) -> None:
+        """Loads the manifest from disk
+
+        When the manifest does not exist, can not be read or was made
+        with a different pandoc, it starts empty.
+
+        """
+        try:
+            with open(
+                self._manifest_path, 'r', encoding='utf-8',
+            ) as manifest_file:
+                data = json.load(manifest_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self._logger.warning(
+                f'Could not read manifest {self._manifest_path}',
+            )
+            self._logger.info(e)
+            return
+
+        if not isinstance(data, dict) or data.get('header') != self._header:
+            self._logger.info('Manifest is outdated, converting all files')
+            # The old entries are replaced when the manifest is saved
+            self._changed = True
+            return
+
+        self._entries = data.get('entries', {})
+
+    def save(self) -> None:
+        """Writes the manifest to disk (only when it changed)"""
+
+        if not self._changed:
+            return
+
+        os.makedirs(self._out_dir, exist_ok=True)
+        data = {'header': self._header, 'entries': self._entries}
+        # Write to a temporary file first so that an interrupted
+        # write never leaves a broken manifest behind
+        fd, tmp_path = tempfile.mkstemp(dir=self._out_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+                json.dump(data, tmp_file, separators=(',', ':'))
+            os.replace(tmp_path, self._manifest_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._changed = False
+
+    def is_up_to_date(self, in_file: str, out_file: str, command: str) -> bool:
+        """Checks if the output was made from the note as it is now
+
+        The output is out of date when the command or one of the files it
+        depends on changed. When the size and modification time of the
+        note are the same as when the output was made, the note is not
+        read. Otherwise the content hash is compared.
+
+        Arguments:
+            in_file {str}  -- The path of the note
+            out_file {str} -- The path of the output
+            command {str}  -- The pandoc command that makes the output
+
+        Returns:
+            {bool} -- Wether the output does not have to be made again
+
+        """
+        key = self._key(out_file)
+        entry = self._entries.get(key)
+        try:
+            stat = os.stat(in_file)
+        except OSError:
+            self.out_of_date += 1
+            return False
+
+        if (
+            entry is not None and
+            entry['in_path'] == in_file and
+            entry['command'] == command and
+            entry.get('dependencies') == self._dependencies and
+            os.path.isfile(out_file)
+        ):
+            if (
+                entry['size'] == stat.st_size and
+                entry['mtime_ns'] == stat.st_mtime_ns
+            ):
+                self.up_to_date += 1
+                return True
+        else:
+            entry = None
+
+        try:
+            with open(in_file, 'rb') as note_file:
+                content_hash = hash_file(note_file)
+        except OSError:
+            self.out_of_date += 1
+            return False
+
+        if entry is not None and entry['hash'] == content_hash:
+            # Only the metadata changed (e.g. the note was touched)
+            self._store(
+                key, in_file, stat.st_size, stat.st_mtime_ns,
+                content_hash, command,
+            )
+            self.up_to_date += 1
+            return True
+
+        self._pending[key] = (stat.st_size, stat.st_mtime_ns, content_hash)
+        self.out_of_date += 1
+        return False
+
+    def record(self, in_file: str, out_file: str, command: str) -> None:
+        """Records that the output was made (after is_up_to_date)
+
+        Arguments:
+            in_file {str}  -- The path of the note
+            out_file {str} -- The path of the output
+            command {str}  -- The pandoc command that made the output
+
+        """
+        key = self._key(out_file)
+        if key not in self._pending:
+            # The note could not be read by is_up_to_date
+            return
+        size, mtime_ns, content_hash = self._pending.pop(key)
+        self._store(key, in_file, size, mtime_ns, content_hash, command)
+
+    def remove_missing(self) -> None:
+        """Removes the outputs of notes that do not exist anymore"""
+        missing = [
+            key for key, entry in self._entries.items()
+            if not os.path.isfile(entry['in_path'])
+        ]
+        for key in missing:
+            del self._entries[key]
+        if missing:
+            self._changed = True
+
+    def forget(self, out_file: str) -> None:
+        """Removes the output, it is made again on the next run"""
+        key = self._key(out_file)
+        if self._entries.pop(key, None) is not None:
+            self._changed = True
+
+    def _store(
+        self,
+        key: str,
+        in_file: str,
+        size: int,
+        mtime_ns: int,
+        content_hash: str,
+        command: str,
+    ) -> None:
+        if time.time_ns() - mtime_ns < RACY_MTIME_NS:
+            mtime_ns = 0
+        self._entries[key] = ManifestEntry(
+            in_path=in_file,
+            size=size,
+            mtime_ns=mtime_ns,
+            hash=content_hash,
+            command=command,
+            dependencies=self._dependencies,
+        )
+        self._changed = True
@@ -2,12 +2,24 @@
 Mode responsible for converting markdown files
 (and directories with markdown files) to html files
 """
+import http.client
 import os
+import re
 import shutil
 import subprocess
 import time
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
 from typing import cast
+from typing import Deque
+from typing import Dict
+from typing import Iterator
+from typing import List
 from typing import Optional
+from typing import Set
+from typing import Tuple
 from typing import TypedDict
 
 import tqdm
@@ -20,7 +32,18 @@ from yaspin import yaspin
 from yaspin.spinners import Spinners
 
 from notesystem.common.utils import find_all_md_files
+from notesystem.common.utils import find_duplicate_files
 from notesystem.modes.base_mode import BaseMode
+from notesystem.modes.convert_manifest import ConvertManifest
+from notesystem.modes.convert_manifest import find_dependencies
+from notesystem.modes.convert_manifest import find_template
+from notesystem.modes.convert_manifest import pandoc_info
+from notesystem.modes.convert_manifest import PARTIAL_RE
+from notesystem.modes.html_engine import ENGINE_VERSION
+from notesystem.modes.html_engine import HtmlEngine
+from notesystem.modes.html_engine import TemplateError
+from notesystem.modes.pandoc_server import PandocServer
+from notesystem.modes.pandoc_server import PandocServerError
 
 
 class PandocOptions(TypedDict):
@@ -43,11 +66,38 @@ class ConvertModeArguments(TypedDict):
     watch: bool
     # The string of arguments needed to be passed trough to pandoc
     pandoc_options: PandocOptions
+    # The number of pandoc processes to run at once (None means 1)
+    jobs: Optional[int]
+    # Wether to convert all files, also the ones that are up to date
+    force: bool
+    # Wether to convert using the http server of pandoc (when possible)
+    pandoc_server: bool
+    # The engine that converts to html: 'pandoc' or 'mistune' (built in)
+    engine: str
+
+
+# The result of pandoc for a file: in file, out file and the result
+# (None when the file still has to be converted, see _pandoc_results)
+PandocResult = Tuple[
+    str, str, Optional['subprocess.CompletedProcess[bytes]'],
+]
+
+# A title in the metadata of a note (or a pandoc title block)
+TITLE_RE = re.compile(r'^(?:page)?title\s*:|\A%', re.M)
 
 
 class ConvertMode(BaseMode[ConvertModeArguments]):
     """Convert markdown files to html"""
 
+    def __init__(self) -> None:
+        super().__init__()
+        # Set by _run, the defaults allow calling _convert_dir directly
+        self._jobs = 1
+        self._force = False
+        self._server: Optional[PandocServer] = None
+        self._server_options: Optional[Dict[str, Any]] = None
+        self._html_engine: Optional[HtmlEngine] = None
+
     def _run(self, args: ConvertModeArguments) -> None:
         """Internal entry point for ConvertMode
 
@@ -59,46 +109,66 @@ class ConvertMode(BaseMode[ConvertModeArguments]):
 
         """
 
+        # Set pandoc options
+        self._pandoc_options: PandocOptions = args['pandoc_options']
+        self._jobs = args['jobs'] or 1
+        self._force = args['force']
+
+        if args['engine'] == 'mistune':
+            self._html_engine = self._create_html_engine()
+
         # Check if pandoc is installed
         pandoc_cmd = shutil.which('pandoc')
         if pandoc_cmd is None:
-            self._logger.error(
-                'Could not find pandoc. Make sure it is in your path.',
+            if self._html_engine is None:
+                self._logger.error(
+                    'Could not find pandoc. Make sure it is in your path.',
+                )
+                raise SystemExit()
+            # Only the notes the mistune engine can not convert need pandoc
+            self._logger.warning(
+                'Could not find pandoc, only the mistune engine can be used',
             )
-            raise SystemExit()
-        self._logger.debug(f'Found pandoc @ {pandoc_cmd}')
-
-        # Set pandoc options
-        self._pandoc_options: PandocOptions = args['pandoc_options']
+        else:
+            self._logger.debug(f'Found pandoc @ {pandoc_cmd}')
 
         # Make sure this variable exists
         # by default is is False but it gets set correctly in _convert_dir
         self._converting_dir = False
 
-        # Check if args[in_path] is a file or a directory
-        if os.path.isdir(os.path.abspath(args['in_path'])):
-            self._convert_dir(args['in_path'], args['out_path'])
-        elif os.path.isfile(os.path.abspath(args['in_path'])):
-            if self._visual:
-                print(
-                    colored(
-                        f"Converting {args['in_path']} -> {args['out_path']}",
-                        'green',
-                    ),
-                )
-            self._convert_file(
-                args['in_path'], args['out_path'],
-            )
-        else:
-            raise FileNotFoundError
-
-        # Watch mode is started after the file (folder) is converted.
-        #
-        if args['watch']:
-            # Start watcher
-            self._start_watch_mode(args)
+        if args['pandoc_server']:
+            self._start_pandoc_server()
 
-    def _convert_file(self, in_file: str, out_file: str) -> None:
+        try:
+            # Check if args[in_path] is a file or a directory
+            if os.path.isdir(os.path.abspath(args['in_path'])):
+                self._convert_dir(args['in_path'], args['out_path'])
+            elif os.path.isfile(os.path.abspath(args['in_path'])):
+                if self._visual:
+                    print(
+                        colored(
+                            f"Converting {args['in_path']} -> "
+                            f"{args['out_path']}",
+                            'green',
+                        ),
+                    )
+                self._convert_file(
+                    args['in_path'], args['out_path'],
+                )
+            else:
+                raise FileNotFoundError
+
+            # Watch mode is started after the file (folder) is converted.
+            #
+            if args['watch']:
+                # Start watcher
+                self._start_watch_mode(args)
+        finally:
+            if self._server is not None:
+                self._server.stop()
+                self._server = None
+
+    def _convert_file(self, in_file: str, out_file: str) -> bool:
         """Convert a markdown file to html
 
         Using pandoc the in_file is converted to a html file which is saved at
@@ -115,9 +185,138 @@ class ConvertMode(BaseMode[ConvertModeArguments]):
                               file should be saved
 
         Returns:
-            {None}
+            {bool} -- Wether pandoc converted the file
+        """
+        pd_command = self._pandoc_command(in_file, out_file)
+        result = self._run_pandoc(in_file, out_file, pd_command)
+        self._show_pandoc_result(in_file, out_file, result)
+        return result.returncode == 0
+
+    def _start_pandoc_server(self) -> None:
+        """Starts the pandoc server, when it can be used
+
+        When the server can not be used (or started) the files are
+        converted by starting pandoc for every file.
+
+        """
+        self._server_options = self._pandoc_server_options()
+        if self._server_options is None:
+            self._logger.warning(
+                'The pandoc server can not be used with these options, '
+                'using pandoc processes',
+            )
+            return
+
+        server = PandocServer()
+        if not server.start():
+            self._logger.warning(
+                'Could not start the pandoc server, using pandoc processes',
+            )
+            return
+        self._server = server
+
+    def _pandoc_server_options(self) -> Optional[Dict[str, Any]]:
+        """Creates the options for the pandoc server (see PandocServer)
+
+        The server can not read files, so the template is sent with every
+        request.
+
+        Returns:
+            {Optional[Dict[str, Any]]} -- The options, None when they can
+                                          not be used with the server (when
+                                          converting to pdf, with extra
+                                          pandoc arguments or a template
+                                          that uses partials)
+
+        """
+        if (
+            self._pandoc_options['output_format'] != 'html' or
+            self._pandoc_options['arguments']
+        ):
+            return None
+
+        options: Dict[str, Any] = {
+            'from': 'markdown',
+            'to': 'html',
+            'html-math-method': 'mathjax',
+        }
+        template = self._pandoc_options['template'] or 'GitHub.html5'
+        if template == 'None':
+            return options
+
+        template_path = find_template(
+            template, 'html', pandoc_info()['data_dir'],
+        )
+        if template_path is None:
+            return None
+        try:
+            with open(template_path, 'r', encoding='utf-8') as template_file:
+                template_text = template_file.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+        if PARTIAL_RE.search(template_text):
+            return None
+        options['standalone'] = True
+        options['template'] = template_text
+        return options
+
+    def _create_html_engine(self) -> Optional[HtmlEngine]:
+        """Creates the mistune engine, when it can be used
+
+        Pandoc is used when the engine can not be used: when converting to
+        pdf, with extra pandoc arguments or with a template the engine does
+        not support (see HtmlEngine).
+
+        Returns:
+            {Optional[HtmlEngine]} -- The engine, None when pandoc has to
+                                      be used
+
+        """
+        if (
+            self._pandoc_options['output_format'] != 'html' or
+            self._pandoc_options['arguments']
+        ):
+            self._logger.warning(
+                'The mistune engine can not be used with these options, '
+                'using pandoc',
+            )
+            return None
+
+        template = self._pandoc_options['template'] or 'GitHub.html5'
+        if template == 'None':
+            return HtmlEngine(None)
+
+        template_path = find_template(
+            template, 'html', pandoc_info()['data_dir'],
+        )
+        if template_path is None:
+            self._logger.warning(
+                f'Could not find the template {template} for the mistune '
+                'engine, using pandoc',
+            )
+            return None
+        try:
+            with open(template_path, 'r', encoding='utf-8') as template_file:
+                return HtmlEngine(template_file.read())
+        except (OSError, UnicodeDecodeError, TemplateError) as e:
+            self._logger.warning(
+                f'The mistune engine can not use the template {template}, '
+                'using pandoc',
+            )
+            self._logger.debug(e)
+            return None
+
+    def _pandoc_command(self, in_file: str, out_file: str) -> str:
+        """Creates the pandoc command to convert in_file into out_file
+
+        Raises:
+            {SystemExit} -- When the (extra) pandoc arguments contain an
+                            argument that is set by notesystem
+
+        Returns:
+            {str} -- The pandoc command (to be run in a shell)
+
         """
-        # Create the pandoc command
         arguments = ''  # No arguments by default
         if self._pandoc_options['arguments'] is not None:
             # Check for arguments that should not be passed to pandoc
@@ -145,10 +344,7 @@ class ConvertMode(BaseMode[ConvertModeArguments]):
                 template = self._pandoc_options['template']
                 template_str = f'--template {template}'
 
-            if not out_file.endswith('.pdf'):
-                out_file_correct = '.'.join(out_file.split('.')[:-1]) + '.pdf'
-            else:
-                out_file_correct = out_file
+            out_file_correct = self._output_file(out_file)
 
             pd_command = f'pandoc {in_file} -o {out_file_correct} {template_str} --mathjax {arguments} -t pdf'  # noqa: E501
 
@@ -164,75 +360,284 @@ class ConvertMode(BaseMode[ConvertModeArguments]):
                     template_str = f'--template {template}'
             pd_command = f'pandoc {in_file} -o {out_file} {template_str} --mathjax {arguments} -t html'  # noqa: E501
 
+        return pd_command
+
+    def _run_pandoc(
+        self,
+        in_file: str,
+        out_file: str,
+        pd_command: str,
+    ) -> 'subprocess.CompletedProcess[bytes]':
+        """Runs the pandoc command, can be called from any thread
+
+        When the mistune engine (or the pandoc server) is used, the file is
+        only converted by pandoc when the engine can not convert it.
+
+        Raises:
+            {SystemExit} -- When pandoc could not be run
+
+        Returns:
+            {subprocess.CompletedProcess[bytes]} -- The result of pandoc,
+                                                    with the captured output
+
+        """
+        if self._html_engine is not None:
+            result = self._render_html(in_file, out_file)
+            if result is not None:
+                return result
+
+        if self._server is not None:
+            result = self._run_pandoc_server(in_file, out_file)
+            if result is not None:
+                return result
+
         self._logger.info(f'Attempting convertion with command: {pd_command}')
 
         try:
             # Stdout and stderr are supressed so
             # that custom information can be shown
-            result = subprocess.run(
+            return subprocess.run(
                 pd_command,
                 shell=True,
                 capture_output=True,
             )
+        except subprocess.CalledProcessError as se:
+            self._logger.error(f'Could not convert {in_file} into {out_file}')
+            self._logger.debug(se)
+            raise SystemExit(1)
 
-            if result.stderr:
-                error_text = result.stderr.decode('utf-8').strip()
-                if self._visual:
+    def _render_html(
+        self,
+        in_file: str,
+        out_file: str,
+    ) -> Optional['subprocess.CompletedProcess[bytes]']:
+        """Converts the file using the mistune engine
+
+        Returns:
+            {Optional[subprocess.CompletedProcess[bytes]]} -- The result, like
+                pandoc would give it, None when the file has to be converted
+                by pandoc
 
-                    # Helper function to print using tqdm write when
-                    # converting a dir so that it does not
-                    # mess up the progres bar
-                    def print_correct(x):
-                        if self._converting_dir:
-                            return tqdm.tqdm.write(x)
-                        else:
-                            print(x)
-
-                    if error_text.startswith('[WARNING]'):
-                        if not self._pandoc_options['ignore_warnings']:
-                            print_correct(
-                                colored(
-                                    'PANDOC WARNING:',
-                                    'yellow', attrs=['bold'],
-                                ),
-                            )
-                            print_correct(
-                                colored(
-                                    result.stderr.decode(
-                                        'utf-8',
-                                    ).strip(), 'yellow',
-                                ),
-                            )
+        """
+        assert self._html_engine is not None
+        try:
+            with open(in_file, 'r', encoding='utf-8') as note_file:
+                text = note_file.read()
+        except (OSError, UnicodeDecodeError):
+            # Let pandoc show the error
+            return None
+
+        output = self._html_engine.render(
+            text, os.path.splitext(os.path.basename(in_file))[0],
+        )
+        if output is None:
+            self._logger.info(
+                f'{in_file} can not be converted by the mistune engine, '
+                'using pandoc',
+            )
+            return None
+
+        with open(out_file, 'w', encoding='utf-8') as out:
+            out.write(output)
+        return subprocess.CompletedProcess(in_file, 0, b'', b'')
+
+    def _run_pandoc_server(
+        self,
+        in_file: str,
+        out_file: str,
+    ) -> Optional['subprocess.CompletedProcess[bytes]']:
+        """Converts the file using the pandoc server
+
+        Returns:
+            {Optional[subprocess.CompletedProcess[bytes]]} -- The result, like
+                pandoc would give it (with the messages of pandoc as stderr),
+                None when the server could not convert the file
+
+        """
+        assert self._server is not None
+        assert self._server_options is not None
+        try:
+            with open(in_file, 'r', encoding='utf-8') as note_file:
+                text = note_file.read()
+        except (OSError, UnicodeDecodeError):
+            # Let pandoc show the error
+            return None
+
+        request = dict(self._server_options, text=text)
+        if not TITLE_RE.search(text):
+            # Like pandoc does for files, the file name is used as title
+            request['variables'] = {
+                'pagetitle': os.path.splitext(os.path.basename(in_file))[0],
+            }
+
+        self._logger.info(f'Converting {in_file} using the pandoc server')
+        try:
+            output, messages = self._server.convert(request)
+        except PandocServerError as e:
+            return subprocess.CompletedProcess(
+                in_file, 1, b'', str(e).encode('utf-8'),
+            )
+        except (OSError, http.client.HTTPException) as e:
+            self._logger.warning(
+                f'The pandoc server could not convert {in_file}, '
+                'using pandoc',
+            )
+            self._logger.debug(e)
+            return None
+
+        with open(out_file, 'w', encoding='utf-8') as out:
+            out.write(output)
+        stderr = '\n'.join(
+            f"[{message.get('verbosity', 'WARNING')}] "
+            f"{message.get('message', '')}"
+            for message in messages
+        )
+        return subprocess.CompletedProcess(
+            in_file, 0, b'', stderr.encode('utf-8'),
+        )
+
+    def _show_pandoc_result(
+        self,
+        in_file: str,
+        out_file: str,
+        result: 'subprocess.CompletedProcess[bytes]',
+    ) -> None:
+        """Shows the warnings and errors pandoc gave for a file"""
+        if result.stderr:
+            error_text = result.stderr.decode('utf-8').strip()
+            if self._visual:
+
+                # Helper function to print using tqdm write when
+                # converting a dir so that it does not
+                # mess up the progres bar
+                def print_correct(x):
+                    if self._converting_dir:
+                        return tqdm.tqdm.write(x)
                     else:
+                        print(x)
+
+                if error_text.startswith('[WARNING]'):
+                    if not self._pandoc_options['ignore_warnings']:
                         print_correct(
                             colored(
-                                f'Could not convert {in_file} into {out_file}. See error message below.',  # noqa: E501
-                                'red',
-                                attrs=['bold'],
-                            ),
-                        )
-                        print_correct(
-                            colored(
-                                'PANDOC ERROR:',
-                                'red', attrs=['bold'],
+                                'PANDOC WARNING:',
+                                'yellow', attrs=['bold'],
                             ),
                         )
                         print_correct(
                             colored(
-                                result.stderr.decode('utf-8').strip(),
-                                'red',
+                                result.stderr.decode(
+                                    'utf-8',
+                                ).strip(), 'yellow',
                             ),
                         )
-                    self._logger.debug(
-                        f'Pandoc error (was printend on screen): {error_text}',
-                    )
                 else:
-                    self._logger.warning(f'Pandoc error: {error_text}')
+                    print_correct(
+                        colored(
+                            f'Could not convert {in_file} into {out_file}. See error message below.',  # noqa: E501
+                            'red',
+                            attrs=['bold'],
+                        ),
+                    )
+                    print_correct(
+                        colored(
+                            'PANDOC ERROR:',
+                            'red', attrs=['bold'],
+                        ),
+                    )
+                    print_correct(
+                        colored(
+                            result.stderr.decode('utf-8').strip(),
+                            'red',
+                        ),
+                    )
+                self._logger.debug(
+                    f'Pandoc error (was printend on screen): {error_text}',
+                )
+            else:
+                self._logger.warning(f'Pandoc error: {error_text}')
 
-        except subprocess.CalledProcessError as se:
-            self._logger.error(f'Could not convert {in_file} into {out_file}')
-            self._logger.debug(se)
-            raise SystemExit(1)
+    def _output_file(self, out_file: str) -> str:
+        """Returns the path pandoc writes to when converting to out_file
+
+        PDF files always get the .pdf extension.
+
+        """
+        if (
+            self._pandoc_options['output_format'] == 'pdf' and
+            not out_file.endswith('.pdf')
+        ):
+            return '.'.join(out_file.split('.')[:-1]) + '.pdf'
+        return out_file
+
+    def _find_duplicate_notes(self, file_paths: List[str]) -> Dict[str, str]:
+        """Finds the notes that would be converted to the same output
+
+        Pandoc uses the file name as title when a note has no title, so
+        only notes with the same content and the same file name are
+        duplicates.
+
+        Arguments:
+            file_paths {List[str]} -- The paths of the notes
+
+        Returns:
+            Dict[str, str] -- The path of every duplicate note mapped to
+                              the first note with the same output
+
+        """
+        by_name: Dict[str, List[str]] = {}
+        for file_path in file_paths:
+            by_name.setdefault(os.path.basename(file_path), []).append(
+                file_path,
+            )
+        duplicate_of: Dict[str, str] = {}
+        for same_name in by_name.values():
+            if len(same_name) > 1:
+                duplicate_of.update(find_duplicate_files(same_name))
+        return duplicate_of
+
+    def _create_manifest(self, out_dir_path: str) -> ConvertManifest:
+        """Creates (and loads) the manifest of the out directory
+
+        With --force the old manifest is not loaded, so all the files are
+        converted.
+
+        """
+        info = pandoc_info()
+        version = info['version']
+        if self._html_engine is not None:
+            # Most outputs are made by the engine instead of pandoc
+            version = f'{version} + {ENGINE_VERSION}'
+        manifest = ConvertManifest(
+            out_dir_path,
+            version,
+            self._find_dependencies(info['data_dir']),
+        )
+        if not self._force:
+            manifest.load()
+        return manifest
+
+    def _find_dependencies(self, data_dir: Optional[str]) -> List[str]:
+        """Finds the files (other than the notes) pandoc reads
+
+        Arguments:
+            data_dir {Optional[str]} -- The user data directory of pandoc
+
+        Returns:
+            {List[str]} -- The template, its partials and the files passed
+                           in the pandoc arguments
+
+        """
+        template: Optional[str] = self._pandoc_options['template']
+        output_format = self._pandoc_options['output_format']
+        if template is None and output_format != 'pdf':
+            template = 'GitHub.html5'
+        template_path = None
+        if template is not None and template != 'None':
+            template_path = find_template(template, output_format, data_dir)
+        return find_dependencies(
+            template_path, self._pandoc_options['arguments'],
+        )
 
     def _create_watch_handler(
         self,
@@ -398,6 +803,61 @@ class ConvertMode(BaseMode[ConvertModeArguments]):
 
         return Handler()
 
+    def _create_dependency_handler(
+        self,
+        in_path: str,
+        out_path: str,
+        dependencies: List[str],
+    ) -> FileSystemEventHandler:
+        """Create the handler that converts again when a dependency changes
+
+        Arguments:
+            in_path {str}             -- The input path (file or folder).
+            out_path {str}            -- The path the output should be
+                                         written to.
+            dependencies {List[str]}  -- The files the outputs depend on
+                                         (e.g. the template)
+
+        Returns:
+            {FileSystemEventHandler} -- The handler that converts the notes
+                                        again when a dependency is changed
+
+        """
+        dependency_paths = {os.path.abspath(d) for d in dependencies}
+
+        def rebuild(dependency: str):
+            if self._visual:
+                # Extra print, otherwise text will show up after the spinner
+                print()
+                print(
+                    colored('Dependency changed:', 'blue', attrs=['bold']),
+                    colored(dependency, 'blue'),
+                )
+            self._logger.info(f'Dependency changed: {dependency}')
+            if self._html_engine is not None:
+                # The engine uses the compiled template
+                self._html_engine = self._create_html_engine()
+            if os.path.isdir(in_path):
+                # The manifest knows which outputs depend on the file
+                self._convert_dir(in_path, out_path)
+            else:
+                self._convert_file(in_path, out_path)
+
+        class Handler(FileSystemEventHandler):
+
+            def on_any_event(self, event: FileSystemEvent):
+                if event.is_directory or event.event_type == 'deleted':
+                    return None
+                changed_path = event.src_path
+                if event.event_type == 'moved':
+                    # Editors often save a file by moving a new file over it
+                    changed_path = cast(FileMovedEvent, event).dest_path
+                changed_path = os.path.abspath(changed_path)
+                if changed_path in dependency_paths:
+                    rebuild(changed_path)
+
+        return Handler()
+
     def _start_watch_mode(self, args: ConvertModeArguments) -> None:
         """Starts and runs the watch mode until canceled
 
@@ -415,6 +875,20 @@ class ConvertMode(BaseMode[ConvertModeArguments]):
         observer = Observer()
         observer.schedule(event_handler, args['in_path'], recursive=True)
 
+        # Also convert again when the template (or another file the
+        # outputs depend on) changes
+        dependencies = self._find_dependencies(pandoc_info()['data_dir'])
+        dependency_handler = self._create_dependency_handler(
+            args['in_path'], args['out_path'], dependencies,
+        )
+        for dependency_dir in sorted({
+            os.path.dirname(os.path.abspath(d)) for d in dependencies
+        }):
+            self._logger.debug(f'Watching dependencies in: {dependency_dir}')
+            observer.schedule(
+                dependency_handler, dependency_dir, recursive=False,
+            )
+
         self._logger.debug(f"Starting watch mode for: {args['in_path']}")
 
         if self._visual:
@@ -519,14 +993,14 @@ class ConvertMode(BaseMode[ConvertModeArguments]):
             self._logger.info(f'Making new directory: {out_dir_path}')
             os.mkdir(out_dir_path)
 
-        for file_path in v_tqdm(
-            all_files,
-            desc='Converting',
-            ascii=True,
-            colour='green',
-        ):
+        # The out file of every note, the directories are created up front
+        # so that the notes can be converted in any order
+        tasks: List[Tuple[str, str]] = []
+        made_dirs: Set[str] = set()
+        abs_in_dir_path = os.path.abspath(in_dir_path)
+        for file_path in all_files:
 
-            dir_path = file_path[len(os.path.abspath(in_dir_path)):]
+            dir_path = file_path[len(abs_in_dir_path):]
             dir_to_make = os.path.join(
                 out_dir_path, dir_path[
                     1:len(
@@ -535,16 +1009,168 @@ class ConvertMode(BaseMode[ConvertModeArguments]):
                 ],
             )
 
-            os.makedirs(dir_to_make, exist_ok=True)
-            assert os.path.isdir(dir_to_make)
+            if dir_to_make not in made_dirs:
+                os.makedirs(dir_to_make, exist_ok=True)
+                assert os.path.isdir(dir_to_make)
+                made_dirs.add(dir_to_make)
+
+            out_filename = os.path.basename(file_path).replace('.md', '.html')
+            tasks.append((file_path, os.path.join(dir_to_make, out_filename)))
+
+        # Only the notes that changed since the last run are converted
+        manifest = self._create_manifest(out_dir_path)
+        commands: Dict[str, str] = {}
+        stale_tasks: List[Tuple[str, str]] = []
+        for file_path, out_file_path in tasks:
+            command = self._pandoc_command(file_path, out_file_path)
+            if manifest.is_up_to_date(
+                file_path, self._output_file(out_file_path), command,
+            ):
+                continue
+            commands[file_path] = command
+            stale_tasks.append((file_path, out_file_path))
+
+        self._logger.info(
+            f'{manifest.up_to_date} of {len(tasks)} files are up to date',
+        )
+        if self._visual and manifest.up_to_date:
+            print(
+                colored(
+                    f'{manifest.up_to_date} files are up to date',
+                    'green',
+                ),
+            )
 
-            # Convert the actual file
-            in_filename = os.path.basename(file_path)
-            out_filename = in_filename.replace('.md', '.html')
-            out_file_path = os.path.join(dir_to_make, out_filename)
+        # Notes with the same content are converted once, the output is
+        # copied for the others
+        duplicate_of = self._find_duplicate_notes(list(commands))
+        # The in file -> out file of the notes that have duplicates (and
+        # were converted)
+        converted: Dict[str, str] = {}
+        have_duplicates = set(duplicate_of.values())
 
-            self._logger.info(f'Converted {in_filename} -> {out_filename}')
-            self._convert_file(file_path, out_file_path)
+        try:
+            # Duplicates are not run by the pool, when the output of the
+            # original note is missing they are converted below
+            for file_path, out_file_path, result in v_tqdm(
+                self._pandoc_results(stale_tasks, set(duplicate_of)),
+                total=len(stale_tasks),
+                desc='Converting',
+                ascii=True,
+                colour='green',
+            ):
+
+                in_filename = os.path.basename(file_path)
+                out_filename = os.path.basename(out_file_path)
+                output = self._output_file(out_file_path)
+
+                # Only copied when the original was converted, otherwise
+                # the duplicate is converted itself
+                original = duplicate_of.get(file_path)
+                if original in converted and os.path.isfile(
+                    self._output_file(converted[original]),
+                ):
+                    shutil.copyfile(
+                        self._output_file(converted[original]),
+                        output,
+                    )
+                    self._logger.info(
+                        f'Copied {in_filename} -> {out_filename} '
+                        f'(same content as {original})',
+                    )
+                    manifest.record(file_path, output, commands[file_path])
+                    continue
+
+                self._logger.info(
+                    f'Converted {in_filename} -> {out_filename}',
+                )
+                if result is None:
+                    success = self._convert_file(file_path, out_file_path)
+                else:
+                    self._show_pandoc_result(
+                        file_path, out_file_path, result,
+                    )
+                    success = result.returncode == 0
+                if success:
+                    manifest.record(file_path, output, commands[file_path])
+                else:
+                    manifest.forget(output)
+                if success and file_path in have_duplicates:
+                    converted[file_path] = out_file_path
+        finally:
+            # Also save the outputs that were made when converting stopped
+            # early, they do not have to be made again
+            manifest.remove_missing()
+            manifest.save()
 
         # Cleanup
         self._converting_dir = False
+
+    def _pandoc_results(
+        self,
+        tasks: List[Tuple[str, str]],
+        skip: Set[str],
+    ) -> Iterator[PandocResult]:
+        """Runs pandoc for the tasks, using self._jobs threads
+
+        The results are yielded in the same order as the tasks, so that
+        the warnings and errors are shown in a fixed order. When only one
+        job is used (and for the in files in skip) pandoc is not run and
+        the result is None, the caller converts the file.
+
+        Arguments:
+            tasks {List[Tuple[str, str]]} -- The in file and out file of
+                                             every note to convert
+            skip {Set[str]}               -- The in files not to convert
+
+        Returns:
+            Iterator[PandocResult] -- The result of every task
+
+        """
+        if self._jobs <= 1:
+            for in_file, out_file in tasks:
+                yield in_file, out_file, None
+            return
+
+        self._logger.info(
+            f'Converting {len(tasks)} files using {self._jobs} processes',
+        )
+
+        # Pandoc runs in its own process so threads are enough. Only a
+        # limited amount of files is scheduled at once, the results are
+        # collected in the order they were submitted
+        max_pending = self._jobs * 2
+        pending: Deque[Tuple[str, str, Optional[Future]]] = deque()
+        with ThreadPoolExecutor(max_workers=self._jobs) as executor:
+            try:
+                for in_file, out_file in tasks:
+                    future = None
+                    if in_file not in skip:
+                        future = executor.submit(
+                            self._run_pandoc,
+                            in_file,
+                            out_file,
+                            self._pandoc_command(in_file, out_file),
+                        )
+                    pending.append((in_file, out_file, future))
+                    if len(pending) >= max_pending:
+                        yield self._pending_result(*pending.popleft())
+                while pending:
+                    yield self._pending_result(*pending.popleft())
+            finally:
+                # When converting stopped early (e.g. an error or ctrl-c)
+                # the files that did not start yet are not converted
+                for _, _, future in pending:
+                    if future is not None:
+                        future.cancel()
+
+    def _pending_result(
+        self,
+        in_file: str,
+        out_file: str,
+        future: Optional[Future],
+    ) -> PandocResult:
+        """Waits for pandoc to finish converting in_file"""
+        if future is None:
+            return in_file, out_file, None
+        return in_file, out_file, future.result()
@@ -0,0 +1,267 @@
+"""
+Mode that keeps check mode running and serves requests over a Unix socket
+
+Starting `notesystem check` for every check (e.g. from an editor or a git
+hook) means starting python, building the argument parser and importing
+the markdown parser every time, and checking every file again. The daemon
+does this once: the rule engine, the encodings of the files and the errors
+of every checked file are kept in memory. Files that did not change since
+the last request are not checked again (see CheckCache), so a request for
+unchanged notes only has to stat the files.
+
+Requests are send by the client (see notesystem/daemon_client.py) over a
+new connection as a single line of json, the response is a single line of
+json as well. Requests are handled one at a time.
+
+Requests:
+    {"command": "check" | "fix", "paths": [...], "output_format": "text",
+     "simple_errors": false, "color": false}
+        -> {"output": "...", "exit_code": 0}
+    {"command": "ping"} -> {"version": "..."}
+    {"command": "stop"} -> {}
+A request that can not be handled gets {"error": "..."} as response.
+"""
+import io
+import json
+import os
+import socket
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import TypedDict
+
+from termcolor import colored
+
+import notesystem
+from notesystem.common.utils import FileWriter
+from notesystem.common.utils import find_all_md_files
+from notesystem.common.visual import format_doc_error
+from notesystem.common.visual import format_simple_doc_error
+from notesystem.daemon_client import send_request
+from notesystem.modes.base_mode import BaseMode
+from notesystem.modes.check_mode.check_cache import CACHE_DIR_NAME
+from notesystem.modes.check_mode.check_cache import CheckCache
+from notesystem.modes.check_mode.check_mode import ALL_ERRORS
+from notesystem.modes.check_mode.check_mode import CheckMode
+from notesystem.modes.check_mode.reporters import create_reporter
+
+
+class DaemonModeArguments(TypedDict):
+    # The path of the Unix socket to listen on
+    socket_path: str
+    # The errors that are not checked
+    disabled_errors: List[str]
+
+
+class DaemonMode(BaseMode[DaemonModeArguments]):
+    """Checks notes on request, keeping the results of earlier requests"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._check_mode = CheckMode()
+        self._stopped = False
+
+    def _run(self, args: DaemonModeArguments) -> None:
+        """Entry point for daemon mode, serves until stopped"""
+
+        self.set_disabled_errors(args['disabled_errors'])
+        socket_path = args['socket_path']
+        server = self._bind(socket_path)
+        if self._visual:
+            print(
+                colored('Listening on:', 'blue', attrs=['bold']),
+                colored(socket_path, 'blue'),
+                colored('(use Ctrl+c to exit)', 'red'),
+            )
+        try:
+            self.serve(server)
+        except KeyboardInterrupt:
+            self._logger.debug('Got a KeyboardInterrupt, stopping daemon.')
+        finally:
+            server.close()
+            try:
+                os.unlink(socket_path)
+            except FileNotFoundError:
+                pass
+
+    def set_disabled_errors(self, disabled_errors: List[str]) -> None:
+        """Sets the errors that are not checked
+
+        The results of earlier requests are kept in memory only, the
+        check cache is never loaded or saved.
+
+        """
+        self._check_mode.configure(
+            disabled_errors,
+            CheckCache(
+                CACHE_DIR_NAME,
+                [
+                    error.get_error_name() for error in ALL_ERRORS
+                    if error.get_error_name() not in disabled_errors
+                ],
+            ),
+        )
+
+    def _bind(self, socket_path: str) -> socket.socket:
+        """Creates the socket the daemon listens on
+
+        A socket that is left behind by a daemon that did not stop
+        properly is removed. Only the user can connect to the socket,
+        because the daemon can change (fix) the notes of the user.
+
+        """
+        if os.path.exists(socket_path):
+            try:
+                send_request({'command': 'ping'}, socket_path)
+            except (OSError, ValueError):
+                os.unlink(socket_path)
+            else:
+                msg = f'A notesystem daemon is already running: {socket_path}'
+                if self._visual:
+                    print(colored(msg, 'red'))
+                else:
+                    self._logger.error(msg)
+                raise SystemExit(1)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            server.bind(socket_path)
+        except OSError:
+            server.close()
+            raise
+        finally:
+            os.umask(old_umask)
+        server.listen()
+        return server
+
+    def serve(self, server: socket.socket) -> None:
+        """Handles connections until a stop request is received
+
+        Arguments:
+            server {socket.socket} -- The listening socket
+
+        """
+        while not self._stopped:
+            conn, _ = server.accept()
+            with conn:
+                self._handle_connection(conn)
+
+    def _handle_connection(self, conn: socket.socket) -> None:
+        """Reads a single request from the connection and answers it"""
+        with conn.makefile('rb') as request_file:
+            line = request_file.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line.decode('utf-8'))
+            if not isinstance(request, dict):
+                raise ValueError('The request is not a json object')
+        except ValueError as e:
+            response: Dict[str, Any] = {'error': f'Invalid request: {e}'}
+        else:
+            try:
+                response = self.handle_request(request)
+            except Exception as e:
+                self._logger.exception('Error while handling a request')
+                response = {'error': str(e)}
+        try:
+            conn.sendall(json.dumps(response).encode('utf-8') + b'\n')
+        except OSError as e:
+            # The client is gone
+            self._logger.info(e)
+
+    def handle_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Handles a request (see the module docstring)
+
+        Arguments:
+            request {Dict[str, Any]} -- The request
+
+        Returns:
+            {Dict[str, Any]} -- The response
+
+        """
+        command = request.get('command')
+        if command == 'ping':
+            return {'version': notesystem.__version__}
+        if command == 'stop':
+            self._stopped = True
+            return {}
+        if command not in ('check', 'fix'):
+            return {'error': f'Unknown command: {command}'}
+        return self._check(
+            request.get('paths', []),
+            fix=command == 'fix',
+            output_format=request.get('output_format', 'text'),
+            simple_errors=request.get('simple_errors', False),
+            color=request.get('color', False),
+        )
+
+    def _check(
+        self,
+        paths: List[str],
+        fix: bool,
+        output_format: str,
+        simple_errors: bool,
+        color: bool,
+    ) -> Dict[str, Any]:
+        """Checks (and fixes) the files and directories
+
+        Arguments:
+            paths {List[str]}    -- The absolute paths of the files and
+                                    directories to check
+            fix {bool}           -- Wether to fix the errors
+            output_format {str}  -- How the errors are shown: text or a
+                                    machine readable format
+            simple_errors {bool} -- Wether to show the errors in a 'simple
+                                    way' (only for text)
+            color {bool}         -- Wether to add colors (only for text)
+
+        Returns:
+            {Dict[str, Any]} -- The output and exit code, like they would
+                                be printed by check mode
+
+        """
+        out = io.StringIO()
+        reporter = None
+        if output_format != 'text':
+            try:
+                reporter = create_reporter(output_format, ALL_ERRORS, out)
+            except ValueError as e:
+                return {'error': str(e)}
+
+        file_paths: List[str] = []
+        for path in paths:
+            if os.path.isdir(path):
+                file_paths.extend(sorted(find_all_md_files(path)))
+            elif os.path.isfile(path):
+                file_paths.append(os.path.abspath(path))
+            else:
+                return {'error': f'Could not find file or directory: {path}'}
+        # A file can be in more than one of the paths
+        file_paths = list(dict.fromkeys(file_paths))
+
+        writer = FileWriter() if fix else None
+        if reporter is not None:
+            reporter.start()
+        try:
+            for doc_errors in self._check_mode.check_files(
+                file_paths, fix, writer,
+            ):
+                if reporter is not None:
+                    reporter.report(doc_errors, fix)
+                elif simple_errors:
+                    out.write(format_simple_doc_error(doc_errors, fix, color))
+                else:
+                    out.write(format_doc_error(doc_errors, fix, color))
+        finally:
+            write_errors = writer.close() if writer is not None else []
+        if reporter is not None:
+            reporter.finish()
+
+        for file_path, error in write_errors:
+            out.write(f'Could not write the fixed file {file_path}: {error}\n')
+        return {
+            'output': out.getvalue(),
+            'exit_code': 1 if write_errors else 0,
+        }
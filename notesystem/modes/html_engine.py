@@ -0,0 +1,559 @@
+"""
+Built in engine that converts notes to html without pandoc
+
+Starting pandoc for every note costs tens of milliseconds, the mistune
+engine renders the notes in process instead. The markdown is rendered by
+mistune (with the pandoc extensions notes use: math, tables, footnotes,
+task lists, definition lists and strikeout) and the html is put in the
+pandoc template, which is compiled once.
+
+Only what pandoc does for notes is supported, the engine returns None for
+notes that use other pandoc markdown (e.g. fenced divs, citations or
+attributes) and for front matter it can not read, those notes are
+converted by pandoc.
+"""
+import html
+import re
+import threading
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+import mistune
+
+# The engines convert mode can use
+ENGINES = ('pandoc', 'mistune')
+
+# Stored in the manifest, so that changing the engine (or mistune)
+# converts the notes again
+ENGINE_VERSION = f'mistune {mistune.__version__}'
+
+# The value of $math$ in the template, the same as pandoc --mathjax
+MATHJAX_SCRIPT = (
+    '<script defer=""\n'
+    'src="https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-chtml-full.js"\n'
+    'type="text/javascript"></script>'
+)
+
+# Pandoc markdown mistune does not know: a title block, fenced divs, raw
+# tex environments, citations and attributes (e.g. {#id} or {.class})
+PANDOC_MARKDOWN_RE = re.compile(
+    r'\A%|^:::|^\\begin\{|\[-?@|\{[#.][\w-]', re.M,
+)
+
+# Math like pandoc: $$display math$$ or $inline math$, where the $ must
+# not be followed by a space and the closing $ must not be preceded by a
+# space or followed by a digit. It is a single pattern because mistune
+# tries every pattern at every position.
+MATH_PATTERN = (
+    r'\$(?:\$(?:\\.|[^\\$])+?\$\$|'
+    r'(?!\s)(?:\\.|[^\\$])+?(?<!\s)\$(?!\d))'
+)
+
+FRONT_MATTER_START = '---'
+FRONT_MATTER_ENDS = ('---', '...')
+# A simple front matter field (key: value or key: followed by a list)
+_FIELD_RE = re.compile(r'^([\w-]+)\s*:(?:\s+(.*?))?\s*$')
+_LIST_ITEM_RE = re.compile(r'^\s+-\s+(.*?)\s*$')
+
+_TAG_RE = re.compile(r'<[^>]*>')
+
+
+class TemplateError(Exception):
+    """The template uses syntax the engine does not support"""
+
+
+# Template syntax after a $, e.g. if(title)$, endif$ or {title}
+_DIRECTIVE_RE = re.compile(
+    r'(\{\s*)?(if|elseif|for)\(\s*([\w-]+(?:\.[\w-]+)*)\s*\)(?(1)\s*\}|\$)',
+)
+_KEYWORD_RE = re.compile(r'(\{\s*)?(else|endif|sep|endfor)(?(1)\s*\}|\$)')
+_VARIABLE_RE = re.compile(r'(\{\s*)?([\w-]+(?:\.[\w-]+)*)(?(1)\s*\}|\$)')
+_COMMENT_RE = re.compile(r'--[^\n]*')
+_LINE_END_RE = re.compile(r'[ \t]*(?:\n|\Z)')
+
+
+class Template:
+    """A pandoc template
+
+    Supports variables, conditionals ($if()$, $elseif()$, $else$) and
+    loops ($for()$, $sep$) like pandoc does, including the removal of
+    lines that only contain a directive. Partials and pipes are not
+    supported.
+
+    """
+
+    def __init__(self, text: str):
+        """Compiles the template
+
+        Arguments:
+            text {str} -- The template
+
+        Raises:
+            {TemplateError} -- When the template uses syntax that is not
+                               supported (e.g. partials)
+
+        """
+        tokens = self._tokenize(text)
+        self._nodes, end = self._parse(tokens, 0, ())
+        if end != len(tokens):
+            raise TemplateError(f'Unexpected ${tokens[end][0]}$')
+
+    def render(self, variables: Dict[str, Any]) -> str:
+        """Renders the template
+
+        Arguments:
+            variables {Dict[str, Any]} -- The variables, the values are
+                                          strings, booleans or lists
+
+        Returns:
+            {str} -- The rendered template
+
+        """
+        return self._render(self._nodes, [variables])
+
+    def _tokenize(self, text: str) -> List[Any]:
+        """Splits the template into text and directives
+
+        Returns:
+            {List[Any]} -- The text (str) and the directives (tuples
+                           starting with the keyword, or 'var')
+
+        """
+        tokens: List[Any] = []
+        pos = 0
+        while True:
+            start = text.find('$', pos)
+            if start == -1:
+                tokens.append(text[pos:])
+                return tokens
+            line_start = text.rfind('\n', 0, start) + 1
+            indent = text[line_start:start]
+            if indent.strip(' \t'):
+                indent = ''
+
+            if text.startswith('$', start + 1):
+                tokens.append(text[pos:start + 1])
+                pos = start + 2
+                continue
+            m = (
+                _COMMENT_RE.match(text, start + 1) or
+                _DIRECTIVE_RE.match(text, start + 1) or
+                _KEYWORD_RE.match(text, start + 1)
+            )
+            if m is None:
+                m = _VARIABLE_RE.match(text, start + 1)
+                if m is None:
+                    raise TemplateError(
+                        f'Unsupported template syntax: '
+                        f'{text[start:start + 20]!r}',
+                    )
+                tokens.append(text[pos:start])
+                tokens.append(('var', m.group(2), indent))
+                pos = m.end()
+                continue
+
+            token: Tuple[str, ...]
+            if m.re is _COMMENT_RE:
+                token = ('comment',)
+            elif m.re is _DIRECTIVE_RE:
+                token = (m.group(2), m.group(3))
+            else:
+                token = (m.group(2),)
+            end = m.end()
+            # Like pandoc, a line with only a directive is removed
+            line_end = _LINE_END_RE.match(text, end)
+            if (
+                line_start >= pos and indent == text[line_start:start] and
+                line_end is not None
+            ):
+                tokens.append(text[pos:line_start])
+                end = line_end.end()
+            else:
+                tokens.append(text[pos:start])
+            if token[0] != 'comment':
+                tokens.append(token)
+            pos = end
+
+    def _parse(
+        self,
+        tokens: List[Any],
+        i: int,
+        until: Tuple[str, ...],
+    ) -> Tuple[List[Any], int]:
+        """Parses the tokens into nodes, until one of the keywords
+
+        Returns:
+            {Tuple[List[Any], int]} -- The nodes and the index of the token
+                                       that ended them
+
+        """
+        nodes: List[Any] = []
+        while i < len(tokens):
+            token = tokens[i]
+            if isinstance(token, str):
+                if token:
+                    nodes.append(token)
+                i += 1
+            elif token[0] in until:
+                return nodes, i
+            elif token[0] == 'var':
+                nodes.append(token)
+                i += 1
+            elif token[0] == 'if':
+                branches = []
+                condition = token[1]
+                else_nodes: List[Any] = []
+                while True:
+                    body, i = self._parse(
+                        tokens, i + 1, ('elseif', 'else', 'endif'),
+                    )
+                    branches.append((condition, body))
+                    if i == len(tokens):
+                        raise TemplateError('Missing $endif$')
+                    if tokens[i][0] == 'elseif':
+                        condition = tokens[i][1]
+                        continue
+                    if tokens[i][0] == 'else':
+                        else_nodes, i = self._parse(
+                            tokens, i + 1, ('endif',),
+                        )
+                        if i == len(tokens):
+                            raise TemplateError('Missing $endif$')
+                    break
+                nodes.append(('if', branches, else_nodes))
+                i += 1
+            elif token[0] == 'for':
+                body, i = self._parse(tokens, i + 1, ('sep', 'endfor'))
+                sep: List[Any] = []
+                if i < len(tokens) and tokens[i][0] == 'sep':
+                    sep, i = self._parse(tokens, i + 1, ('endfor',))
+                if i == len(tokens):
+                    raise TemplateError('Missing $endfor$')
+                nodes.append(('for', token[1], body, sep))
+                i += 1
+            else:
+                raise TemplateError(f'Unexpected ${token[0]}$')
+        return nodes, i
+
+    def _render(self, nodes: List[Any], scopes: List[Dict[str, Any]]) -> str:
+        out = []
+        for node in nodes:
+            if isinstance(node, str):
+                out.append(node)
+            elif node[0] == 'var':
+                value = _to_text(_lookup(scopes, node[1]))
+                if node[2] and '\n' in value:
+                    # Like pandoc, the value keeps the indentation
+                    value = re.sub(r'\n(?=.)', '\n' + node[2], value)
+                out.append(value)
+            elif node[0] == 'if':
+                for condition, body in node[1]:
+                    if _is_true(_lookup(scopes, condition)):
+                        out.append(self._render(body, scopes))
+                        break
+                else:
+                    out.append(self._render(node[2], scopes))
+            else:
+                _, name, body, sep = node
+                values = _lookup(scopes, name)
+                if not _is_true(values):
+                    continue
+                if not isinstance(values, list):
+                    values = [values]
+                # The loop variable is the item, also available as it
+                key = name.split('.')[-1]
+                for n, value in enumerate(values):
+                    if n > 0:
+                        out.append(self._render(sep, scopes))
+                    scope = {key: value, 'it': value}
+                    out.append(self._render(body, [*scopes, scope]))
+        return ''.join(out)
+
+
+def _lookup(scopes: List[Dict[str, Any]], name: str) -> Any:
+    """Finds the value of a (dotted) variable, the innermost scope first"""
+    first, *fields = name.split('.')
+    for scope in reversed(scopes):
+        if first in scope:
+            value = scope[first]
+            break
+    else:
+        return None
+    for field in fields:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(field)
+    return value
+
+
+def _is_true(value: Any) -> bool:
+    return value is not None and value is not False and value != '' and (
+        value != []
+    )
+
+
+def _to_text(value: Any) -> str:
+    if value is None or value is False:
+        return ''
+    if value is True:
+        return 'true'
+    if isinstance(value, list):
+        return ''.join(_to_text(v) for v in value)
+    return str(value)
+
+
+def parse_front_matter(text: str) -> Optional[Tuple[Dict[str, Any], str]]:
+    """Splits the (simple) front matter from a note
+
+    Only fields with a single line value (key: value) or a list of single
+    line values (key: followed by - value lines) are supported.
+
+    Arguments:
+        text {str} -- The note
+
+    Returns:
+        {Optional[Tuple[Dict[str, Any], str]]} -- The fields and the rest
+            of the note, None when the front matter is not supported
+
+    """
+    if not text.startswith(FRONT_MATTER_START):
+        return {}, text
+    lines = text.split('\n')
+    if lines[0].rstrip() != FRONT_MATTER_START or (
+        len(lines) < 2 or not lines[1].strip()
+    ):
+        # A horizontal rule, not front matter
+        return {}, text
+
+    fields: Dict[str, Any] = {}
+    key = None
+    for n, line in enumerate(lines[1:], start=1):
+        if line.rstrip() in FRONT_MATTER_ENDS:
+            return fields, '\n'.join(lines[n + 1:])
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        field = _FIELD_RE.match(line)
+        if field is not None:
+            key, value = field.groups()
+            if value is None:
+                fields[key] = []
+            elif value.startswith(('|', '>', '[', '{', '&', '*', '!')):
+                # Yaml that is not a simple value
+                return None
+            else:
+                fields[key] = _scalar(value)
+            continue
+        item = _LIST_ITEM_RE.match(line)
+        if (
+            item is not None and key is not None and
+            isinstance(fields[key], list)
+        ):
+            fields[key].append(_scalar(item.group(1)))
+            continue
+        return None
+    # Not closed, so it is not front matter
+    return {}, text
+
+
+def _scalar(value: str) -> Any:
+    if value in ('true', 'false'):
+        return value == 'true'
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    return value
+
+
+class PandocHTMLRenderer(mistune.HTMLRenderer):
+    """Renders html like pandoc does
+
+    Headings get an id, math is rendered for MathJax and task lists are
+    rendered with a label. The renderer keeps state for a single note
+    (see reset), so it should only be used by one thread.
+
+    """
+
+    def __init__(self) -> None:
+        super().__init__(escape=False)
+        self.reset()
+
+    def reset(self) -> None:
+        """Resets the state before rendering a note"""
+        self.has_math = False
+        self._ids: Set[str] = set()
+
+    def heading(self, text: str, level: int) -> str:
+        tag = f'h{level}'
+        return f'<{tag} id="{self._heading_id(text)}">{text}</{tag}>\n'
+
+    def _heading_id(self, text: str) -> str:
+        """Creates a (unique) id like the auto_identifiers of pandoc"""
+        plain = html.unescape(_TAG_RE.sub('', text)).lower()
+        plain = ''.join(
+            c for c in plain if c.isalnum() or c.isspace() or c in '_-.'
+        )
+        identifier = re.sub(r'\s+', '-', plain.strip())
+        # Identifiers start with a letter
+        letter = re.search(r'[^\W\d_]', identifier)
+        identifier = identifier[letter.start():] if letter else 'section'
+        if identifier in self._ids:
+            n = 1
+            while f'{identifier}-{n}' in self._ids:
+                n += 1
+            identifier = f'{identifier}-{n}'
+        self._ids.add(identifier)
+        return identifier
+
+    def math_inline(self, text: str) -> str:
+        self.has_math = True
+        return (
+            f'<span class="math inline">\\({html.escape(text, False)}\\)'
+            '</span>'
+        )
+
+    def math_display(self, text: str) -> str:
+        self.has_math = True
+        return (
+            f'<span class="math display">\\[{html.escape(text, False)}\\]'
+            '</span>'
+        )
+
+    def list(
+        self,
+        text: str,
+        ordered: bool,
+        level: int,
+        start: Optional[int] = None,
+    ) -> str:
+        if not ordered and text.startswith('<li><label><input'):
+            return f'<ul class="task-list">\n{text}</ul>\n'
+        return super().list(text, ordered, level, start)
+
+    def task_list_item(self, text: str, level: int, checked: bool) -> str:
+        checkbox = '<input type="checkbox"'
+        checkbox += ' checked="" />' if checked else ' />'
+        if text.startswith('<p>'):
+            text = text.replace('</p>', '</label></p>', 1)
+            return f'<li><p><label>{checkbox}{text[3:]}</li>\n'
+        return f'<li><label>{checkbox}{text}</label></li>\n'
+
+
+# The patterns are combined by mistune, so the groups of a pattern can not
+# be used and the delimiters are removed instead
+def _parse_math(self, m, state):
+    math = m.group(0)
+    if math.startswith('$$'):
+        return 'math_display', math[2:-2]
+    return 'math_inline', math[1:-1]
+
+
+def plugin_math(md: mistune.Markdown) -> None:
+    """Adds $math$ and $$display math$$ (rendered by PandocHTMLRenderer)"""
+    md.inline.register_rule('math', MATH_PATTERN, _parse_math)
+    # Before the other rules, so that math is not parsed as emphasis
+    md.inline.rules.insert(0, 'math')
+
+
+def create_markdown() -> mistune.Markdown:
+    """Creates the markdown parser with the pandoc extensions notes use"""
+    return mistune.create_markdown(
+        renderer=PandocHTMLRenderer(),
+        plugins=[
+            'strikethrough', 'footnotes', 'table', 'task_lists',
+            'def_list', plugin_math,
+        ],
+    )
+
+
+class HtmlEngine:
+    """Converts notes to html in process, with a (compiled) template"""
+
+    def __init__(self, template: Optional[str]):
+        """Initializes the engine
+
+        Arguments:
+            template {Optional[str]} -- The text of the template, None to
+                                        only output the body
+
+        Raises:
+            {TemplateError} -- When the template can not be used
+
+        """
+        self._template = Template(template) if template is not None else None
+        # The parser (and renderer) keeps state, so every thread gets its
+        # own parser
+        self._local = threading.local()
+
+    def _markdown(self) -> mistune.Markdown:
+        markdown = getattr(self._local, 'markdown', None)
+        if markdown is None:
+            markdown = self._local.markdown = create_markdown()
+        return markdown
+
+    def render(self, text: str, title: str) -> Optional[str]:
+        """Converts a note to html
+
+        Arguments:
+            text {str}  -- The markdown of the note
+            title {str} -- The page title used when the note has no title
+                           (pandoc uses the file name)
+
+        Returns:
+            {Optional[str]} -- The html, None when the note has to be
+                               converted by pandoc
+
+        """
+        if PANDOC_MARKDOWN_RE.search(text):
+            return None
+        front_matter = parse_front_matter(text)
+        if front_matter is None:
+            return None
+        fields, body_text = front_matter
+
+        markdown = self._markdown()
+        markdown.renderer.reset()
+        # Like pandoc, the body has no newline at the end
+        body = markdown(body_text).rstrip('\n')
+        if self._template is None:
+            return body + '\n'
+
+        # Like pandoc, the metadata is markdown
+        variables: Dict[str, Any] = {}
+        for key, value in fields.items():
+            if isinstance(value, list):
+                variables[key] = [self._inline(v) for v in value]
+            else:
+                variables[key] = self._inline(value)
+        variables['body'] = body
+        if markdown.renderer.has_math:
+            variables['math'] = MATHJAX_SCRIPT
+        variables.setdefault(
+            'pagetitle', _plain(variables.get('title')) or html.escape(title),
+        )
+        if 'author' in variables:
+            authors = variables['author']
+            variables['author-meta'] = [
+                _plain(author) for author in (
+                    authors if isinstance(authors, list) else [authors]
+                )
+            ]
+        if 'date' in variables:
+            variables['date-meta'] = _plain(variables['date'])
+        return self._template.render(variables)
+
+    def _inline(self, value: Any) -> Any:
+        """Renders a metadata value (without the paragraph)"""
+        if not isinstance(value, str):
+            return value
+        rendered = self._markdown()(value).strip()
+        if rendered.startswith('<p>') and rendered.endswith('</p>'):
+            rendered = rendered[3:-4]
+        return rendered
+
+
+def _plain(value: Any) -> str:
+    """The text of rendered metadata, for attributes and the page title"""
+    return _TAG_RE.sub('', _to_text(value))
@@ -0,0 +1,610 @@
+"""
+Mode that runs a Language Server Protocol (LSP) server over stdio
+
+The server publishes the errors found by check mode as diagnostics and
+offers the fixes of the errors as code actions.
+
+Open documents are kept in memory as lines, together with the errors found
+on every line. The errors are checked on the lines ending in a newline
+(like check mode reads files), the line endings of the document are kept
+in the edits of the code actions. When a document changes only the
+changed lines (and the lines around them) are checked again, together
+with the lines whose context (e.g. code block) changed because of the
+change. The AST errors need the whole document, so they are only checked
+when a document is opened or saved.
+"""
+import json
+import re
+import sys
+from typing import Any
+from typing import BinaryIO
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TypedDict
+
+import notesystem
+from notesystem.modes.base_mode import BaseMode
+from notesystem.modes.check_mode.check_mode import CheckMode
+from notesystem.modes.check_mode.errors.ast_errors import AstError
+from notesystem.modes.check_mode.errors.base_errors import BaseError
+from notesystem.modes.check_mode.errors.base_errors import ErrorMeta
+from notesystem.modes.check_mode.line_context import classify_lines
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+SERVER_NOT_INITIALIZED = -32002
+
+# LSP constants
+TEXT_DOCUMENT_SYNC_INCREMENTAL = 2
+DIAGNOSTIC_SEVERITY_WARNING = 2
+
+# A line including its line ending (LSP only knows \n, \r\n and \r)
+_LINE_RE = re.compile(r'[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+\Z')
+
+
+class LspModeArguments(TypedDict):
+    # The errors that are not checked
+    disabled_errors: List[str]
+
+
+def split_lines(text: str) -> List[str]:
+    """Splits text into lines, keeping the line endings"""
+    return _LINE_RE.findall(text)
+
+
+def utf16_len(text: str) -> int:
+    """Returns the length of the text in UTF-16 code units"""
+    if text.isascii():
+        return len(text)
+    return len(text.encode('utf-16-le')) // 2
+
+
+def utf16_to_index(line: str, character: int) -> int:
+    """Converts an LSP (UTF-16) character offset into a string index"""
+    if line.isascii():
+        return min(character, len(line))
+    units = 0
+    for i, char in enumerate(line):
+        if units >= character:
+            return i
+        units += 2 if ord(char) > 0xFFFF else 1
+    return len(line)
+
+
+def _strip_eol(line: str) -> str:
+    return line.rstrip('\r\n')
+
+
+def _eol(line: str) -> str:
+    """Returns the line ending of the line ('' for the last line)"""
+    return line[len(_strip_eol(line)):]
+
+
+def normalize_eol(line: str) -> str:
+    """Returns the line ending in a newline, like the lines of a file that
+    is read with universal newlines (as check mode does)"""
+    if not line.endswith('\r\n') and not line.endswith('\r'):
+        return line
+    return _strip_eol(line) + '\n'
+
+
+def restore_eol(text: str, eol: str) -> str:
+    """Changes the newlines in (fixed) text into the given line ending"""
+    if eol == '\n':
+        return text
+    return text.replace('\n', eol)
+
+
+class TextDocument:
+    """An open document and the errors that are found in it"""
+
+    def __init__(self, uri: str, text: str, version: Optional[int] = None):
+        self.uri = uri
+        self.version = version
+        self.lines = split_lines(text)
+        # The lines that are checked, ending in a newline instead of the
+        # line ending of the document (same length as lines)
+        self.normalized = [normalize_eol(line) for line in self.lines]
+        # The markdown errors found on every line (same length as lines)
+        self.line_errors: List[List[BaseError]] = [[] for _ in self.lines]
+        # The context of every line (see line_context)
+        self.contexts = classify_lines(self.normalized)
+        # The errors found in the whole document
+        self.ast_errors: List[AstError] = []
+
+    def apply_change(self, change: Dict[str, Any]) -> Tuple[int, int]:
+        """Applies a (incremental or full) content change
+
+        Arguments:
+            change {Dict[str, Any]} -- A TextDocumentContentChangeEvent
+
+        Returns:
+            {Tuple[int, int]} -- The range of lines (start, end) that
+                                 contain the new text
+
+        """
+        if 'range' not in change:
+            self.lines = split_lines(change['text'])
+            self.normalized = [normalize_eol(line) for line in self.lines]
+            self.line_errors = [[] for _ in self.lines]
+            self.contexts = ['' for _ in self.lines]
+            return 0, len(self.lines)
+
+        start_line, start_index = self._position(change['range']['start'])
+        end_line, end_index = self._position(change['range']['end'])
+        first = self.lines[start_line] if start_line < len(self.lines) else ''
+        last = self.lines[end_line] if end_line < len(self.lines) else ''
+        prefix = first[:start_index]
+        suffix = last[end_index:]
+
+        new_lines = split_lines(prefix + change['text'] + suffix)
+        replace_end = end_line + 1
+        self.lines[start_line:replace_end] = new_lines
+        self.normalized[start_line:replace_end] = [
+            normalize_eol(line) for line in new_lines
+        ]
+        self.line_errors[start_line:replace_end] = [[] for _ in new_lines]
+        # The contexts of the new lines are not known yet
+        self.contexts[start_line:replace_end] = ['' for _ in new_lines]
+        return start_line, start_line + len(new_lines)
+
+    def update_contexts(self) -> Tuple[int, int]:
+        """Classifies the lines again, after changes are applied
+
+        Returns:
+            {Tuple[int, int]} -- The range of lines (start, end) of which
+                                 the context changed (including new lines)
+
+        """
+        old_contexts = self.contexts
+        self.contexts = classify_lines(self.normalized)
+        if old_contexts == self.contexts:
+            return 0, 0
+        pairs = list(zip(old_contexts, self.contexts))
+        start = 0
+        while pairs[start][0] == pairs[start][1]:
+            start += 1
+        end = len(pairs)
+        while pairs[end - 1][0] == pairs[end - 1][1]:
+            end -= 1
+        return start, end
+
+    @property
+    def eol(self) -> str:
+        """The line ending of the document (of its first line)"""
+        for line in self.lines:
+            eol = _eol(line)
+            if eol:
+                return eol
+        return '\n'
+
+    def _position(self, position: Dict[str, int]) -> Tuple[int, int]:
+        """Converts an LSP position into a (line, string index) pair"""
+        line_nr = position['line']
+        if line_nr >= len(self.lines):
+            # Positions after the end of the document point to the end
+            if self.lines and not self.lines[-1].endswith(('\n', '\r')):
+                return len(self.lines) - 1, len(self.lines[-1])
+            return len(self.lines), 0
+        # Offsets past the end of a line point to the end of the line
+        # (before the line ending)
+        line = _strip_eol(self.lines[line_nr])
+        return line_nr, utf16_to_index(line, position['character'])
+
+    def line_range(self, line_nr: int) -> Dict[str, Any]:
+        """Returns the LSP range of a whole line (without line ending)"""
+        line = self.lines[line_nr] if line_nr < len(self.lines) else ''
+        return {
+            'start': {'line': line_nr, 'character': 0},
+            'end': {
+                'line': line_nr,
+                'character': utf16_len(_strip_eol(line)),
+            },
+        }
+
+    def full_range(self) -> Dict[str, Any]:
+        """Returns the LSP range of the whole document"""
+        return {
+            'start': {'line': 0, 'character': 0},
+            'end': {'line': len(self.lines), 'character': 0},
+        }
+
+
+class LspMode(BaseMode[LspModeArguments]):
+    """Language server that checks markdown documents while editing"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._check_mode = CheckMode()
+        self._documents: Dict[str, TextDocument] = {}
+        self._initialized = False
+        self._shutdown = False
+        self._out: Optional[BinaryIO] = None
+        # error name -> the encoded part of its diagnostics (see _publish)
+        self._encoded_errors: Dict[str, str] = {}
+
+    def _run(self, args: LspModeArguments) -> None:
+        """Entry point for lsp mode, serves until the client exits"""
+
+        self._check_mode._disabled_errors = args['disabled_errors']
+        exit_code = self.serve(sys.stdin.buffer, sys.stdout.buffer)
+        if exit_code != 0:
+            raise SystemExit(exit_code)
+
+    def serve(self, in_stream: BinaryIO, out_stream: BinaryIO) -> int:
+        """Handles messages until the exit notification (or end of input)
+
+        Arguments:
+            in_stream {BinaryIO}  -- The stream the messages are read from
+            out_stream {BinaryIO} -- The stream the messages are written to
+
+        Returns:
+            {int} -- The exit code (0 when shutdown was requested first)
+
+        """
+        self._out = out_stream
+        while True:
+            message = self._read_message(in_stream)
+            if message is None:
+                break
+            if message.get('method') == 'exit':
+                break
+            self._handle_message(message)
+        return 0 if self._shutdown else 1
+
+    # ----- JSON-RPC ----- #
+
+    def _read_message(self, in_stream: BinaryIO) -> Optional[Dict[str, Any]]:
+        """Reads a single message, None at the end of the input"""
+        content_length = -1
+        while True:
+            header = in_stream.readline()
+            if not header:
+                return None
+            header = header.strip()
+            if not header:
+                break
+            name, _, value = header.decode('ascii').partition(':')
+            if name.strip().lower() == 'content-length':
+                content_length = int(value.strip())
+
+        if content_length < 0:
+            self._logger.error('Message without Content-Length header')
+            return {}
+        body = in_stream.read(content_length)
+        try:
+            message = json.loads(body.decode('utf-8'))
+        except ValueError as e:
+            self._logger.error(f'Could not parse message: {e}')
+            self._send({
+                'jsonrpc': '2.0',
+                'id': None,
+                'error': {'code': PARSE_ERROR, 'message': str(e)},
+            })
+            return {}
+        return message if isinstance(message, dict) else {}
+
+    def _send(self, message: Dict[str, Any]) -> None:
+        self._send_encoded(json.dumps(message, separators=(',', ':')))
+
+    def _send_encoded(self, message: str) -> None:
+        assert self._out is not None
+        body = message.encode('utf-8')
+        self._out.write(f'Content-Length: {len(body)}\r\n\r\n'.encode())
+        self._out.write(body)
+        self._out.flush()
+
+    def _notify(self, method: str, params: Dict[str, Any]) -> None:
+        self._send({'jsonrpc': '2.0', 'method': method, 'params': params})
+
+    def _handle_message(self, message: Dict[str, Any]) -> None:
+        method = message.get('method')
+        msg_id = message.get('id')
+        is_request = 'id' in message
+        if method is None:
+            # Responses (to requests the server never sends) are ignored
+            if is_request and 'result' not in message:
+                self._send_error(msg_id, INVALID_REQUEST, 'No method')
+            return
+
+        handler = self._handlers().get(method)
+        if handler is None:
+            if is_request:
+                self._send_error(
+                    msg_id, METHOD_NOT_FOUND, f'Unknown method: {method}',
+                )
+            return
+        if not self._initialized and method != 'initialize':
+            if is_request:
+                self._send_error(
+                    msg_id, SERVER_NOT_INITIALIZED, 'Not initialized',
+                )
+            return
+
+        try:
+            result = handler(message.get('params') or {})
+        except Exception as e:
+            self._logger.exception(f'Error while handling {method}')
+            if is_request:
+                self._send_error(msg_id, INTERNAL_ERROR, str(e))
+            return
+        if is_request:
+            self._send({'jsonrpc': '2.0', 'id': msg_id, 'result': result})
+
+    def _send_error(self, msg_id: Any, code: int, message: str) -> None:
+        self._send({
+            'jsonrpc': '2.0',
+            'id': msg_id,
+            'error': {'code': code, 'message': message},
+        })
+
+    def _handlers(self) -> Dict[str, Any]:
+        return {
+            'initialize': self._initialize,
+            'initialized': lambda params: None,
+            'shutdown': self._shutdown_request,
+            'textDocument/didOpen': self._did_open,
+            'textDocument/didChange': self._did_change,
+            'textDocument/didSave': self._did_save,
+            'textDocument/didClose': self._did_close,
+            'textDocument/codeAction': self._code_action,
+        }
+
+    # ----- Lifecycle ----- #
+
+    def _initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._initialized = True
+        return {
+            'capabilities': {
+                'textDocumentSync': {
+                    'openClose': True,
+                    'change': TEXT_DOCUMENT_SYNC_INCREMENTAL,
+                    'save': True,
+                },
+                'codeActionProvider': {
+                    'codeActionKinds': ['quickfix', 'source.fixAll'],
+                },
+            },
+            'serverInfo': {
+                'name': 'notesystem',
+                'version': notesystem.__version__,
+            },
+        }
+
+    def _shutdown_request(self, params: Dict[str, Any]) -> None:
+        self._shutdown = True
+        self._documents.clear()
+
+    # ----- Documents ----- #
+
+    def _did_open(self, params: Dict[str, Any]) -> None:
+        item = params['textDocument']
+        doc = TextDocument(item['uri'], item['text'], item.get('version'))
+        self._documents[doc.uri] = doc
+        self._check_lines(doc, 0, len(doc.lines))
+        self._check_ast(doc)
+        self._publish(doc)
+
+    def _did_change(self, params: Dict[str, Any]) -> None:
+        doc = self._documents.get(params['textDocument']['uri'])
+        if doc is None:
+            return
+        doc.version = params['textDocument'].get('version')
+        for change in params['contentChanges']:
+            start, end = doc.apply_change(change)
+            context_start, context_end = doc.update_contexts()
+            if context_start < context_end:
+                start = min(start, context_start)
+                end = max(end, context_end)
+            # The errors of a line depend on the line before and after it
+            self._check_lines(doc, start - 1, end + 1)
+        self._publish(doc)
+
+    def _did_save(self, params: Dict[str, Any]) -> None:
+        doc = self._documents.get(params['textDocument']['uri'])
+        if doc is None:
+            return
+        if 'text' in params:
+            doc.apply_change({'text': params['text']})
+            doc.update_contexts()
+            self._check_lines(doc, 0, len(doc.lines))
+        self._check_ast(doc)
+        self._publish(doc)
+
+    def _did_close(self, params: Dict[str, Any]) -> None:
+        uri = params['textDocument']['uri']
+        self._documents.pop(uri, None)
+        self._notify(
+            'textDocument/publishDiagnostics',
+            {'uri': uri, 'diagnostics': []},
+        )
+
+    # ----- Checking ----- #
+
+    def _check_lines(self, doc: TextDocument, start: int, end: int) -> None:
+        """Checks the lines from start up to end for markdown errors"""
+        start = max(start, 0)
+        end = min(end, len(doc.lines))
+        for line_nr in range(start, end):
+            doc.line_errors[line_nr] = []
+        engine = self._check_mode._get_rule_engine()
+        for error in engine.iter_range_errors(
+            doc.normalized, start, end, doc.contexts,
+        ):
+            assert error['line_nr'] is not None
+            doc.line_errors[error['line_nr']].append(error['error_type'])
+
+    def _check_ast(self, doc: TextDocument) -> None:
+        """Checks the whole document for AST errors"""
+        # The ast cache knows documents by their list of lines, which
+        # apply_change edits in place, so every check gets a new list
+        lines = list(doc.normalized)
+        doc.ast_errors = [
+            ast_err for ast_err in self._check_mode.possible_ast_errors
+            if ast_err.get_error_name()
+            not in self._check_mode._disabled_errors and
+            not ast_err.validate(lines)
+        ]
+
+    def _diagnostic(
+        self,
+        doc: TextDocument,
+        line_nr: int,
+        error: BaseError,
+    ) -> Dict[str, Any]:
+        return {
+            'range': doc.line_range(line_nr),
+            'severity': DIAGNOSTIC_SEVERITY_WARNING,
+            'source': 'notesystem',
+            'code': error.get_error_name(),
+            'message': str(error),
+        }
+
+    def _encoded_diagnostic(
+        self,
+        doc: TextDocument,
+        line_nr: int,
+        error: BaseError,
+    ) -> str:
+        """Returns the json of the diagnostic of an error
+
+        Same as json.dumps(self._diagnostic(...)), but the part that only
+        depends on the error type is encoded once. The diagnostics of
+        every error are send after every change, so this has to be fast.
+
+        """
+        name = error.get_error_name()
+        tail = self._encoded_errors.get(name)
+        if tail is None:
+            diagnostic = self._diagnostic(doc, line_nr, error)
+            del diagnostic['range']
+            tail = json.dumps(diagnostic, separators=(',', ':'))[1:]
+            self._encoded_errors[name] = tail
+        line = doc.lines[line_nr] if line_nr < len(doc.lines) else ''
+        end = utf16_len(_strip_eol(line))
+        return (
+            f'{{"range":{{"start":{{"line":{line_nr},"character":0}},'
+            f'"end":{{"line":{line_nr},"character":{end}}}}},{tail}'
+        )
+
+    def _publish(self, doc: TextDocument) -> None:
+        diagnostics = [
+            self._encoded_diagnostic(doc, line_nr, error)
+            for line_nr, errors in enumerate(doc.line_errors) if errors
+            for error in errors
+        ]
+        # AST errors are about the whole document, they are shown
+        # on the first line
+        diagnostics.extend(
+            self._encoded_diagnostic(doc, 0, error)
+            for error in doc.ast_errors
+        )
+        version = ''
+        if doc.version is not None:
+            version = f',"version":{int(doc.version)}'
+        self._send_encoded(
+            '{"jsonrpc":"2.0","method":"textDocument/publishDiagnostics",'
+            f'"params":{{"uri":{json.dumps(doc.uri)}{version},'
+            f'"diagnostics":[{",".join(diagnostics)}]}}}}',
+        )
+
+    # ----- Code actions ----- #
+
+    def _line_edit(
+        self,
+        doc: TextDocument,
+        line_nr: int,
+        new_text: str,
+    ) -> Dict[str, Any]:
+        if line_nr + 1 < len(doc.lines):
+            end = {'line': line_nr + 1, 'character': 0}
+        else:
+            end = {
+                'line': line_nr,
+                'character': utf16_len(doc.lines[line_nr]),
+            }
+        return {
+            'range': {'start': {'line': line_nr, 'character': 0}, 'end': end},
+            'newText': new_text,
+        }
+
+    def _action(
+        self,
+        doc: TextDocument,
+        title: str,
+        kind: str,
+        edit: Dict[str, Any],
+        diagnostics: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        action: Dict[str, Any] = {
+            'title': title,
+            'kind': kind,
+            'edit': {'changes': {doc.uri: [edit]}},
+        }
+        if diagnostics:
+            action['diagnostics'] = diagnostics
+        return action
+
+    def _code_action(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        doc = self._documents.get(params['textDocument']['uri'])
+        if doc is None:
+            return []
+
+        actions = []
+        first = max(params['range']['start']['line'], 0)
+        last = min(params['range']['end']['line'], len(doc.lines) - 1)
+        for line_nr in range(first, last + 1):
+            for error in doc.line_errors[line_nr]:
+                if not error.is_fixable():
+                    continue
+                line = doc.normalized[line_nr]
+                new_text = ''.join(error.fix([line]))
+                if new_text == line:
+                    continue
+                new_text = restore_eol(
+                    new_text, _eol(doc.lines[line_nr]) or doc.eol,
+                )
+                actions.append(self._action(
+                    doc,
+                    f'Fix {error.get_error_name()}',
+                    'quickfix',
+                    self._line_edit(doc, line_nr, new_text),
+                    [self._diagnostic(doc, line_nr, error)],
+                ))
+
+        # Fixing all errors at once, like check mode does with --fix
+        errors = [
+            ErrorMeta(
+                line_nr=line_nr, line=doc.normalized[line_nr], error_type=e,
+            )
+            for line_nr, line_errors in enumerate(doc.line_errors)
+            for e in line_errors
+        ]
+        errors.extend(
+            ErrorMeta(line_nr=None, line=None, error_type=e)
+            for e in doc.ast_errors
+        )
+        fixed_lines = self._check_mode._apply_fixes(doc.normalized, errors)
+        if fixed_lines != doc.normalized:
+            eol = doc.eol
+            if len(fixed_lines) == len(doc.lines):
+                # Every line keeps its own line ending
+                fixed = ''.join(
+                    restore_eol(fixed_line, _eol(line) or eol)
+                    for fixed_line, line in zip(fixed_lines, doc.lines)
+                )
+            else:
+                fixed = restore_eol(''.join(fixed_lines), eol)
+            actions.append(self._action(
+                doc,
+                'Fix all notesystem errors',
+                'source.fixAll',
+                {'range': doc.full_range(), 'newText': fixed},
+                [],
+            ))
+        return actions
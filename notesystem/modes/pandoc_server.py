@@ -0,0 +1,201 @@
+"""
+Client for the http server mode of pandoc
+
+Starting pandoc for every note costs tens of milliseconds. `pandoc server`
+(or the `pandoc-server` program) is started once on localhost instead and
+the notes are sent to it over keep-alive connections (one per thread).
+
+The server can not read files, so the template is sent with every request
+and only the options that can be expressed in a request are supported (see
+ConvertMode._pandoc_server_options).
+"""
+import http.client
+import json
+import logging
+import shutil
+import socket
+import subprocess
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+# The commands that start the server, the first that works is used
+SERVER_COMMANDS = (['pandoc', 'server'], ['pandoc-server'])
+
+# The seconds pandoc may spend on a single request
+REQUEST_TIMEOUT = 30
+
+
+class PandocServerError(Exception):
+    """Pandoc could not convert the request, the message is pandoc's"""
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class PandocServer:
+    """A pandoc server running on localhost"""
+
+    def __init__(self, startup_timeout: float = 5.0):
+        """Initialize the server (it is started by start)
+
+        Arguments:
+            startup_timeout {float} -- The seconds to wait for the server
+                                       to be ready
+
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._startup_timeout = startup_timeout
+        self._process: Optional[subprocess.Popen] = None
+        self._port: Optional[int] = None
+        # Every thread has its own (keep-alive) connection
+        self._local = threading.local()
+        self._connections: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> bool:
+        """Starts the server
+
+        Returns:
+            {bool} -- Wether a working server was started
+
+        """
+        for command in SERVER_COMMANDS:
+            if shutil.which(command[0]) is None:
+                continue
+            port = _free_port()
+            try:
+                process = subprocess.Popen(
+                    [
+                        *command, '--port', str(port),
+                        '--timeout', str(REQUEST_TIMEOUT),
+                    ],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+            except OSError as e:
+                self._logger.debug(e)
+                continue
+            self._process = process
+            self._port = port
+            if self._wait_until_ready():
+                self._logger.info(
+                    f"Started pandoc server ({' '.join(command)}) on port "
+                    f'{port}',
+                )
+                return True
+            self.stop()
+        return False
+
+    def _wait_until_ready(self) -> bool:
+        """Waits until the server converts a (small) document"""
+        assert self._process is not None
+        deadline = time.monotonic() + self._startup_timeout
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                # Pandoc was build without the server or the port is taken
+                return False
+            try:
+                self.convert({'text': 'notesystem', 'to': 'html'})
+                return True
+            except ConnectionRefusedError:
+                # Not listening yet
+                time.sleep(0.05)
+            except (
+                OSError, http.client.HTTPException, PandocServerError,
+            ) as e:
+                # The server does not work (e.g. it stops the connection)
+                self._logger.debug(e)
+                return False
+        return False
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            assert self._port is not None, 'The server is not started'
+            connection = http.client.HTTPConnection(
+                '127.0.0.1', self._port, timeout=REQUEST_TIMEOUT + 5,
+            )
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _close_connection(self) -> None:
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def convert(
+        self,
+        request: Dict[str, Any],
+    ) -> Tuple[str, List[Dict[str, str]]]:
+        """Converts a document
+
+        Arguments:
+            request {Dict[str, Any]} -- The request, e.g. {'text': '# Hi',
+                                        'to': 'html'} (see the pandoc
+                                        server documentation)
+
+        Raises:
+            {PandocServerError} -- When pandoc could not convert the
+                                   document
+            {OSError}           -- When the server can not be reached
+            {http.client.HTTPException}
+
+        Returns:
+            {Tuple[str, List[Dict[str, str]]]} -- The output and the
+                                                  messages (warnings) of
+                                                  pandoc
+
+        """
+        connection = self._connection()
+        try:
+            connection.request(
+                'POST', '/',
+                body=json.dumps(request).encode('utf-8'),
+                headers={
+                    'Content-Type': 'application/json',
+                    'Accept': 'application/json',
+                },
+            )
+            response = connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            # The connection can not be reused
+            self._close_connection()
+            raise
+
+        if response.status != 200:
+            raise PandocServerError(body.decode('utf-8', errors='replace'))
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise PandocServerError(body.decode('utf-8', errors='replace'))
+        if 'error' in data:
+            raise PandocServerError(data['error'])
+        return data['output'], data.get('messages', [])
+
+    def stop(self) -> None:
+        """Closes the connections and stops the server"""
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+        if self._process is not None:
+            self._process.terminate()
+            try:
+                self._process.wait(5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+            self._process = None
@@ -4,11 +4,14 @@ from typing import Optional
 from typing import Sequence
 
 from notesystem.common.config import Config  # type: ignore
+from notesystem.daemon_client import default_socket_path
 from notesystem.modes.base_mode import BaseMode
 from notesystem.modes.base_mode import ModeOptions
 from notesystem.modes.check_mode.check_mode import CheckMode
 from notesystem.modes.convert_mode import ConvertMode
 from notesystem.modes.convert_mode import PandocOptions
+from notesystem.modes.daemon_mode import DaemonMode
+from notesystem.modes.lsp_mode import LspMode
 from notesystem.modes.search_mode import SearchMode
 from notesystem.modes.upload_mode import UploadMode
 
@@ -50,6 +53,16 @@ def main(argv: Optional[Sequence[str]] = None):
                 'fix': config['check']['fix']['value'],
                 'simple_errors': config['check']['simple_errors']['value'],
                 'disabled_errors': disabled_errors,
+                'cache': config['check']['cache']['value'],
+                'cache_dir': config['check']['cache_dir']['value'],
+                'jobs': config['check']['jobs']['value'],
+                'output_format': config['check']['output_format']['value'],
+                'watch': config['check']['watch']['value'],
+                'changed_since': config['check']['changed_since']['value'],
+                'staged': config['check']['staged']['value'],
+                'fail_fast': config['check']['fail_fast']['value'],
+                'max_errors': config['check']['max_errors']['value'],
+                'profile_rules': config['check']['profile_rules']['value'],
             },
 
         }
@@ -73,6 +86,10 @@ def main(argv: Optional[Sequence[str]] = None):
                 'out_path': config['convert']['out_path']['value'],
                 'watch': config['convert']['watch']['value'],
                 'pandoc_options': pandoc_options,
+                'jobs': config['convert']['jobs']['value'],
+                'force': config['convert']['force']['value'],
+                'pandoc_server': config['convert']['pandoc_server']['value'],
+                'engine': config['convert']['engine']['value'],
             },
         }
 
@@ -109,6 +126,35 @@ def main(argv: Optional[Sequence[str]] = None):
             'args': upload_args,
         }
 
+    elif 'lsp' in config:
+        mode = LspMode()
+        disabled_errors = []
+        for disabled_error in config['lsp']['disabled_errors']:
+            if disabled_error['value'] == True:
+                disabled_errors.append(disabled_error['dest'][2:])
+        options = {
+            # The output is used for the protocol, so never print visuals
+            'visual': False,
+            'args': {'disabled_errors': disabled_errors},
+        }
+
+    elif 'daemon' in config:
+        mode = DaemonMode()
+        disabled_errors = []
+        for disabled_error in config['daemon']['disabled_errors']:
+            if disabled_error['value'] == True:
+                disabled_errors.append(disabled_error['dest'][2:])
+        options = {
+            'visual': not config['general']['no_visual']['value'],
+            'args': {
+                'socket_path': (
+                    config['daemon']['socket']['value'] or
+                    default_socket_path()
+                ),
+                'disabled_errors': disabled_errors,
+            },
+        }
+
     else:
         raise SystemExit(1)
 
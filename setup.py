@@ -23,6 +23,7 @@ setup(
     entry_points={
         'console_scripts': [
             'notesystem=notesystem.__main__:run',
+            'notesystem-client=notesystem.daemon_client:main',
         ],
     },
 )
@@ -0,0 +1,175 @@
+import os
+from unittest.mock import patch
+
+from py.path import local as Path
+
+from notesystem.common.utils import decode_bytes
+from notesystem.modes.check_mode.check_cache import CACHE_FILE_NAME
+from notesystem.modes.check_mode.check_cache import CheckCache
+from notesystem.modes.check_mode.check_mode import CheckMode
+from notesystem.modes.check_mode.check_mode import pack_doc_errors
+from notesystem.notesystem import main
+
+
+def _cache_dir(tmpdir: Path) -> str:
+    return tmpdir.join('cache').strpath
+
+
+def test_cache_miss_then_hit(tmpdir: Path):
+    """Test that a stored file is returned from the cache when unchanged"""
+    note = tmpdir.join('note.md')
+    note.write('[ ] todo\n')
+    errors = [(0, '[ ] todo\n', 'todo-error')]
+
+    cache = CheckCache(_cache_dir(tmpdir), ['todo-error'])
+    assert cache.lookup(note.strpath) is None
+    cache.store(note.strpath, errors)
+    cache.save()
+
+    cache = CheckCache(_cache_dir(tmpdir), ['todo-error'])
+    cache.load()
+    assert cache.lookup(note.strpath) == [list(e) for e in errors]
+    assert cache.hits == 1
+
+
+def test_cache_changed_file_is_a_miss(tmpdir: Path):
+    note = tmpdir.join('note.md')
+    note.write('[ ] todo\n')
+
+    cache = CheckCache(_cache_dir(tmpdir), ['todo-error'])
+    cache.lookup(note.strpath)
+    cache.store(note.strpath, [(0, '[ ] todo\n', 'todo-error')])
+    cache.save()
+
+    note.write('- [ ] todo\n')
+    cache = CheckCache(_cache_dir(tmpdir), ['todo-error'])
+    cache.load()
+    assert cache.lookup(note.strpath) is None
+
+
+def test_cache_touched_file_is_a_hit(tmpdir: Path):
+    """Test that a file with a new mtime but the same content is a hit"""
+    note = tmpdir.join('note.md')
+    note.write('# Note\n')
+
+    cache = CheckCache(_cache_dir(tmpdir), ['todo-error'])
+    cache.lookup(note.strpath)
+    cache.store(note.strpath, [])
+    cache.save()
+
+    os.utime(note.strpath, ns=(10**9, 10**9))
+    cache = CheckCache(_cache_dir(tmpdir), ['todo-error'])
+    cache.load()
+    assert cache.lookup(note.strpath) == []
+
+
+def test_cache_is_invalidated_when_rules_change(tmpdir: Path):
+    note = tmpdir.join('note.md')
+    note.write('[ ] todo\n')
+
+    cache = CheckCache(_cache_dir(tmpdir), ['todo-error', 'math-error'])
+    cache.lookup(note.strpath)
+    cache.store(note.strpath, [(0, '[ ] todo\n', 'todo-error')])
+    cache.save()
+
+    cache = CheckCache(_cache_dir(tmpdir), ['math-error'])
+    cache.load()
+    assert cache.lookup(note.strpath) is None
+
+    with patch(
+        'notesystem.modes.check_mode.check_cache.rules_fingerprint',
+        return_value='changed',
+    ):
+        cache = CheckCache(_cache_dir(tmpdir), ['todo-error', 'math-error'])
+    cache.load()
+    assert cache.lookup(note.strpath) is None
+
+
+def test_cache_stores_encoding(tmpdir: Path):
+    note = tmpdir.join('note.md')
+    note.write_binary(b'# Caf\xe9\n')
+
+    cache = CheckCache(_cache_dir(tmpdir), ['todo-error'])
+    cache.lookup(note.strpath)
+    cache.store(note.strpath, [], 'windows-1252')
+    cache.save()
+
+    note.write_binary(b'# Caf\xe9 au lait\n')
+    cache = CheckCache(_cache_dir(tmpdir), ['todo-error'])
+    cache.load()
+    assert cache.lookup(note.strpath) is None
+    # Known for the changed file, so it can be decoded the same way
+    assert cache.encoding(note.strpath) == 'windows-1252'
+
+
+def test_corrupt_cache_is_ignored(tmpdir: Path):
+    note = tmpdir.join('note.md')
+    note.write('[ ] todo\n')
+    tmpdir.mkdir('cache').join(CACHE_FILE_NAME).write('{not json')
+
+    cache = CheckCache(_cache_dir(tmpdir), ['todo-error'])
+    cache.load()
+    assert cache.lookup(note.strpath) is None
+
+
+def test_check_dir_only_checks_changed_files(tmpdir: Path):
+    notes = tmpdir.mkdir('notes')
+    for i in range(3):
+        notes.join(f'note{i}.md').write(f'#Note {i}\n[ ] todo\n')
+
+    check_mode = CheckMode()
+    check_mode._cache = CheckCache(_cache_dir(tmpdir), ['todo-error'])
+    first = check_mode._check_dir(notes.strpath)
+    check_mode._cache.save()
+
+    notes.join('note1.md').write('# Note 1\n')
+    check_mode = CheckMode()
+    check_mode._cache = CheckCache(_cache_dir(tmpdir), ['todo-error'])
+    check_mode._cache.load()
+    with patch.object(
+        CheckMode, '_check_file', wraps=check_mode._check_file,
+    ) as check_file_mock:
+        second = check_mode._check_dir(notes.strpath)
+    check_file_mock.assert_called_once_with(notes.join('note1.md').strpath)
+
+    assert pack_doc_errors(second[0]) == pack_doc_errors(first[0])
+    assert second[1]['errors'] == []
+    assert pack_doc_errors(second[2]) == pack_doc_errors(first[2])
+
+
+def test_cached_encoding_is_used_for_fixes(tmpdir: Path):
+    notes = tmpdir.mkdir('notes')
+    note = notes.join('note.md')
+    note.write_binary(b'# Caf\xe9\n[ ] todo\n')
+
+    check_mode = CheckMode()
+    check_mode._cache = CheckCache(_cache_dir(tmpdir), ['todo-error'])
+    check_mode._check_dir(notes.strpath)
+    check_mode._cache.save()
+
+    check_mode = CheckMode()
+    check_mode._fix = True
+    check_mode._cache = CheckCache(_cache_dir(tmpdir), ['todo-error'])
+    check_mode._cache.load()
+    with patch(
+        'notesystem.modes.check_mode.check_mode.decode_bytes',
+        wraps=decode_bytes,
+    ) as decode_mock:
+        check_mode._check_dir(notes.strpath)
+    decode_mock.assert_called_once_with(
+        b'# Caf\xe9\n[ ] todo\n', 'windows-1252',
+    )
+    assert note.read_binary() == b'# Caf\xe9\n- [ ] todo\n'
+
+
+def test_cache_flag_writes_cache(tmpdir: Path):
+    notes = tmpdir.mkdir('notes')
+    notes.join('note.md').write('[ ] todo\n')
+    cache_dir = _cache_dir(tmpdir)
+
+    main([
+        '--no-visual', 'check', notes.strpath,
+        '--cache', f'--cache-dir={cache_dir}',
+    ])
+
+    assert os.path.isfile(os.path.join(cache_dir, CACHE_FILE_NAME))
@@ -1,4 +1,6 @@
+import json
 import os
+import time
 from typing import List
 from unittest.mock import Mock
 from unittest.mock import patch
@@ -6,9 +8,13 @@ from unittest.mock import patch
 import pytest
 from py.path import local as Path
 
+from notesystem.common.utils import FileWriter
 from notesystem.modes.base_mode import ModeOptions
 from notesystem.modes.check_mode.check_mode import CheckMode
 from notesystem.modes.check_mode.check_mode import CheckModeArgs
+from notesystem.modes.check_mode.check_mode import pack_doc_errors
+from notesystem.modes.check_mode.check_mode import unpack_doc_errors
+from notesystem.modes.check_mode.errors.ast_errors import ListIndentError
 from notesystem.modes.check_mode.errors.markdown_errors import MathError
 from notesystem.modes.check_mode.errors.markdown_errors import TodoError
 from notesystem.notesystem import main
@@ -32,6 +38,16 @@ def test_check_mode_called_with_only_in_path(mock_check_mode_start: Mock):
         'fix': False,
         'disabled_errors': [],
         'simple_errors': False,
+        'cache': False,
+        'cache_dir': '.notesystem-cache',
+        'jobs': None,
+        'output_format': 'text',
+        'watch': False,
+        'changed_since': None,
+        'staged': False,
+        'fail_fast': False,
+        'max_errors': None,
+        'profile_rules': None,
     }
     expected_options: ModeOptions = {
         'visual': True,
@@ -51,6 +67,16 @@ def test_check_mode_called_with_in_path_and_fix(mock_check_mode_start: Mock):
         'fix': True,
         'disabled_errors': [],
         'simple_errors': False,
+        'cache': False,
+        'cache_dir': '.notesystem-cache',
+        'jobs': None,
+        'output_format': 'text',
+        'watch': False,
+        'changed_since': None,
+        'staged': False,
+        'fail_fast': False,
+        'max_errors': None,
+        'profile_rules': None,
     }
     expected_options: ModeOptions = {
         'visual': True,
@@ -63,9 +89,9 @@ def test_check_mode_called_with_in_path_and_fix(mock_check_mode_start: Mock):
     mock_check_mode_start.assert_called_with(expected_options)
 
 
-@patch('notesystem.modes.check_mode.check_mode.CheckMode._check_dir')
+@patch('notesystem.modes.check_mode.check_mode.CheckMode._iter_check_dir')
 def test_check_mode_checks_dir_when_given_dir(mock: Mock):
-    """Test that when given a directory path, _check_dir is called"""
+    """Test that when given a directory path, _iter_check_dir is called"""
     main(['check', 'tests/test_documents'])
     mock.assert_called_once_with('tests/test_documents')
 
@@ -199,6 +225,16 @@ def test_check_mode_disable_errors_with_one_flag(mock_check_mode_start: Mock):
         'fix': False,
         'disabled_errors': [TodoError.get_error_name()],
         'simple_errors': False,
+        'cache': False,
+        'cache_dir': '.notesystem-cache',
+        'jobs': None,
+        'output_format': 'text',
+        'watch': False,
+        'changed_since': None,
+        'staged': False,
+        'fail_fast': False,
+        'max_errors': None,
+        'profile_rules': None,
     }
     expected_options: ModeOptions = {
         'visual': True,
@@ -224,6 +260,16 @@ def test_check_mode_disable_errors_with_multiple_flags(
             TodoError.get_error_name(),
         ],
         'simple_errors': False,
+        'cache': False,
+        'cache_dir': '.notesystem-cache',
+        'jobs': None,
+        'output_format': 'text',
+        'watch': False,
+        'changed_since': None,
+        'staged': False,
+        'fail_fast': False,
+        'max_errors': None,
+        'profile_rules': None,
     }
     expected_options: ModeOptions = {
         'visual': True,
@@ -312,3 +358,314 @@ def test_print_simple_doc_error_is_called(mock: Mock):
 
     main(['check', 'tests/test_documents', '--simple-errors'])
     assert mock.call_count == len(os.listdir('tests/test_documents'))
+
+
+@patch('notesystem.modes.check_mode.check_mode.CheckMode._run')
+def test_jobs_is_passed_through_correctly(mock: Mock):
+
+    # Default -- None (the amount of cpus is used)
+    main(('check', 'in_path'))
+    assert mock.call_args.args[0]['jobs'] is None
+
+    main(('check', 'in_path', '--jobs', '4'))
+    assert mock.call_args.args[0]['jobs'] == 4
+
+    main(('check', 'in_path', '-j', '2'))
+    assert mock.call_args.args[0]['jobs'] == 2
+
+
+def test_check_dir_parallel_equals_serial(tmpdir: Path):
+    """Test that checking with multiple processes gives the same
+       results, in the same order, as checking with one process
+    """
+    n_files = CheckMode.PARALLEL_CHUNK_SIZE * 3 + 1
+    for i in range(n_files):
+        tmpdir.join(f'note{i:03}.md').write(
+            f'#Note {i}\n[ ] todo\nSome $$math$$\n',
+        )
+
+    serial = CheckMode()
+    serial_errors = serial._check_dir(tmpdir.strpath)
+
+    parallel = CheckMode()
+    parallel._jobs = 2
+    parallel_errors = parallel._check_dir(tmpdir.strpath)
+
+    assert len(parallel_errors) == n_files
+    assert [
+        pack_doc_errors(e) for e in parallel_errors
+    ] == [pack_doc_errors(e) for e in serial_errors]
+    # The files are returned in a fixed (sorted) order
+    file_paths = [e['file_path'] for e in parallel_errors]
+    assert file_paths == sorted(file_paths)
+
+
+def test_pack_and_unpack_doc_errors():
+    check_mode = CheckMode()
+    doc_errors = check_mode._check_file(
+        'tests/test_documents/contains_errors.md',
+    )
+    unpacked = unpack_doc_errors(pack_doc_errors(doc_errors))
+    assert unpacked['file_path'] == doc_errors['file_path']
+    assert len(unpacked['errors']) == len(doc_errors['errors'])
+    for a, b in zip(unpacked['errors'], doc_errors['errors']):
+        assert a['line_nr'] == b['line_nr']
+        assert a['line'] == b['line']
+        assert type(a['error_type']) is type(b['error_type'])
+
+
+@pytest.mark.parametrize(
+    'wrong,good', [
+        # Two fixable errors on the same line
+        ('text\n#Heading\n', 'text\n\n# Heading\n'),
+        ('[ ] todo with $$math$$\n', '- [ ] todo with $math$\n'),
+        ('---\n#Heading\n', '---\n\n\n# Heading\n'),
+    ],
+)
+def test_check_mode_fix_multiple_errors_on_one_line(tmpdir, wrong, good):
+    file = tmpdir.join('test.md')
+    file.write(wrong)
+    check_mode = CheckMode()
+    errors = check_mode._check_file(file.strpath)
+    check_mode._fix_doc_errors(errors)
+    assert file.read() == good
+
+
+def test_fix_symlinked_note(tmpdir):
+    target = tmpdir.mkdir('notes').join('note.md')
+    target.write('[ ] todo\n')
+    link = tmpdir.join('link.md')
+    link.mksymlinkto(target)
+
+    main(['--no-visual', 'check', link.strpath, '--fix'])
+
+    assert link.islink()
+    assert target.read() == '- [ ] todo\n'
+
+
+def test_fix_doc_errors_uses_given_lines(tmpdir):
+    """Test that the file is not read again when the lines are given"""
+    file = tmpdir.join('test.md')
+    file.write('[ ] todo\n')
+    check_mode = CheckMode()
+    lines = ['[ ] todo\n']
+    errors = check_mode._check_lines(file.strpath, lines)
+    with patch.object(CheckMode, '_read_file') as read_file_mock:
+        check_mode._fix_doc_errors(errors, lines)
+    read_file_mock.assert_not_called()
+    assert file.read() == '- [ ] todo\n'
+
+
+@pytest.mark.parametrize(
+    ('n_lines', 'batch'), [
+        (CheckMode.BATCH_MIN_LINES - 1, False),
+        (CheckMode.BATCH_MIN_LINES, True),
+    ],
+)
+def test_only_long_documents_are_checked_at_once(tmpdir, n_lines, batch):
+    file = tmpdir.join('test.md')
+    lines = ['[ ] todo\n'] * n_lines
+    check_mode = CheckMode()
+    engine = check_mode._get_rule_engine()
+    with patch.object(
+        engine, 'check_document', wraps=engine.check_document,
+    ) as check_document_mock:
+        errors = check_mode._check_lines(file.strpath, lines)
+    assert check_document_mock.called == batch
+    assert len(errors['errors']) == n_lines
+
+
+def test_check_files_does_not_change_the_mode(tmpdir):
+    note = tmpdir.join('note.md')
+    note.write('[ ] todo\n#Heading\n')
+    check_mode = CheckMode()
+    check_mode.configure(['todo-error'])
+    writer = FileWriter()
+    fixed = list(check_mode.check_files([note.strpath], True, writer))
+    assert writer.close() == []
+    assert note.read() == '[ ] todo\n\n# Heading\n'
+    assert [e['error_type'].get_error_name() for e in fixed[0]['errors']] == [
+        'required-space-after-header-symbol',
+        'newline-before-header-error',
+    ]
+    assert check_mode._fix is False
+    assert check_mode._writer is None
+
+    note.write('#Heading\n')
+    list(check_mode.check_files([note.strpath]))
+    assert note.read() == '#Heading\n'
+
+
+def test_fix_doc_errors_large_file(tmpdir):
+    """Test that fixing a large file with a lot of errors is fast"""
+    n_lines = 100_000
+    file = tmpdir.join('test.md')
+    file.write('[ ] todo $$x$$\n' * n_lines)
+    check_mode = CheckMode()
+    # Parsing the ast of a large document is slow and not tested here
+    check_mode._disabled_errors = [ListIndentError.get_error_name()]
+    lines = file.readlines()
+    errors = check_mode._check_lines(file.strpath, lines)
+    assert len(errors['errors']) == n_lines * 2
+
+    start = time.perf_counter()
+    check_mode._fix_doc_errors(errors, lines)
+    assert time.perf_counter() - start < 5
+
+    assert file.read() == '- [ ] todo $x$\n' * n_lines
+
+
+def test_check_large_file_equals_check_file(tmpdir):
+    """Test that checking a file while reading it gives the same errors"""
+    file = tmpdir.join('test.md')
+    file.write(
+        '---\ntitle: x\n---\n#Title\n[ ] todo\n```\n#code\n```\n'
+        'Some $$math$$\n\n- list\n\n\t- list\n' * 50,
+    )
+    check_mode = CheckMode()
+    expected = check_mode._check_file(file.strpath)
+    with patch.object(CheckMode, 'STREAM_THRESHOLD', 0):
+        with patch.object(CheckMode, '_read_file') as read_file_mock:
+            doc_errors = check_mode._check_file(file.strpath)
+    read_file_mock.assert_not_called()
+    assert pack_doc_errors(doc_errors) == pack_doc_errors(expected)
+    assert isinstance(doc_errors['errors'][-1]['error_type'], ListIndentError)
+
+
+def test_fix_large_file(tmpdir):
+    file = tmpdir.join('test.md')
+    file.write('text\n#Heading\n[ ] todo with $$math$$\n\t- list\n')
+    check_mode = CheckMode()
+    check_mode._fix = True
+    with patch.object(CheckMode, 'STREAM_THRESHOLD', 0):
+        check_mode._check_file(file.strpath)
+    # The ListIndentError is not fixable
+    assert file.read() == (
+        'text\n\n# Heading\n- [ ] todo with $math$\n\t- list\n'
+    )
+
+
+def test_fix_large_file_keeps_encoding(tmpdir):
+    file = tmpdir.join('test.md')
+    file.write_binary(b'# Caf\xe9\n[ ] todo\n')
+    check_mode = CheckMode()
+    check_mode._fix = True
+    with patch.object(CheckMode, 'STREAM_THRESHOLD', 0):
+        check_mode._check_file(file.strpath)
+    assert file.read_binary() == b'# Caf\xe9\n- [ ] todo\n'
+
+
+def test_check_dir_checks_identical_files_once(tmpdir):
+    for i in range(3):
+        tmpdir.join(f'note{i}.md').write('[ ] todo\n')
+    tmpdir.join('note3.md').write('# Other\n')
+    check_mode = CheckMode()
+    check_mode._fix = True
+    with patch.object(
+        CheckMode, '_check_file', wraps=check_mode._check_file,
+    ) as check_file_mock:
+        doc_errors = check_mode._check_dir(tmpdir.strpath)
+    assert check_file_mock.call_count == 2
+
+    assert [e['file_path'] for e in doc_errors] == [
+        tmpdir.join(f'note{i}.md').strpath for i in range(4)
+    ]
+    assert [len(e['errors']) for e in doc_errors] == [1, 1, 1, 0]
+    # The copies are fixed as well
+    for i in range(3):
+        assert tmpdir.join(f'note{i}.md').read() == '- [ ] todo\n'
+
+
+def test_check_mode_fixes_dir_while_checking(tmpdir):
+    for i in range(3):
+        tmpdir.join(f'note{i}.md').write('[ ] todo\n')
+    main(['--no-visual', 'check', tmpdir.strpath, '--fix', '--jobs=1'])
+    for i in range(3):
+        assert tmpdir.join(f'note{i}.md').read() == '- [ ] todo\n'
+
+
+def test_fix_does_not_write_unchanged_files(tmpdir):
+    file = tmpdir.join('test.md')
+    file.write('# Nothing to fix\n')
+    check_mode = CheckMode()
+    errors = check_mode._check_file(file.strpath)
+    with patch(
+        'notesystem.modes.check_mode.check_mode.atomic_write',
+    ) as write_mock:
+        check_mode._fix_doc_errors(errors)
+    write_mock.assert_not_called()
+
+
+def test_fix_write_errors_exit_with_error(tmpdir):
+    file = tmpdir.join('test.md')
+    file.write('[ ] todo\n')
+    with patch(
+        'notesystem.common.utils.os.replace',
+        side_effect=OSError('disk full'),
+    ):
+        with pytest.raises(SystemExit):
+            main(['--no-visual', 'check', file.strpath, '--fix'])
+    assert file.read() == '[ ] todo\n'
+
+
+@pytest.mark.parametrize(
+    'flags,n_checked', [
+        (['--fail-fast'], 1),
+        (['--max-errors', '3'], 3),
+    ],
+)
+def test_check_stops_after_max_errors(tmpdir, capsys, flags, n_checked):
+    for i in range(5):
+        tmpdir.join(f'note{i}.md').write('[ ] todo\n')
+    with pytest.raises(SystemExit) as exit_info:
+        main([
+            '--no-visual', 'check', tmpdir.strpath, '--format', 'jsonl',
+            '--jobs', '1', *flags,
+        ])
+    assert exit_info.value.code == 1
+    assert len(capsys.readouterr().out.splitlines()) == n_checked
+
+
+def test_check_does_not_stop_below_max_errors(tmpdir, capsys):
+    for i in range(5):
+        tmpdir.join(f'note{i}.md').write('[ ] todo\n')
+    main([
+        '--no-visual', 'check', tmpdir.strpath, '--format', 'jsonl',
+        '--max-errors', '6',
+    ])
+    assert len(capsys.readouterr().out.splitlines()) == 5
+
+
+def test_stop_message_is_not_in_the_report(tmpdir, capsys):
+    for i in range(3):
+        tmpdir.join(f'note{i}.md').write('[ ] todo\n')
+    with pytest.raises(SystemExit):
+        main(['check', tmpdir.strpath, '--format', 'sarif', '--fail-fast'])
+    out, err = capsys.readouterr()
+    json.loads(out)
+    assert 'Stopped checking after finding 1 errors' in err
+
+
+def test_max_errors_must_be_positive(tmpdir, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(['check', tmpdir.strpath, '--max-errors', '0'])
+    assert exit_info.value.code == 2
+    assert 'must be at least 1' in capsys.readouterr().err
+
+    config_file = tmpdir.join('config.toml')
+    config_file.write('[check]\nmax_errors = 0\n')
+    with pytest.raises(SystemExit, match='must be at least 1'):
+        main(['--config-file', config_file.strpath, 'check', tmpdir.strpath])
+
+
+def test_fail_fast_cancels_parallel_checks(tmpdir):
+    n_files = CheckMode.PARALLEL_CHUNK_SIZE * 20
+    for i in range(n_files):
+        tmpdir.join(f'note{i:03}.md').write(f'Note {i}\n[ ] todo\n')
+    with patch.object(
+        CheckMode, '_show_doc_errors',
+    ) as show_mock, pytest.raises(SystemExit):
+        main([
+            '--no-visual', 'check', tmpdir.strpath, '-j', '2', '--fail-fast',
+        ])
+    show_mock.assert_called_once()
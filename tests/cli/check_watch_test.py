@@ -0,0 +1,150 @@
+import os
+import time
+from unittest.mock import Mock
+from unittest.mock import patch
+
+from py.path import local as Path
+from watchdog.events import FileCreatedEvent
+from watchdog.events import FileModifiedEvent
+from watchdog.events import FileMovedEvent
+
+from notesystem.modes.check_mode.check_mode import CheckMode
+from notesystem.modes.check_mode.check_mode import unpack_doc_errors
+from notesystem.modes.check_mode.check_watch import ChangedFiles
+from notesystem.modes.check_mode.check_watch import diff_errors
+from notesystem.modes.check_mode.check_watch import WatchHandler
+from notesystem.notesystem import main
+
+
+def _errors(*errors):
+    return unpack_doc_errors(('note.md', list(errors)))['errors']
+
+
+def test_changed_files_are_debounced():
+    changed = ChangedFiles(debounce=0.3)
+    changed.add('note.md', now=0)
+    changed.add('note.md', now=0.2)
+    changed.add('other.md', now=0.1)
+    assert changed.pop_settled(now=0.45) == [os.path.abspath('other.md')]
+    assert changed.pop_settled(now=0.45) == []
+    assert changed.pop_settled(now=0.5) == [os.path.abspath('note.md')]
+    assert changed.pop_settled(now=10) == []
+
+
+def test_watch_handler_only_adds_accepted_markdown_files():
+    changed = ChangedFiles(debounce=0)
+    handler = WatchHandler(changed, lambda path: 'skip' not in path)
+    handler.dispatch(FileModifiedEvent('/notes/a.md'))
+    handler.dispatch(FileModifiedEvent('/notes/a.txt'))
+    handler.dispatch(FileCreatedEvent('/notes/skip.md'))
+    handler.dispatch(FileMovedEvent('/notes/b.md', '/notes/c.md'))
+    assert changed.pop_settled() == [
+        '/notes/a.md', '/notes/b.md', '/notes/c.md',
+    ]
+
+
+def test_diff_errors():
+    old = _errors(
+        (0, '#Title\n', 'required-space-after-header-symbol'),
+        (2, '[ ] todo\n', 'todo-error'),
+    )
+    # A line is added above the todo, and the header is fixed
+    new = _errors(
+        (3, '[ ] todo\n', 'todo-error'),
+        (4, '[ ] other\n', 'todo-error'),
+    )
+    added, resolved = diff_errors(old, new)
+    assert [e['line'] for e in added] == ['[ ] other\n']
+    assert [e['line'] for e in resolved] == ['#Title\n']
+    assert diff_errors(new, new) == ([], [])
+
+
+def test_recheck_file_updates_error_table(tmpdir: Path):
+    note = tmpdir.join('note.md')
+    note.write('#Title\n')
+    check_mode = CheckMode()
+    check_mode._visual = False
+
+    added, resolved = check_mode._recheck_file(note.strpath)
+    assert len(added) == 1 and resolved == []
+    assert len(check_mode._error_table[note.strpath]) == 1
+
+    note.write('# Title\n[ ] todo\n')
+    added, resolved = check_mode._recheck_file(note.strpath)
+    assert added[0]['error_type'].get_error_name() == 'todo-error'
+    assert resolved[0]['line'] == '#Title\n'
+
+    note.remove()
+    added, resolved = check_mode._recheck_file(note.strpath)
+    assert added == []
+    assert resolved[0]['error_type'].get_error_name() == 'todo-error'
+    assert note.strpath not in check_mode._error_table
+
+
+def test_print_only_diffs(tmpdir: Path, capsys):
+    note = tmpdir.join('note.md')
+    note.write('#Title\n[ ] todo\n')
+    check_mode = CheckMode()
+    check_mode._visual = True
+    check_mode._recheck_file(note.strpath)
+    capsys.readouterr()
+
+    note.write('# Title\n[ ] todo\n')
+    check_mode._recheck_file(note.strpath)
+    out = capsys.readouterr().out
+    assert out == (
+        f'- {note.strpath}:0 - required-space-after-header-symbol - '
+        'Resolved\n'
+    )
+
+
+def test_watch_flag_fills_error_table_and_starts_watching(tmpdir: Path):
+    tmpdir.join('a.md').write('#Title\n')
+    tmpdir.join('b.md').write('# Title\n')
+
+    with patch.object(
+        CheckMode, '_start_watch_mode', autospec=True,
+    ) as start_watch_mode:
+        main(['--no-visual', 'check', tmpdir.strpath, '--watch'])
+
+    check_mode, in_path, reporter = start_watch_mode.call_args.args
+    assert in_path == tmpdir.strpath
+    assert reporter is None
+    assert check_mode._error_table.keys() == {
+        tmpdir.join('a.md').strpath, tmpdir.join('b.md').strpath,
+    }
+    assert check_mode._error_table[tmpdir.join('b.md').strpath] == []
+
+
+@patch('notesystem.modes.check_mode.check_mode.Observer')
+def test_watch_mode_rechecks_changed_file_once(observer: Mock, tmpdir: Path):
+    note = tmpdir.join('note.md')
+    note.write('# Title\n')
+    check_mode = CheckMode()
+    check_mode._visual = False
+    real_sleep = time.sleep
+
+    def sleep(_):
+        handler = observer.return_value.schedule.call_args.args[0]
+        if sleep.calls == 0:
+            # A burst of saves
+            note.write('#Title\n')
+            for _ in range(5):
+                handler.dispatch(FileModifiedEvent(note.strpath))
+        elif sleep.calls == 1:
+            real_sleep(0.35)
+        else:
+            raise KeyboardInterrupt
+        sleep.calls += 1
+    sleep.calls = 0
+
+    with patch(
+        'notesystem.modes.check_mode.check_mode.time.sleep', sleep,
+    ), patch.object(
+        CheckMode, '_recheck_file', wraps=check_mode._recheck_file,
+    ) as recheck:
+        check_mode._start_watch_mode(tmpdir.strpath)
+
+    recheck.assert_called_once_with(note.strpath, None)
+    observer.return_value.stop.assert_called_once()
+    assert len(check_mode._error_table[note.strpath]) == 1
@@ -0,0 +1,198 @@
+from unittest.mock import patch
+
+from py.path import local as Path
+
+from notesystem.modes.convert_manifest import ConvertManifest
+from notesystem.modes.convert_manifest import find_dependencies
+from notesystem.modes.convert_manifest import find_template
+from notesystem.modes.convert_manifest import MANIFEST_FILE_NAME
+from notesystem.notesystem import main
+
+PANDOC_INFO = {'version': 'pandoc 3.0', 'data_dir': None}
+
+
+def _convert(in_dir: Path, out_dir: Path, *args: str):
+    """Runs convert mode, the (fake) conversion writes the note to the
+       output file
+
+    Returns:
+        The mock of ConvertMode._convert_file
+    """
+    def convert_file(in_file, out_file):
+        with open(in_file) as f, open(out_file, 'w') as out:
+            out.write(f.read())
+        return True
+
+    with patch(
+        'notesystem.modes.convert_mode.ConvertMode._convert_file',
+        side_effect=convert_file,
+    ) as convert_file_mock, patch(
+        'notesystem.modes.convert_mode.pandoc_info',
+        return_value=PANDOC_INFO,
+    ):
+        main([
+            '--no-visual', 'convert', in_dir.strpath, out_dir.strpath, *args,
+        ])
+    return convert_file_mock
+
+
+def test_manifest_out_of_date_then_up_to_date(tmpdir: Path):
+    note = tmpdir.join('note.md')
+    note.write('# Note\n')
+    out_file = tmpdir.join('note.html')
+    out_file.write('<h1>Note</h1>')
+
+    manifest = ConvertManifest(tmpdir.strpath, 'pandoc 3.0', [])
+    assert not manifest.is_up_to_date(note.strpath, out_file.strpath, 'cmd')
+    manifest.record(note.strpath, out_file.strpath, 'cmd')
+    manifest.save()
+    assert tmpdir.join(MANIFEST_FILE_NAME).check(file=True)
+
+    manifest = ConvertManifest(tmpdir.strpath, 'pandoc 3.0', [])
+    manifest.load()
+    assert manifest.is_up_to_date(note.strpath, out_file.strpath, 'cmd')
+    # Other pandoc arguments
+    assert not manifest.is_up_to_date(note.strpath, out_file.strpath, 'x')
+    # The output was removed
+    out_file.remove()
+    assert not manifest.is_up_to_date(note.strpath, out_file.strpath, 'cmd')
+
+
+def test_manifest_is_invalidated_when_pandoc_changes(tmpdir: Path):
+    note = tmpdir.join('note.md')
+    note.write('# Note\n')
+    out_file = tmpdir.join('note.html')
+    out_file.write('<h1>Note</h1>')
+
+    manifest = ConvertManifest(tmpdir.strpath, 'pandoc 3.0', [])
+    manifest.is_up_to_date(note.strpath, out_file.strpath, 'cmd')
+    manifest.record(note.strpath, out_file.strpath, 'cmd')
+    manifest.save()
+
+    manifest = ConvertManifest(tmpdir.strpath, 'pandoc 3.1', [])
+    manifest.load()
+    assert not manifest.is_up_to_date(note.strpath, out_file.strpath, 'cmd')
+
+
+def test_outputs_are_out_of_date_when_a_dependency_changes(tmpdir: Path):
+    note = tmpdir.join('note.md')
+    note.write('# Note\n')
+    out_file = tmpdir.join('note.html')
+    out_file.write('<h1>Note</h1>')
+    template = tmpdir.join('template.html')
+    template.write('$body$')
+    dependencies = [template.strpath]
+
+    manifest = ConvertManifest(tmpdir.strpath, 'pandoc 3.0', dependencies)
+    manifest.is_up_to_date(note.strpath, out_file.strpath, 'cmd')
+    manifest.record(note.strpath, out_file.strpath, 'cmd')
+    manifest.save()
+
+    manifest = ConvertManifest(tmpdir.strpath, 'pandoc 3.0', dependencies)
+    manifest.load()
+    assert manifest.is_up_to_date(note.strpath, out_file.strpath, 'cmd')
+
+    template.write('<main>$body$</main>')
+    manifest = ConvertManifest(tmpdir.strpath, 'pandoc 3.0', dependencies)
+    manifest.load()
+    assert not manifest.is_up_to_date(note.strpath, out_file.strpath, 'cmd')
+
+
+def test_find_dependencies(tmpdir: Path):
+    templates = tmpdir.mkdir('templates')
+    template = templates.join('main.html')
+    template.write(
+        '<link rel="stylesheet" href="style.css">\n'
+        '<link rel="stylesheet" href="https://example.com/x.css">\n'
+        '$header()$\n$for(items)$${ it:item() }$endfor$\n$body$\n',
+    )
+    header = templates.join('header.html')
+    header.write('$styles.html()$ $missing()$')
+    item = templates.join('item.html')
+    item.write('$it$')
+    styles = templates.join('styles.html')
+    styles.write('')
+    tmpdir.join('style.css').write('')
+    tmpdir.join('in-header.html').write('')
+    tmpdir.join('filter.lua').write('')
+
+    with tmpdir.as_cwd():
+        assert find_dependencies(
+            template.strpath,
+            '--standalone -H in-header.html --lua-filter=filter.lua '
+            '--css missing.css',
+        ) == [
+            template.strpath,
+            header.strpath,
+            styles.strpath,
+            item.strpath,
+            'style.css',
+            'in-header.html',
+            'filter.lua',
+        ]
+    assert find_dependencies(None, None) == []
+
+
+def test_find_template(tmpdir: Path):
+    data_dir = tmpdir.mkdir('data')
+    template = data_dir.mkdir('templates').join('GitHub.html')
+    template.write('$body$')
+
+    assert find_template('GitHub', 'html', data_dir.strpath) == (
+        template.strpath
+    )
+    assert find_template('GitHub.html', 'html', None) is None
+    assert find_template('missing.html', 'html', data_dir.strpath) is None
+
+
+def test_convert_dir_only_converts_changed_notes(tmpdir: Path):
+    notes = tmpdir.mkdir('notes')
+    notes.join('a.md').write('# A\n')
+    notes.mkdir('sub').join('b.md').write('# B\n')
+    out_dir = tmpdir.join('out')
+
+    assert _convert(notes, out_dir).call_count == 2
+    assert out_dir.join(MANIFEST_FILE_NAME).check(file=True)
+    # Nothing changed
+    assert _convert(notes, out_dir).call_count == 0
+
+    notes.join('a.md').write('# A changed\n')
+    out_dir.join('sub', 'b.html').remove()
+    convert_file_mock = _convert(notes, out_dir)
+    assert sorted(
+        call.args[0] for call in convert_file_mock.call_args_list
+    ) == [notes.join('a.md').strpath, notes.join('sub', 'b.md').strpath]
+    assert out_dir.join('a.html').read() == '# A changed\n'
+
+    assert _convert(notes, out_dir, '--force').call_count == 2
+
+
+def test_failed_conversions_are_converted_again(tmpdir: Path):
+    notes = tmpdir.mkdir('notes')
+    notes.join('a.md').write('# A\n')
+    out_dir = tmpdir.join('out')
+
+    with patch(
+        'notesystem.modes.convert_mode.ConvertMode._convert_file',
+        return_value=False,
+    ), patch(
+        'notesystem.modes.convert_mode.pandoc_info',
+        return_value=PANDOC_INFO,
+    ):
+        main(['--no-visual', 'convert', notes.strpath, out_dir.strpath])
+    assert _convert(notes, out_dir).call_count == 1
+
+
+def test_convert_dir_converts_again_when_the_template_changes(tmpdir: Path):
+    notes = tmpdir.mkdir('notes')
+    notes.join('a.md').write('# A\n')
+    notes.join('b.md').write('# B\n')
+    template = tmpdir.join('template.html')
+    template.write('$body$')
+    out_dir = tmpdir.join('out')
+    template_arg = f'--pandoc-template={template.strpath}'
+
+    assert _convert(notes, out_dir, template_arg).call_count == 2
+    assert _convert(notes, out_dir, template_arg).call_count == 0
+    template.write('<main>$body$</main>')
+    assert _convert(notes, out_dir, template_arg).call_count == 2
@@ -1,12 +1,17 @@
 import subprocess
+import time
 from unittest.mock import MagicMock
 from unittest.mock import Mock
 from unittest.mock import patch
 
 import pytest
 from py.path import local as Path
+from watchdog.events import FileModifiedEvent
+from watchdog.events import FileMovedEvent
 
+from notesystem.common.utils import find_all_md_files
 from notesystem.modes.base_mode import ModeOptions
+from notesystem.modes.convert_mode import ConvertMode
 from notesystem.modes.convert_mode import ConvertModeArguments
 from notesystem.notesystem import main
 
@@ -33,6 +38,10 @@ def test_convert_mode_called_correct_args(mock_convert_mode: Mock):
             'output_format': 'html',
             'ignore_warnings': False,
         },
+        'jobs': None,
+        'force': False,
+        'pandoc_server': False,
+        'engine': 'pandoc',
     }
     expected_options: ModeOptions = {
         'visual': True,
@@ -77,6 +86,10 @@ def test_convert_mode_gets_correct_args_with_w_flag(mock_start: Mock):
             'output_format': 'html',
             'ignore_warnings': False,
         },
+        'jobs': None,
+        'force': False,
+        'pandoc_server': False,
+        'engine': 'pandoc',
     }
     expected_options: ModeOptions = {
         'visual': True,
@@ -312,6 +325,10 @@ def test_watcher_is_called_when_watch_mode(start_watch_mode_mock: Mock, _):
             'output_format': 'html',
             'ignore_warnings': False,
         },
+        'jobs': None,
+        'force': False,
+        'pandoc_server': False,
+        'engine': 'pandoc',
     }
     start_watch_mode_mock.assert_called_once_with(expected_args)
 
@@ -416,3 +433,117 @@ def test_pandoc_errors_are_printed_with_ignore_warnings_flag(
 # Check that custom watcher is used
 # Check that convert_file writes to out path (can't be done without pandoc)
 # Check that subdirectory structure is mirrored correctly
+
+
+def test_convert_dir_converts_identical_notes_once(tmpdir: Path):
+    """Test that notes with the same content and name are converted once
+       and the output is copied
+    """
+    notes = tmpdir.mkdir('notes')
+    for sub_dir in ('a', 'b'):
+        notes.mkdir(sub_dir).join('note.md').write('# Same\n')
+    notes.join('c').mkdir()
+    # Same content, but a different name (title)
+    notes.join('c').join('other.md').write('# Same\n')
+    out_dir = tmpdir.join('out')
+
+    def convert_file(in_file, out_file):
+        with open(out_file, 'w') as f:
+            f.write(f'converted {in_file}')
+        return True
+
+    with patch(
+        'notesystem.modes.convert_mode.ConvertMode._convert_file',
+        side_effect=convert_file,
+    ) as convert_file_mock:
+        main(['--no-visual', 'convert', notes.strpath, out_dir.strpath])
+
+    assert convert_file_mock.call_count == 2
+    assert out_dir.join('a', 'note.html').read() == (
+        out_dir.join('b', 'note.html').read()
+    )
+    assert out_dir.join('c', 'other.html').check(file=True)
+
+
+def test_convert_dir_does_not_copy_failed_conversions(tmpdir: Path):
+    """Test that a duplicate is converted itself when the conversion of
+       the original failed, instead of copying an old output
+    """
+    notes = tmpdir.mkdir('notes')
+    for sub_dir in ('a', 'b'):
+        notes.mkdir(sub_dir).join('note.md').write('# Same\n')
+    out_dir = tmpdir.join('out')
+    # An old output of both notes
+    for sub_dir in ('a', 'b'):
+        out_dir.ensure(sub_dir, 'note.html').write('old')
+
+    with patch(
+        'notesystem.modes.convert_mode.ConvertMode._convert_file',
+        return_value=False,
+    ) as convert_file_mock:
+        main(['--no-visual', 'convert', notes.strpath, out_dir.strpath])
+
+    assert convert_file_mock.call_count == 2
+    # Nothing is recorded as up to date, so both are converted again
+    with patch(
+        'notesystem.modes.convert_mode.ConvertMode._convert_file',
+        return_value=False,
+    ) as convert_file_mock:
+        main(['--no-visual', 'convert', notes.strpath, out_dir.strpath])
+    assert convert_file_mock.call_count == 2
+
+
+def test_convert_dir_with_jobs_reports_in_file_order(tmpdir: Path, capsys):
+    """Test that with --jobs the files are converted by multiple pandoc
+       processes, but the warnings are still shown in the order of the files
+    """
+    notes = tmpdir.mkdir('notes')
+    for i in range(12):
+        notes.join(f'note{i:02}.md').write(f'# Note {i}\n')
+    out_dir = tmpdir.join('out')
+
+    def run(pd_command, **kwargs):
+        in_file = pd_command.split()[1]
+        # The first files take the longest
+        time.sleep(0.01 * (12 - int(in_file[-5:-3])))
+        return subprocess.CompletedProcess(
+            pd_command, 0, b'', f'[WARNING] {in_file}'.encode(),
+        )
+
+    with patch('subprocess.run', side_effect=run) as run_mock, patch(
+        'notesystem.modes.convert_mode.pandoc_info',
+        return_value={'version': 'pandoc 3.0', 'data_dir': None},
+    ):
+        main(['convert', notes.strpath, out_dir.strpath, '--jobs', '4'])
+
+    assert run_mock.call_count == 12
+    out = capsys.readouterr().out
+    positions = [
+        out.index(f'[WARNING] {file_path}')
+        for file_path in find_all_md_files(notes.strpath)
+    ]
+    assert positions == sorted(positions)
+
+
+def test_dependency_handler_converts_again(tmpdir: Path):
+    """Test that the notes are converted again in watch mode when the
+       template changes
+    """
+    notes = tmpdir.mkdir('notes')
+    template = tmpdir.join('template.html')
+    template.write('$body$')
+    convert_mode = ConvertMode()
+    convert_mode._visual = False
+    handler = convert_mode._create_dependency_handler(
+        notes.strpath, 'out', [template.strpath],
+    )
+
+    with patch.object(convert_mode, '_convert_dir') as convert_dir_mock:
+        handler.on_any_event(FileModifiedEvent(tmpdir.join('other').strpath))
+        convert_dir_mock.assert_not_called()
+        handler.on_any_event(FileModifiedEvent(template.strpath))
+        convert_dir_mock.assert_called_once_with(notes.strpath, 'out')
+        handler.on_any_event(
+            FileMovedEvent(tmpdir.join('tmp').strpath, template.strpath),
+        )
+        assert convert_dir_mock.call_count == 2
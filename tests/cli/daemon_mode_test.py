@@ -0,0 +1,135 @@
+import json
+import threading
+from unittest.mock import patch
+
+from notesystem.daemon_client import main as client_main
+from notesystem.modes.daemon_mode import DaemonMode
+from notesystem.notesystem import main
+
+
+def _daemon(disabled_errors=None) -> DaemonMode:
+    daemon = DaemonMode()
+    daemon._visual = False
+    daemon.set_disabled_errors(disabled_errors or [])
+    return daemon
+
+
+def test_check_request_returns_the_errors(tmpdir):
+    tmpdir.join('note.md').write('[ ] todo\n')
+    tmpdir.join('ok.md').write('- [ ] todo\n')
+    daemon = _daemon()
+    response = daemon.handle_request({
+        'command': 'check',
+        'paths': [tmpdir.strpath],
+        'output_format': 'jsonl',
+    })
+    assert response['exit_code'] == 0
+    lines = [json.loads(line) for line in response['output'].splitlines()]
+    assert [
+        (line['file_path'], [e['error'] for e in line['errors']])
+        for line in lines
+    ] == [
+        (tmpdir.join('note.md').strpath, ['todo-error']),
+        (tmpdir.join('ok.md').strpath, []),
+    ]
+
+
+def test_unchanged_files_are_not_checked_again(tmpdir):
+    note = tmpdir.join('note.md')
+    note.write('[ ] todo\n')
+    daemon = _daemon()
+    request = {'command': 'check', 'paths': [note.strpath]}
+    first = daemon.handle_request(request)
+    with patch.object(
+        daemon._check_mode, '_check_file',
+        wraps=daemon._check_mode._check_file,
+    ) as check_file:
+        assert daemon.handle_request(request) == first
+        check_file.assert_not_called()
+        note.write('[x] todo\n#Heading\n')
+        second = daemon.handle_request(request)
+        check_file.assert_called_once()
+    assert second != first
+    assert 'required-space-after-header-symbol' in daemon.handle_request({
+        **request, 'simple_errors': True,
+    })['output']
+
+
+def test_fix_request_fixes_the_files(tmpdir):
+    note = tmpdir.join('note.md')
+    note.write('[ ] todo\n')
+    daemon = _daemon()
+    daemon.handle_request({'command': 'check', 'paths': [note.strpath]})
+    # Also fixes the files that were checked before
+    response = daemon.handle_request({
+        'command': 'fix', 'paths': [note.strpath],
+    })
+    assert response['exit_code'] == 0
+    assert note.read() == '- [ ] todo\n'
+    # Checking does not fix
+    note.write('[ ] todo\n')
+    daemon.handle_request({'command': 'check', 'paths': [note.strpath]})
+    assert note.read() == '[ ] todo\n'
+
+
+def test_disabled_errors_are_not_checked(tmpdir):
+    note = tmpdir.join('note.md')
+    note.write('[ ] todo\n')
+    daemon = _daemon(['todo-error'])
+    response = daemon.handle_request({
+        'command': 'check', 'paths': [note.strpath], 'simple_errors': True,
+    })
+    assert response['output'] == ''
+
+
+def test_invalid_requests_get_an_error(tmpdir):
+    daemon = _daemon()
+    assert 'error' in daemon.handle_request({'command': 'nope'})
+    assert 'error' in daemon.handle_request({
+        'command': 'check', 'paths': [tmpdir.join('missing.md').strpath],
+    })
+    assert 'error' in daemon.handle_request({
+        'command': 'check', 'paths': [tmpdir.strpath], 'output_format': 'x',
+    })
+
+
+def test_client_talks_to_the_daemon(tmpdir, capsys):
+    note = tmpdir.join('note.md')
+    note.write('[ ] todo\n')
+    socket_path = tmpdir.join('d.sock').strpath
+    daemon = _daemon()
+    server = daemon._bind(socket_path)
+    thread = threading.Thread(target=daemon.serve, args=(server,))
+    thread.start()
+    try:
+        assert client_main(['--socket', socket_path, 'ping']) == 0
+        assert client_main([
+            '--socket', socket_path, 'check', note.strpath,
+            '--simple-errors',
+        ]) == 0
+        assert client_main([
+            '--socket', socket_path, 'fix', note.strpath,
+        ]) == 0
+    finally:
+        client_main(['--socket', socket_path, 'stop'])
+        thread.join(5)
+        server.close()
+    assert not thread.is_alive()
+    out = capsys.readouterr().out
+    assert f'{note.strpath}: - todo-error - Fixable' in out
+    assert note.read() == '- [ ] todo\n'
+
+
+def test_client_without_daemon(tmpdir, capsys):
+    socket_path = tmpdir.join('d.sock').strpath
+    assert client_main(['--socket', socket_path, 'check']) == 2
+    assert 'notesystem daemon' in capsys.readouterr().err
+
+
+def test_daemon_mode_gets_args():
+    with patch('notesystem.modes.daemon_mode.DaemonMode._run') as run:
+        main(['daemon', '--socket', 'x.sock', '--disable-todo-error'])
+    run.assert_called_once_with({
+        'socket_path': 'x.sock',
+        'disabled_errors': ['todo-error'],
+    })
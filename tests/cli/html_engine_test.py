@@ -0,0 +1,181 @@
+from unittest.mock import Mock
+from unittest.mock import patch
+
+import pytest
+from py.path import local as Path
+
+from notesystem.modes.html_engine import HtmlEngine
+from notesystem.modes.html_engine import MATHJAX_SCRIPT
+from notesystem.modes.html_engine import parse_front_matter
+from notesystem.modes.html_engine import Template
+from notesystem.modes.html_engine import TemplateError
+from notesystem.notesystem import main
+
+
+def test_template_variables_and_conditionals():
+    template = Template(
+        '<html$if(lang)$ lang="$lang$"$endif$>\n'
+        '$-- a comment\n'
+        '$if(title)$\n'
+        '<h1>$title$</h1>\n'
+        '$elseif(date)$\n'
+        '<p>${ date }</p>\n'
+        '$else$\n'
+        '<p>No title</p>\n'
+        '$endif$\n'
+        '  <main>\n'
+        '  $body$\n'
+        '  </main>\n'
+        'Costs $$5\n',
+    )
+    body = '<p>a</p>\n<p>b</p>'
+    assert template.render({'title': 'Note', 'body': body}) == (
+        '<html>\n<h1>Note</h1>\n  <main>\n  <p>a</p>\n  <p>b</p>\n'
+        '  </main>\nCosts $5\n'
+    )
+    assert template.render({'lang': 'en', 'date': 'today'}) == (
+        '<html lang="en">\n<p>today</p>\n  <main>\n  \n  </main>\nCosts $5\n'
+    )
+    assert '<p>No title</p>' in template.render({})
+
+
+def test_template_loops():
+    template = Template(
+        '$for(author)$\n<p>$author$</p>\n$endfor$\n'
+        '$for(tags)$$it$$sep$, $endfor$',
+    )
+    assert template.render({'author': ['A', 'B'], 'tags': ['x', 'y']}) == (
+        '<p>A</p>\n<p>B</p>\nx, y'
+    )
+    # A single value is a list with one item
+    assert template.render({'author': 'A'}) == '<p>A</p>\n'
+
+
+@pytest.mark.parametrize(
+    'text', [
+        '$styles.html()$',
+        '$title/uppercase$',
+        '$if(title)$ no end',
+        '$for(x)$ no end',
+        '$endif$',
+        'A lone $ sign',
+    ],
+)
+def test_unsupported_templates(text: str):
+    with pytest.raises(TemplateError):
+        Template(text)
+
+
+def test_parse_front_matter():
+    assert parse_front_matter(
+        '---\ntitle: "A note"\nauthor:\n  - Ann\n  - Bob\ntoc: true\n---\n'
+        '# Body\n',
+    ) == (
+        {'title': 'A note', 'author': ['Ann', 'Bob'], 'toc': True},
+        '# Body\n',
+    )
+    # No front matter (a horizontal rule and an unclosed block)
+    assert parse_front_matter('---\n\ntext\n') == ({}, '---\n\ntext\n')
+    assert parse_front_matter('---\ntitle: a\n') == ({}, '---\ntitle: a\n')
+    # Yaml that is not supported
+    assert parse_front_matter('---\ntitle: |\n  a\n---\n') is None
+    assert parse_front_matter('---\nauthor:\n  name: a\n---\n') is None
+
+
+def test_render_like_pandoc():
+    engine = HtmlEngine(None)
+    assert engine.render(
+        '# Hello & World\n\n'
+        'Some $x^2 < y$ and $$a_b$$ cost $5 and $6.\n\n'
+        '- [x] done\n- [ ] todo\n\n'
+        '# Hello & World\n\n'
+        '# 1. Intro\n',
+        'note',
+    ) == (
+        '<h1 id="hello-world">Hello &amp; World</h1>\n'
+        '<p>Some <span class="math inline">\\(x^2 &lt; y\\)</span> and '
+        '<span class="math display">\\[a_b\\]</span> cost $5 and $6.</p>\n'
+        '<ul class="task-list">\n'
+        '<li><label><input type="checkbox" checked="" />done</label></li>\n'
+        '<li><label><input type="checkbox" />todo</label></li>\n'
+        '</ul>\n'
+        '<h1 id="hello-world-1">Hello &amp; World</h1>\n'
+        '<h1 id="intro">1. Intro</h1>\n'
+    )
+
+
+def test_render_with_template():
+    engine = HtmlEngine(
+        '<title>$pagetitle$</title>\n'
+        '$for(author-meta)$\n<meta content="$author-meta$" />\n$endfor$\n'
+        '$if(math)$\n$math$\n$endif$\n'
+        '$if(title)$\n<h1>$title$</h1>\n$endif$\n'
+        '$body$\n',
+    )
+    assert engine.render('Some text\n', 'note') == (
+        '<title>note</title>\n<p>Some text</p>\n'
+    )
+    assert engine.render(
+        '---\ntitle: A *note*\nauthor: Ann\n---\n\n$x$\n', 'note',
+    ) == (
+        '<title>A note</title>\n'
+        '<meta content="Ann" />\n'
+        f'{MATHJAX_SCRIPT}\n'
+        '<h1>A <em>note</em></h1>\n'
+        '<p><span class="math inline">\\(x\\)</span></p>\n'
+    )
+
+
+@pytest.mark.parametrize(
+    'text', [
+        '% Title block\n',
+        '::: note\nA div\n:::\n',
+        'As shown by [@doe].\n',
+        '# Heading {#id}\n',
+        '---\ntitle: >\n  folded\n---\n',
+    ],
+)
+def test_pandoc_markdown_is_left_to_pandoc(text: str):
+    assert HtmlEngine(None).render(text, 'note') is None
+
+
+@patch('subprocess.run')
+def test_convert_dir_with_the_mistune_engine(run_mock: Mock, tmpdir: Path):
+    notes = tmpdir.mkdir('notes')
+    notes.join('a.md').write('# A\n\n$x$\n')
+    notes.join('b.md').write('::: note\nA div\n:::\n')
+    template = tmpdir.join('template.html')
+    template.write('<title>$pagetitle$</title>\n$body$\n')
+    out_dir = tmpdir.join('out')
+
+    with patch(
+        'notesystem.modes.convert_mode.pandoc_info',
+        return_value={'version': 'pandoc 3.0', 'data_dir': None},
+    ):
+        main([
+            '--no-visual', 'convert', notes.strpath, out_dir.strpath,
+            '--engine=mistune', f'--pandoc-template={template.strpath}',
+        ])
+
+    assert out_dir.join('a.html').read() == (
+        '<title>a</title>\n<h1 id="a">A</h1>\n'
+        '<p><span class="math inline">\\(x\\)</span></p>\n'
+    )
+    # Only the note with pandoc markdown is converted by pandoc
+    run_mock.assert_called_once()
+    assert notes.join('b.md').strpath in run_mock.call_args[0][0]
+
+
+@patch('subprocess.run')
+def test_mistune_engine_is_not_used_with_pandoc_args(
+    run_mock: Mock,
+    tmpdir: Path,
+):
+    note = tmpdir.join('note.md')
+    note.write('Some text\n')
+
+    main([
+        'convert', note.strpath, tmpdir.join('note.html').strpath,
+        '--engine=mistune', '--pandoc-args=--standalone',
+    ])
+    run_mock.assert_called_once()
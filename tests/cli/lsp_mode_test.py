@@ -0,0 +1,298 @@
+import io
+import json
+import random
+from typing import Any
+from typing import Dict
+from typing import List
+from unittest.mock import patch
+
+import pytest
+
+from notesystem.modes.check_mode.check_mode import CheckMode
+from notesystem.modes.lsp_mode import LspMode
+from notesystem.modes.lsp_mode import METHOD_NOT_FOUND
+from notesystem.modes.lsp_mode import SERVER_NOT_INITIALIZED
+from notesystem.modes.lsp_mode import split_lines
+from notesystem.modes.lsp_mode import TextDocument
+from notesystem.modes.lsp_mode import utf16_to_index
+from notesystem.notesystem import main
+
+URI = 'file:///notes/note.md'
+
+
+def _encode(messages: List[Dict[str, Any]]) -> bytes:
+    out = b''
+    for message in messages:
+        body = json.dumps(message).encode()
+        out += f'Content-Length: {len(body)}\r\n\r\n'.encode() + body
+    return out
+
+
+def _decode(data: bytes) -> List[Dict[str, Any]]:
+    messages = []
+    while data:
+        header, _, data = data.partition(b'\r\n\r\n')
+        length = int(header.split(b':')[1])
+        messages.append(json.loads(data[:length]))
+        data = data[length:]
+    return messages
+
+
+def _request(msg_id: int, method: str, params=None) -> Dict[str, Any]:
+    return {'jsonrpc': '2.0', 'id': msg_id, 'method': method, 'params': params}
+
+
+def _notification(method: str, params=None) -> Dict[str, Any]:
+    return {'jsonrpc': '2.0', 'method': method, 'params': params}
+
+
+def _open(text: str) -> Dict[str, Any]:
+    return _notification('textDocument/didOpen', {
+        'textDocument': {
+            'uri': URI, 'languageId': 'markdown', 'version': 1, 'text': text,
+        },
+    })
+
+
+def _serve(messages: List[Dict[str, Any]], lsp_mode=None):
+    lsp_mode = lsp_mode or LspMode()
+    out = io.BytesIO()
+    exit_code = lsp_mode.serve(io.BytesIO(_encode(messages)), out)
+    return exit_code, _decode(out.getvalue())
+
+
+def _diagnostics(messages) -> List[Dict[str, Any]]:
+    published = [
+        m for m in messages
+        if m.get('method') == 'textDocument/publishDiagnostics'
+    ]
+    return published[-1]['params']['diagnostics']
+
+
+def _found(diagnostics):
+    return sorted(
+        (d['range']['start']['line'], d['code']) for d in diagnostics
+    )
+
+
+def _check_text(text: str):
+    check_mode = CheckMode()
+    errors = check_mode._check_lines('note.md', split_lines(text))['errors']
+    return sorted(
+        (e['line_nr'] or 0, e['error_type'].get_error_name()) for e in errors
+    )
+
+
+def test_initialize_and_shutdown():
+    exit_code, messages = _serve([
+        _request(1, 'initialize', {'capabilities': {}}),
+        _notification('initialized', {}),
+        _request(2, 'shutdown'),
+        _notification('exit'),
+    ])
+    assert exit_code == 0
+    capabilities = messages[0]['result']['capabilities']
+    assert capabilities['textDocumentSync']['change'] == 2
+    assert messages[1] == {'jsonrpc': '2.0', 'id': 2, 'result': None}
+
+
+def test_exit_without_shutdown():
+    exit_code, _ = _serve([
+        _request(1, 'initialize', {}),
+        _notification('exit'),
+    ])
+    assert exit_code == 1
+
+
+def test_errors_for_unknown_and_uninitialized_requests():
+    _, messages = _serve([
+        _request(1, 'textDocument/codeAction', {}),
+        _request(2, 'initialize', {}),
+        _request(3, 'unknown/method', {}),
+    ])
+    assert messages[0]['error']['code'] == SERVER_NOT_INITIALIZED
+    assert messages[2]['error']['code'] == METHOD_NOT_FOUND
+
+
+def test_did_open_publishes_the_check_mode_errors():
+    text = 'Text\n#Title\n[ ] todo\n\n- a\n     - b\n'
+    _, messages = _serve([_request(1, 'initialize', {}), _open(text)])
+    diagnostics = _diagnostics(messages)
+    assert _found(diagnostics) == _check_text(text)
+    assert diagnostics[0]['range'] == {
+        'start': {'line': 1, 'character': 0},
+        'end': {'line': 1, 'character': 6},
+    }
+
+
+def _random_edit(rnd: random.Random, lines: List[str]) -> Dict[str, Any]:
+    def position():
+        line = rnd.randint(0, len(lines))
+        length = len(lines[line].rstrip('\n')) if line < len(lines) else 0
+        return {'line': line, 'character': rnd.randint(0, length)}
+    start, end = sorted(
+        [position(), position()],
+        key=lambda p: (p['line'], p['character']),
+    )
+    text = rnd.choice([
+        '', '#', '\n', '$$', '[ ] ', '---\n', 'a\n#b', ' ', '```\n',
+    ])
+    return {'range': {'start': start, 'end': end}, 'text': text}
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_changes_give_the_same_errors_as_a_full_check(seed):
+    rnd = random.Random(seed)
+    text = 'Text\n#Title\n---\n# Title\n[ ] todo\n$$x$$\n\ntext\n'
+    lsp_mode = LspMode()
+    _serve([_request(1, 'initialize', {}), _open(text)], lsp_mode)
+
+    doc = TextDocument(URI, text)
+    for version in range(2, 40):
+        edit = _random_edit(rnd, doc.lines)
+        doc.apply_change(edit)
+        _, messages = _serve([
+            _notification('textDocument/didChange', {
+                'textDocument': {'uri': URI, 'version': version},
+                'contentChanges': [edit],
+            }),
+        ], lsp_mode)
+        text = ''.join(doc.lines)
+        line_errors = [
+            e for e in _check_text(text) if e[1] != 'list-indent-error'
+        ]
+        found = [
+            e for e in _found(_diagnostics(messages))
+            if e[1] != 'list-indent-error'
+        ]
+        assert found == line_errors, text
+
+
+def test_did_save_checks_the_edited_document():
+    lsp_mode = LspMode()
+    _, messages = _serve(
+        [_request(1, 'initialize', {}), _open('hello\n')], lsp_mode,
+    )
+    assert _diagnostics(messages) == []
+
+    position = {'line': 1, 'character': 0}
+    _, messages = _serve([
+        _notification('textDocument/didChange', {
+            'textDocument': {'uri': URI, 'version': 2},
+            'contentChanges': [{
+                'range': {'start': position, 'end': position},
+                'text': '\n    indented code\n',
+            }],
+        }),
+        _notification('textDocument/didSave', {
+            'textDocument': {'uri': URI},
+        }),
+    ], lsp_mode)
+    assert 'list-indent-error' in {
+        d['code'] for d in _diagnostics(messages)
+    }
+
+
+def test_apply_change():
+    doc = TextDocument(URI, 'first\nsecond\nthird')
+    doc.apply_change({
+        'range': {
+            'start': {'line': 0, 'character': 5},
+            'end': {'line': 1, 'character': 3},
+        },
+        'text': ' and ',
+    })
+    assert doc.lines == ['first and ond\n', 'third']
+    assert len(doc.line_errors) == 2
+    doc.apply_change({
+        'range': {
+            'start': {'line': 2, 'character': 0},
+            'end': {'line': 2, 'character': 0},
+        },
+        'text': '\nfourth',
+    })
+    assert ''.join(doc.lines) == 'first and ond\nthird\nfourth'
+
+
+def test_utf16_to_index():
+    assert utf16_to_index('abc', 2) == 2
+    assert utf16_to_index('abc', 10) == 3
+    # The emoji is 2 UTF-16 code units
+    assert utf16_to_index('a\U0001F600b', 3) == 2
+    assert utf16_to_index('é\U0001F600b', 1) == 1
+
+
+def test_code_actions_fix_the_line():
+    text = 'Text\n\n#Title\n[ ] todo\n'
+    _, messages = _serve([
+        _request(1, 'initialize', {}),
+        _open(text),
+        _request(2, 'textDocument/codeAction', {
+            'textDocument': {'uri': URI},
+            'range': {
+                'start': {'line': 2, 'character': 0},
+                'end': {'line': 2, 'character': 0},
+            },
+            'context': {'diagnostics': []},
+        }),
+    ])
+    actions = messages[-1]['result']
+    assert actions[0]['title'] == 'Fix required-space-after-header-symbol'
+    assert actions[0]['edit']['changes'][URI] == [{
+        'range': {
+            'start': {'line': 2, 'character': 0},
+            'end': {'line': 3, 'character': 0},
+        },
+        'newText': '# Title\n',
+    }]
+    fix_all = actions[-1]
+    assert fix_all['kind'] == 'source.fixAll'
+    assert fix_all['edit']['changes'][URI][0]['newText'] == (
+        'Text\n\n# Title\n- [ ] todo\n'
+    )
+
+
+def test_crlf_documents_are_checked_like_check_mode(tmpdir):
+    text = 'Text\r\n\r\n---\r\n\r\n# Title\r\nText\r\n#Title\r\n[ ] todo'
+    note = tmpdir.join('note.md')
+    note.write_binary(text.encode())
+    errors = CheckMode()._check_file(note.strpath)['errors']
+    _, messages = _serve([
+        _request(1, 'initialize', {}),
+        _open(text),
+        _request(2, 'textDocument/codeAction', {
+            'textDocument': {'uri': URI},
+            'range': {
+                'start': {'line': 6, 'character': 0},
+                'end': {'line': 6, 'character': 0},
+            },
+            'context': {'diagnostics': []},
+        }),
+    ])
+    assert _found(_diagnostics(messages)) == sorted(
+        (e['line_nr'], e['error_type'].get_error_name()) for e in errors
+    )
+    # The fixes keep the line endings of the document
+    actions = messages[-1]['result']
+    assert [
+        action['edit']['changes'][URI][0]['newText'] for action in actions
+    ] == [
+        '# Title\r\n',
+        '\r\n#Title\r\n',
+        'Text\r\n\r\n---\r\n\r\n# Title\r\nText\r\n\r\n# Title\r\n- [ ] todo',
+    ]
+
+
+def test_did_close_clears_diagnostics():
+    _, messages = _serve([
+        _request(1, 'initialize', {}),
+        _open('#Title\n'),
+        _notification('textDocument/didClose', {'textDocument': {'uri': URI}}),
+    ])
+    assert _diagnostics(messages) == []
+
+
+def test_lsp_mode_gets_disabled_errors():
+    with patch('notesystem.modes.lsp_mode.LspMode._run') as run:
+        main(['lsp', '--disable-todo-error'])
+    run.assert_called_once_with({'disabled_errors': ['todo-error']})
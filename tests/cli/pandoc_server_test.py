@@ -0,0 +1,149 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from unittest.mock import Mock
+from unittest.mock import patch
+
+import pytest
+from py.path import local as Path
+
+from notesystem.modes.pandoc_server import PandocServer
+from notesystem.modes.pandoc_server import PandocServerError
+from notesystem.notesystem import main
+
+
+class FakePandocHandler(BaseHTTPRequestHandler):
+    """Converts the text to <p>text</p>, like a (very simple) pandoc"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.server.clients.add(self.client_address)  # type: ignore
+        length = int(self.headers['Content-Length'])
+        request = json.loads(self.rfile.read(length))
+        if request['text'] == 'fail':
+            body = b'Unknown reader'
+            self.send_response(500)
+        else:
+            body = json.dumps({
+                'output': f"<p>{request['text']}</p>",
+                'base64': False,
+                'messages': [],
+            }).encode()
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakePandocHandler)
+    httpd.clients = set()  # type: ignore
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.start()
+    server = PandocServer()
+    server._port = httpd.server_address[1]
+    yield server, httpd
+    server.stop()
+    httpd.shutdown()
+    thread.join()
+    httpd.server_close()
+
+
+def test_convert_reuses_the_connection(fake_server):
+    server, httpd = fake_server
+    assert server.convert({'text': 'a', 'to': 'html'}) == ('<p>a</p>', [])
+    assert server.convert({'text': 'b', 'to': 'html'}) == ('<p>b</p>', [])
+    assert len(httpd.clients) == 1
+
+
+def test_convert_error(fake_server):
+    server, _ = fake_server
+    with pytest.raises(PandocServerError, match='Unknown reader'):
+        server.convert({'text': 'fail', 'to': 'html'})
+    # The connection still works
+    assert server.convert({'text': 'a', 'to': 'html'})[0] == '<p>a</p>'
+
+
+def test_start_without_server():
+    with patch(
+        'notesystem.modes.pandoc_server.SERVER_COMMANDS',
+        (['notesystem-no-pandoc', 'server'],),
+    ):
+        assert PandocServer().start() is False
+
+
+@patch('subprocess.run')
+@patch(
+    'notesystem.modes.pandoc_server.PandocServer.convert',
+    return_value=(
+        '<p>converted</p>',
+        [{'verbosity': 'WARNING', 'message': 'a warning'}],
+    ),
+)
+@patch('notesystem.modes.pandoc_server.PandocServer.start', return_value=True)
+@patch('notesystem.modes.pandoc_server.PandocServer.stop')
+def test_convert_mode_uses_the_server(
+    stop_mock: Mock,
+    start_mock: Mock,
+    convert_mock: Mock,
+    run_mock: Mock,
+    tmpdir: Path,
+    capsys,
+):
+    note = tmpdir.join('note.md')
+    note.write('Some text\n')
+    out_file = tmpdir.join('note.html')
+
+    main([
+        'convert', note.strpath, out_file.strpath,
+        '--pandoc-server', '--pandoc-template=None',
+    ])
+
+    run_mock.assert_not_called()
+    stop_mock.assert_called_once()
+    request = convert_mock.call_args[0][0]
+    assert request['text'] == 'Some text\n'
+    assert request['variables'] == {'pagetitle': 'note'}
+    assert out_file.read() == '<p>converted</p>'
+    assert '[WARNING] a warning' in capsys.readouterr().out
+
+
+@patch('subprocess.run')
+@patch('notesystem.modes.pandoc_server.PandocServer.start', return_value=False)
+def test_convert_mode_falls_back_to_pandoc(
+    start_mock: Mock,
+    run_mock: Mock,
+    tmpdir: Path,
+):
+    note = tmpdir.join('note.md')
+    note.write('Some text\n')
+
+    main([
+        'convert', note.strpath, tmpdir.join('note.html').strpath,
+        '--pandoc-server', '--pandoc-template=None',
+    ])
+    start_mock.assert_called_once()
+    run_mock.assert_called_once()
+
+
+@patch('subprocess.run')
+@patch('notesystem.modes.pandoc_server.PandocServer.start')
+def test_convert_mode_does_not_use_the_server_with_pandoc_args(
+    start_mock: Mock,
+    run_mock: Mock,
+    tmpdir: Path,
+):
+    note = tmpdir.join('note.md')
+    note.write('Some text\n')
+
+    main([
+        'convert', note.strpath, tmpdir.join('note.html').strpath,
+        '--pandoc-server', '--pandoc-args=--standalone',
+    ])
+    start_mock.assert_not_called()
+    run_mock.assert_called_once()
@@ -0,0 +1,120 @@
+import io
+import json
+import xml.etree.ElementTree as ET
+from unittest.mock import patch
+
+import pytest
+from py.path import local as Path
+
+from notesystem.modes.check_mode.check_mode import ALL_ERRORS
+from notesystem.modes.check_mode.check_mode import unpack_doc_errors
+from notesystem.modes.check_mode.reporters import create_reporter
+from notesystem.notesystem import main
+
+DOC_ERRORS = [
+    unpack_doc_errors((
+        'notes/a.md',
+        [
+            (0, '#Title\n', 'required-space-after-header-symbol'),
+            (2, '[ ] todo\n', 'todo-error'),
+            (None, None, 'list-indent-error'),
+        ],
+    )),
+    unpack_doc_errors(('notes/b.md', [])),
+]
+
+
+def _report(output_format: str, fixed: bool = False) -> str:
+    out = io.StringIO()
+    reporter = create_reporter(output_format, ALL_ERRORS, out)
+    reporter.start()
+    for doc_errors in DOC_ERRORS:
+        reporter.report(doc_errors, fixed)
+    reporter.finish()
+    return out.getvalue()
+
+
+def test_jsonl_reporter_writes_one_record_per_document():
+    lines = _report('jsonl', fixed=True).splitlines()
+    assert len(lines) == 2
+    record = json.loads(lines[0])
+    assert record['file_path'] == 'notes/a.md'
+    assert [e['error'] for e in record['errors']] == [
+        'required-space-after-header-symbol',
+        'todo-error',
+        'list-indent-error',
+    ]
+    assert record['errors'][0]['line_nr'] == 0
+    assert record['errors'][0]['fixed'] is True
+    # ListIndentError is not fixable
+    assert record['errors'][2]['fixed'] is False
+    assert json.loads(lines[1]) == {'file_path': 'notes/b.md', 'errors': []}
+
+
+def test_sarif_reporter_writes_valid_log():
+    log = json.loads(_report('sarif'))
+    assert log['version'] == '2.1.0'
+    run = log['runs'][0]
+    assert len(run['tool']['driver']['rules']) == len(ALL_ERRORS)
+    results = run['results']
+    assert [r['ruleId'] for r in results] == [
+        'required-space-after-header-symbol',
+        'todo-error',
+        'list-indent-error',
+    ]
+    region = results[1]['locations'][0]['physicalLocation']['region']
+    # SARIF line numbers start at 1
+    assert region == {'startLine': 3}
+    assert 'region' not in results[2]['locations'][0]['physicalLocation']
+
+
+def test_sarif_reporter_without_results():
+    out = io.StringIO()
+    reporter = create_reporter('sarif', ALL_ERRORS, out)
+    reporter.start()
+    reporter.finish()
+    assert json.loads(out.getvalue())['runs'][0]['results'] == []
+
+
+def test_checkstyle_reporter_writes_valid_xml():
+    root = ET.fromstring(_report('checkstyle'))
+    files = root.findall('file')
+    assert [f.get('name') for f in files] == ['notes/a.md', 'notes/b.md']
+    errors = files[0].findall('error')
+    assert [e.get('line') for e in errors] == ['1', '3', None]
+    assert errors[1].get('source') == 'notesystem.todo-error'
+    assert files[1].findall('error') == []
+
+
+def test_create_reporter_raises_on_unknown_format():
+    with pytest.raises(ValueError):
+        create_reporter('unknown', ALL_ERRORS)
+
+
+def test_check_mode_streams_format_to_stdout(tmpdir: Path, capsys):
+    tmpdir.join('a.md').write('#Title\n')
+    tmpdir.join('b.md').write('# Title\n')
+
+    main(['check', tmpdir.strpath, '--format', 'jsonl'])
+
+    out = capsys.readouterr().out
+    records = [json.loads(line) for line in out.splitlines()]
+    assert [r['file_path'] for r in records] == [
+        tmpdir.join('a.md').strpath, tmpdir.join('b.md').strpath,
+    ]
+    errors = records[0]['errors']
+    assert errors[0]['error'] == 'required-space-after-header-symbol'
+    assert records[1]['errors'] == []
+
+
+@patch('notesystem.modes.check_mode.check_mode.print_doc_error')
+def test_format_replaces_visual_output(mock, tmpdir: Path, capsys):
+    tmpdir.join('a.md').write('#Title\n')
+    main(['check', tmpdir.strpath, '--format', 'sarif'])
+    mock.assert_not_called()
+    json.loads(capsys.readouterr().out)
+
+
+def test_format_option_rejects_unknown_format():
+    with pytest.raises(SystemExit):
+        main(['check', 'tests/test_documents', '--format', 'xml'])
@@ -0,0 +1,99 @@
+import json
+
+from py.path import local as Path
+
+from notesystem.modes.check_mode.check_mode import CheckMode
+from notesystem.modes.check_mode.rule_engine import RuleEngine
+from notesystem.modes.check_mode.rule_profile import RuleProfile
+from notesystem.notesystem import main
+
+
+def test_timed_rule_engine_finds_the_same_errors():
+    lines = [
+        'text\n', '#Title\n', '[ ] todo\n', '```\n', '#code\n', '```\n',
+        '---\n', 'Some $$math$$\n',
+    ]
+    rules = CheckMode.possible_markdown_errors
+    profile = RuleProfile()
+    profile.start_file('note.md')
+    found = RuleEngine(rules, profile.record_rule).check(lines)
+    assert found == RuleEngine(rules).check(lines)
+
+    stats = dict(profile.sorted_stats())
+    assert stats['math-error']['calls'] == 5
+    assert stats['math-error']['hits'] == 1
+    assert stats['todo-error']['calls'] == 1
+    assert stats['newline-before-header-error']['hits'] == 1
+    assert stats['math-error']['worst_file'] == 'note.md'
+
+
+def test_timed_check_document():
+    lines = ['#Title\n', '[ ] todo\n', 'Some $$math$$\n'] * 10
+    rules = CheckMode.possible_markdown_errors
+    profile = RuleProfile()
+    profile.start_file('note.md')
+    found = RuleEngine(rules, profile.record_rule).check_document(lines)
+    assert found == RuleEngine(rules).check(lines)
+
+    stats = dict(profile.sorted_stats())
+    assert set(stats) == {rule.get_error_name() for rule in rules}
+    assert stats['todo-error']['hits'] == 10
+    assert stats['math-error']['hits'] == 10
+
+
+def test_rule_profile_keeps_the_worst_file():
+    profile = RuleProfile()
+    for file_path, elapsed in (('a.md', 0.1), ('b.md', 0.3), ('c.md', 0.2)):
+        profile.start_file(file_path)
+        profile.record('read', elapsed / 2)
+        profile.record('read', elapsed / 2)
+    read = profile.sorted_stats()[0][1]
+    assert read['calls'] == 6
+    assert read['worst_file'] == 'b.md'
+    assert round(read['worst_time'], 6) == 0.3
+
+
+def test_rule_profile_merge():
+    profile = RuleProfile()
+    profile.start_file('a.md')
+    profile.record('todo-error', 0.1, calls=10, hits=1)
+    worker = RuleProfile()
+    worker.start_file('b.md')
+    worker.record('todo-error', 0.2, calls=5)
+    worker.record('read', 0.1)
+    profile.merge(worker.pop_stats())
+
+    assert worker.stats == {}
+    assert [name for name, _ in profile.sorted_stats()] == [
+        'todo-error', 'read',
+    ]
+    todo = profile.stats['todo-error']
+    assert (todo['calls'], todo['hits']) == (15, 1)
+    assert todo['worst_file'] == 'b.md'
+
+
+def test_rule_profile_table():
+    profile = RuleProfile()
+    profile.start_file('a.md')
+    profile.record('math-error', 0.002, calls=3, hits=1)
+    lines = profile.format('table').splitlines()
+    assert lines[0].split() == ['Rule', 'Time', '(ms)', 'Calls', 'Hits',
+                                'Worst', 'file']
+    assert lines[1].split() == ['math-error', '2.0', '3', '1', 'a.md',
+                                '(2.0', 'ms)']
+
+
+def test_check_mode_writes_profile_to_stderr(tmpdir: Path, capsys):
+    tmpdir.join('a.md').write('#Title\n\n\t- list\n\t- list\n')
+    main([
+        'check', tmpdir.strpath, '--format', 'jsonl',
+        '--profile-rules', 'json',
+    ])
+    captured = capsys.readouterr()
+    # The output of the check itself is not changed
+    assert len(captured.out.splitlines()) == 1
+    rules = {r['name']: r for r in json.loads(captured.err)['rules']}
+    assert rules['read']['calls'] == 1
+    assert rules['decode']['worst_file'] == tmpdir.join('a.md').strpath
+    assert rules['list-indent-error']['hits'] == 1
+    assert rules['required-space-after-header-symbol']['hits'] == 1
@@ -301,6 +301,24 @@ no_visual=true
                     'dest': 'verbose',
                 },
             ),
+        ), (
+            {
+                'value': None,
+                'flags': ['--format'],
+                'dest': 'output_format',
+                'config_name': 'format',
+                'help': 'the output format',
+                'type': str,
+                'choices': ['text', 'jsonl'],
+                'default': 'text',
+            }, (
+                ['--format'], {
+                    'default': 'text',
+                    'help': 'the output format',
+                    'dest': 'output_format',
+                    'choices': ['text', 'jsonl'],
+                },
+            ),
         ),
     ],
 )
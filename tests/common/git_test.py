@@ -0,0 +1,160 @@
+import json
+import os
+import subprocess
+
+import pytest
+from py.path import local as Path
+
+from notesystem.common.git import changed_files
+from notesystem.common.git import GitError
+from notesystem.common.git import parse_diff
+from notesystem.common.git import read_staged_files
+from notesystem.notesystem import main
+
+
+def _git(repo: Path, *args: str) -> None:
+    subprocess.run(
+        [
+            'git', '-c', 'user.name=test', '-c', 'user.email=test@test',
+            *args,
+        ],
+        cwd=repo.strpath,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def repo(tmpdir: Path) -> Path:
+    repo = tmpdir.mkdir('repo')
+    _git(repo, 'init', '-q')
+    notes = repo.mkdir('notes')
+    notes.join('a.md').write(
+        '#Old error\n\n' + ''.join(f'line {i}\n' for i in range(20)),
+    )
+    notes.join('b.md').write('# B\n')
+    _git(repo, 'add', '.')
+    _git(repo, 'commit', '-q', '-m', 'init')
+    return Path(os.path.realpath(repo.strpath))
+
+
+def test_parse_diff():
+    diff = (
+        b'diff --git a/a.md b/a.md\n'
+        b'--- a/a.md\n'
+        b'+++ b/a.md\n'
+        b'@@ -3 +3 @@\n'
+        b'-x\n'
+        b'+y\n'
+        b'@@ -10,2 +9,0 @@\n'
+        b'@@ -20,0 +20,3 @@\n'
+        b'diff --git a/gone.md b/gone.md\n'
+        b'--- a/gone.md\n'
+        b'+++ /dev/null\n'
+        b'@@ -1 +0,0 @@\n'
+        b'+++ "b/tab\\there.md"\n'
+        b'@@ -0,0 +1 @@\n'
+        b'+++ b/my note.md\t\n'
+        b'@@ -0,0 +1 @@\n'
+    )
+    changed = parse_diff(diff, '/repo')
+    assert changed == {
+        '/repo/a.md': [(2, 3), (9, 9), (19, 22)],
+        '/repo/tab\there.md': [(0, 1)],
+        '/repo/my note.md': [(0, 1)],
+    }
+
+
+def test_changed_files(repo: Path):
+    notes = repo.join('notes')
+    notes.join('b.md').write('# B\n\n#New error\n')
+    notes.join('c.md').write('new\n')
+
+    changed = changed_files(notes.strpath, 'HEAD')
+    assert changed == {
+        notes.join('b.md').strpath: [(1, 3)],
+        notes.join('c.md').strpath: None,
+    }
+
+    # Nothing is staged yet
+    assert changed_files(notes.strpath, staged=True) == {}
+    _git(repo, 'add', 'notes/b.md')
+    assert changed_files(notes.strpath, staged=True) == {
+        notes.join('b.md').strpath: [(1, 3)],
+    }
+
+
+def test_changed_files_outside_repo(tmpdir: Path):
+    with pytest.raises(GitError):
+        changed_files(tmpdir.mkdir('no_repo').strpath, 'HEAD')
+
+
+def test_read_staged_files(repo: Path):
+    notes = repo.join('notes')
+    notes.join('b.md').write('# Staged\n')
+    _git(repo, 'add', 'notes/b.md')
+    notes.join('b.md').write('# Not staged\n')
+    contents = read_staged_files([
+        notes.join('a.md').strpath,
+        notes.join('b.md').strpath,
+        notes.join('untracked.md').strpath,
+    ])
+    assert contents[notes.join('b.md').strpath] == b'# Staged\n'
+    assert contents[notes.join('a.md').strpath].startswith(b'#Old error\n')
+    assert notes.join('untracked.md').strpath not in contents
+
+
+def _check(args, capsys):
+    main(['check', *args, '--format', 'jsonl'])
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_check_changed_since_only_checks_changed_lines(repo: Path, capsys):
+    notes = repo.join('notes')
+    a_lines = notes.join('a.md').readlines()
+    a_lines[15] = '[ ] todo\n'
+    notes.join('a.md').write(''.join(a_lines))
+
+    records = _check([notes.strpath, '--changed-since', 'HEAD'], capsys)
+
+    # b.md did not change, the old error on line 0 is not checked
+    assert [r['file_path'] for r in records] == [notes.join('a.md').strpath]
+    assert [(e['line_nr'], e['error']) for e in records[0]['errors']] == [
+        (15, 'todo-error'),
+    ]
+
+
+def test_check_staged_checks_the_staged_content(repo: Path, capsys):
+    notes = repo.join('notes')
+    notes.join('b.md').write('# B\n#Staged error\n')
+    _git(repo, 'add', 'notes/b.md')
+    notes.join('b.md').write('# B\n\n# Fixed but not staged\n')
+
+    records = _check([notes.strpath, '--staged'], capsys)
+    assert [e['line'] for e in records[0]['errors']] == [
+        '#Staged error\n', '#Staged error\n',
+    ]
+
+    # The working tree has other changes, so it is not fixed
+    main(['--no-visual', 'check', notes.strpath, '--staged', '--fix'])
+    assert notes.join('b.md').read() == '# B\n\n# Fixed but not staged\n'
+
+
+def test_check_changed_files_with_a_space(repo: Path, capsys):
+    notes = repo.join('notes')
+    note = notes.join('my note.md')
+    note.write('# Note\n')
+    _git(repo, 'add', 'notes/my note.md')
+    _git(repo, 'commit', '-q', '-m', 'note')
+    note.write('# Note\n[ ] todo\n')
+    _git(repo, 'add', 'notes/my note.md')
+
+    for args in (['--changed-since', 'HEAD'], ['--staged']):
+        records = _check([notes.strpath, *args], capsys)
+        assert [r['file_path'] for r in records] == [note.strpath]
+        assert [e['error'] for e in records[0]['errors']] == ['todo-error']
+
+
+def test_check_changed_since_unknown_revision(repo: Path):
+    with pytest.raises(SystemExit):
+        main(['check', repo.strpath, '--changed-since', 'does-not-exist'])
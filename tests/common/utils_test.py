@@ -1,7 +1,16 @@
+import os
+import stat
+from unittest.mock import patch
+
 import py
 import pytest
 
+from notesystem.common.utils import atomic_write
+from notesystem.common.utils import decode_bytes
+from notesystem.common.utils import FileWriter
 from notesystem.common.utils import find_all_md_files
+from notesystem.common.utils import find_duplicate_files
+from notesystem.common.utils import merge_ranges
 
 
 def test_find_all_md_files():
@@ -27,3 +36,106 @@ def test_find_all_md_files_only_returns_md_files(tmpdir: py.path.local):
 def test_find_all_md_files_raises_when_dir_does_not_exist():
     with pytest.raises(NotADirectoryError):
         _ = find_all_md_files('nodir')
+
+
+def test_atomic_write_replaces_file(tmpdir: py.path.local):
+    file = tmpdir.join('note.md')
+    file.write('old')
+    os.chmod(file.strpath, 0o640)
+
+    atomic_write(file.strpath, 'new')
+
+    assert file.read() == 'new'
+    assert stat.S_IMODE(os.stat(file.strpath).st_mode) == 0o640
+    # No temporary files are left behind
+    assert os.listdir(tmpdir.strpath) == ['note.md']
+
+
+def test_atomic_write_keeps_file_on_error(tmpdir: py.path.local):
+    file = tmpdir.join('note.md')
+    file.write('old')
+
+    with patch('os.replace', side_effect=OSError('interrupted')):
+        with pytest.raises(OSError):
+            atomic_write(file.strpath, 'new')
+
+    assert file.read() == 'old'
+    assert os.listdir(tmpdir.strpath) == ['note.md']
+
+
+def test_atomic_write_writes_through_links(tmpdir: py.path.local):
+    target = tmpdir.mkdir('notes').join('note.md')
+    target.write('old')
+    link = tmpdir.join('link.md')
+    link.mksymlinkto(target)
+    hardlink = tmpdir.join('hardlink.md')
+    os.link(target.strpath, hardlink.strpath)
+
+    atomic_write(link.strpath, 'new')
+
+    assert link.islink()
+    assert target.read() == 'new'
+    assert hardlink.read() == 'new'
+
+
+def test_find_duplicate_files(tmpdir: py.path.local):
+    contents = ['# Same\n', '# Diff\n', '# Same\n', '# Longer\n', '# Same\n']
+    paths = []
+    for i, content in enumerate(contents):
+        paths.append(tmpdir.join(f'{i}.md'))
+        paths[-1].write(content)
+    paths = [p.strpath for p in paths]
+    assert find_duplicate_files(paths + ['not_a_file.md']) == {
+        paths[2]: paths[0],
+        paths[4]: paths[0],
+    }
+
+
+def test_file_writer_writes_all_files(tmpdir: py.path.local):
+    with FileWriter(max_workers=2, max_pending=2) as writer:
+        for i in range(20):
+            writer.write(tmpdir.join(f'note{i}.md').strpath, f'note {i}')
+    for i in range(20):
+        assert tmpdir.join(f'note{i}.md').read() == f'note {i}'
+    assert writer.n_written == 20
+
+
+def test_file_writer_returns_errors(tmpdir: py.path.local):
+    writer = FileWriter()
+    bad_path = tmpdir.join('nodir', 'note.md').strpath
+    writer.write(bad_path, 'note')
+    errors = writer.close()
+    assert len(errors) == 1
+    assert errors[0][0] == bad_path
+
+
+@pytest.mark.parametrize(
+    'ranges,expected', [
+        ([], []),
+        ([(5, 6), (0, 2)], [(0, 2), (5, 6)]),
+        ([(0, 2), (2, 4), (3, 8)], [(0, 8)]),
+        ([(-1, 1), (4, 4)], [(-1, 1), (4, 4)]),
+    ],
+)
+def test_merge_ranges(ranges, expected):
+    assert merge_ranges(ranges) == expected
+
+
+@pytest.mark.parametrize(
+    'data,encoding,expected', [
+        (b'# Title\n', None, ('# Title\n', 'utf-8')),
+        ('# Caf\xe9\n'.encode(), None, ('# Caf\xe9\n', 'utf-8')),
+        (b'\xef\xbb\xbf# Title\n', None, ('# Title\n', 'utf-8-sig')),
+        ('# Title\n'.encode('utf-16'), None, ('# Title\n', 'utf-16')),
+        (b'# Caf\xe9 \x80\n', None, ('# Caf\xe9 \u20ac\n', 'windows-1252')),
+        # Not defined in windows-1252
+        (b'# \x81\n', None, ('# \x81\n', 'latin-1')),
+        # The expected encoding is tried first
+        (b'# \xe9\n', 'latin-1', ('# \xe9\n', 'latin-1')),
+        (b'# \xc3\xa9\n', 'windows-1252', ('# \xc3\xa9\n', 'windows-1252')),
+        # A byte order mark is never ignored
+        (b'\xef\xbb\xbf# Title\n', 'latin-1', ('# Title\n', 'utf-8-sig')),
+    ],
+)
+def test_decode_bytes(data, encoding, expected):
+    assert decode_bytes(data, encoding) == expected
@@ -0,0 +1,90 @@
+import io
+from unittest.mock import patch
+
+from termcolor import colored
+
+from notesystem.common.visual import format_doc_error
+from notesystem.common.visual import format_simple_doc_error
+from notesystem.common.visual import print_doc_error
+from notesystem.common.visual import print_simple_doc_error
+from notesystem.common.visual import terminal_columns
+from notesystem.common.visual import use_colors
+from notesystem.modes.check_mode.check_mode import unpack_doc_errors
+
+DOC_ERRORS = unpack_doc_errors((
+    'notes/a.md',
+    [
+        (3, '[ ] todo\n', 'todo-error'),
+        (None, None, 'list-indent-error'),
+    ],
+))
+
+
+class FakeTerminal(io.StringIO):
+    def isatty(self):
+        return True
+
+
+def test_print_doc_error_does_not_start_processes(capsys):
+    with patch('os.popen') as popen, patch('subprocess.Popen') as sp:
+        for _ in range(10):
+            print_doc_error(DOC_ERRORS)
+    popen.assert_not_called()
+    sp.assert_not_called()
+    assert capsys.readouterr().out.count('Total errors') == 10
+
+
+def test_terminal_columns_is_cached():
+    terminal_columns.cache_clear()
+    with patch('shutil.get_terminal_size') as get_size:
+        get_size.return_value.columns = 120
+        assert terminal_columns() == 120
+        assert terminal_columns() == 120
+    get_size.assert_called_once()
+    terminal_columns.cache_clear()
+
+
+def test_plain_text_when_not_a_terminal(capsys):
+    print_doc_error(DOC_ERRORS, True)
+    print_simple_doc_error(DOC_ERRORS)
+    out = capsys.readouterr().out
+    assert '\033[' not in out
+    assert '    Line nr: 3\n' in out
+    assert '    Line nr: -\n' in out
+    assert '    Fixed Yes\n' in out
+    assert 'notes/a.md:3 - todo-error - Fixable\n' in out
+
+
+def test_colors_when_terminal(monkeypatch):
+    monkeypatch.delenv('NO_COLOR', raising=False)
+    monkeypatch.delenv('ANSI_COLORS_DISABLED', raising=False)
+    out = FakeTerminal()
+    monkeypatch.setattr('sys.stdout', out)
+    print_simple_doc_error(DOC_ERRORS)
+    first_line = out.getvalue().splitlines()[0]
+    assert first_line == (
+        f"{colored('notes/a.md:3', 'yellow')} - "
+        f"{colored('todo-error', 'cyan')} - "
+        f"{colored('Fixable', 'green')}"
+    )
+
+    assert use_colors(out)
+    monkeypatch.setenv('NO_COLOR', '1')
+    assert not use_colors(out)
+
+
+def test_colored_format_matches_termcolor():
+    text = format_doc_error(DOC_ERRORS, False, True)
+    assert colored('notes/a.md', 'cyan', attrs=['bold']) in text
+    assert colored('    Line nr: 3', 'blue') + '\n' in text
+    assert format_simple_doc_error(DOC_ERRORS, True, False).splitlines() == [
+        'notes/a.md:3 - todo-error - Fixed',
+        'notes/a.md: - list-indent-error - Not Fixed',
+    ]
+
+
+def test_no_output_without_errors(capsys):
+    doc_errors = unpack_doc_errors(('notes/b.md', []))
+    print_doc_error(doc_errors)
+    print_simple_doc_error(doc_errors)
+    assert capsys.readouterr().out == ''
@@ -1,6 +1,12 @@
+import random
+from unittest.mock import patch
+
 import pytest
 
+from notesystem.modes.check_mode.errors.ast_errors import ast_cache
+from notesystem.modes.check_mode.errors.ast_errors import AstCache
 from notesystem.modes.check_mode.errors.ast_errors import AstError
+from notesystem.modes.check_mode.errors.ast_errors import AstPartSplitter  # noqa: E501
 from notesystem.modes.check_mode.errors.ast_errors import ListIndentError
 
 ##################################
@@ -39,3 +45,91 @@ def test_list_indent_non_fixable():
 def test_lsit_indent_str_method():
     e = ListIndentError()
     assert str(e) == 'List Indent Error (list is not properly indented)'
+
+
+##########################
+# --- TEST AST CACHE --- #
+##########################
+
+
+def test_ast_cache_parses_document_once():
+    """Test that multiple AstErrors validating the same lines
+       only parse the document once
+    """
+    with open('tests/test_documents/ast_error_test_1.md') as test_file:
+        lines = test_file.readlines()
+
+    ast_cache.clear()
+    with patch(
+        'notesystem.modes.check_mode.errors.ast_errors.markdown_parser',
+        wraps=lambda text: [],
+    ) as parser_mock:
+        ListIndentError().validate(lines)
+        ListIndentError().validate(lines)
+    parser_mock.assert_called_once()
+
+
+def test_ast_cache_parses_new_lists():
+    cache = AstCache(max_size=2)
+    lines_1 = ['# Heading\n']
+    lines_2 = ['    indented\n']
+    ast_1 = cache.get(lines_1)
+    ast_2 = cache.get(lines_2)
+    assert ast_1 != ast_2
+    assert cache.get(lines_1) is ast_1
+    assert cache.hits == 1
+    assert cache.misses == 2
+    # The oldest document is removed when the cache is full
+    cache.get(['text\n'])
+    cache.get(['more text\n'])
+    cache.get(lines_1)
+    assert cache.misses == 5
+
+
+####################################
+# --- TEST AST PART SPLITTER --- #
+####################################
+
+# Lines that start, continue or end blocks that span multiple lines
+SPLIT_LINES = [
+    'text\n', '# H\n', '\n', '- item\n', '  - sub\n', '1. one\n', '```\n',
+    '```py\n', '   ```\n', '    code\n', '\tcode\n', '~~~\n', '<!-- c\n',
+    '-->\n', '<!-- x -->\n', '<pre>\n', '</pre>\n', '> q\n', '---\n',
+    '- ```\n', '  code in item\n', '````\n', ' - x\n', '* a\n', '\t- tab\n',
+    'a\u2424```\n', '10. x\n',
+]
+
+
+def _split(lines, min_part_size=0):
+    splitter = AstPartSplitter(min_part_size)
+    parts = []
+    for line in lines:
+        part = splitter.push(line)
+        if part is not None:
+            parts.append(part)
+    parts.append(splitter.finish())
+    return parts
+
+
+def test_ast_part_splitter_keeps_blocks_together():
+    lines = [
+        '# Title\n', '```\n', '# code\n', '```\n', '- item\n',
+        '    - sub\n', '- item\n', 'text\n',
+    ]
+    assert _split(lines) == [
+        ['# Title\n'], ['```\n', '# code\n', '```\n'],
+        ['- item\n', '    - sub\n', '- item\n'], ['text\n'],
+    ]
+    # Parts are at least min_part_size characters
+    assert _split(lines, 20) == [lines[:4], lines[4:7], lines[7:]]
+
+
+def test_ast_part_splitter_parts_validate_like_document():
+    rnd = random.Random(0)
+    for _ in range(500):
+        lines = [rnd.choice(SPLIT_LINES) for _ in range(rnd.randint(1, 30))]
+        parts = _split(lines)
+        assert sum(parts, []) == lines
+        assert ListIndentError().validate(lines) == all(
+            ListIndentError().validate(part) for part in parts
+        )
@@ -0,0 +1,78 @@
+from itertools import accumulate
+from typing import List
+
+import pytest
+
+from notesystem.modes.check_mode.line_context import classify_lines
+from notesystem.modes.check_mode.line_context import FENCE
+from notesystem.modes.check_mode.line_context import find_regions
+from notesystem.modes.check_mode.line_context import FRONT_MATTER
+from notesystem.modes.check_mode.line_context import iter_line_contexts
+from notesystem.modes.check_mode.line_context import MATH
+from notesystem.modes.check_mode.line_context import PROSE
+
+
+@pytest.mark.parametrize(
+    'lines,expected', [
+        (['text\n', '```python\n', '# code\n', '```\n', 'text\n'], [
+            PROSE, FENCE, FENCE, FENCE, PROSE,
+        ]),
+        # The closing fence has to be at least as long as the opening fence
+        (['````\n', '```\n', '`````\n', 'text\n'], [
+            FENCE, FENCE, FENCE, PROSE,
+        ]),
+        (['~~~\n', '```\n', '~~~\n'], [FENCE, FENCE, FENCE]),
+        # Fences can be indented (e.g. in a list)
+        (['- item\n', '    ```\n', '    code\n', '    ```\n'], [
+            PROSE, FENCE, FENCE, FENCE,
+        ]),
+        # Inline code is not a fence
+        (['```code``` text\n', '#Head\n'], [PROSE, PROSE]),
+        # A fence that is not closed continues to the end
+        (['```\n', 'code\n'], [FENCE, FENCE]),
+        (['---\n', 'title: x\n', '...\n', 'text\n'], [
+            FRONT_MATTER, FRONT_MATTER, FRONT_MATTER, PROSE,
+        ]),
+        # A seperator followed by an empty line is not front matter
+        (['---\n', '\n', 'text\n', '---\n'], [PROSE, PROSE, PROSE, PROSE]),
+        # Front matter that is not closed is not front matter
+        (['---\n', '```\n', 'code\n'], [PROSE, FENCE, FENCE]),
+        # Front matter has to be at the start of the document
+        (['text\n', '---\n', 'a: b\n', '---\n'], [PROSE, PROSE, PROSE, PROSE]),
+        (['$$\n', 'x^2\n', '$$\n', 'text\n'], [MATH, MATH, MATH, PROSE]),
+        (['$$x$$\n', 'text\n'], [PROSE, PROSE]),
+        # Math blocks end at the end of a paragraph
+        (['$$ x\n', '\n', '#Head\n'], [MATH, PROSE, PROSE]),
+        ([], []),
+    ],
+)
+def test_classify_lines(lines: List[str], expected: List[str]):
+    assert classify_lines(lines) == expected
+
+
+@pytest.mark.parametrize(
+    'lines', [
+        ['text\n', '```python\n', '# code\n', '```\n', 'text\n'],
+        ['````\n', '```\n', '`````  \n', 'text\n', '~~~\n', 'code'],
+        ['---\n', 'title: x\n', '...\n', '$$\n', 'x^2\n', '\n', 'text\n'],
+        ['---\n', '```\n', 'code\n'],
+        ['$$ x\n', 'y $$\n', '```code``` text\n', '  ~~~\n', '  ~~~'],
+    ],
+)
+def test_find_regions_equals_classify_lines(lines: List[str]):
+    starts = [0, *accumulate(map(len, lines))]
+    contexts = [PROSE] * len(lines)
+    text = '\n' + ''.join(lines)
+    for start, end, context in find_regions(lines, text, starts):
+        contexts[start:end] = [context] * (end - start)
+    assert contexts == classify_lines(lines)
+
+
+def test_iter_line_contexts_accepts_iterators():
+    lines = ['---\n', 'a: b\n', '---\n', '```\n']
+    assert list(iter_line_contexts(iter(lines))) == [
+        ('---\n', FRONT_MATTER),
+        ('a: b\n', FRONT_MATTER),
+        ('---\n', FRONT_MATTER),
+        ('```\n', FENCE),
+    ]
@@ -0,0 +1,146 @@
+from typing import List
+
+import pytest
+
+from notesystem.modes.check_mode.check_mode import CheckMode
+from notesystem.modes.check_mode.errors.markdown_errors import MathError
+from notesystem.modes.check_mode.errors.markdown_errors import NewlineBeforeHeaderError  # noqa: E501
+from notesystem.modes.check_mode.errors.markdown_errors import SeperatorError
+from notesystem.modes.check_mode.errors.markdown_errors import TodoError
+from notesystem.modes.check_mode.rule_engine import RuleEngine
+
+
+def _found(engine: RuleEngine, lines: List[str]):
+    return [
+        (e['line_nr'], e['error_type'].get_error_name())
+        for e in engine.check(lines)
+    ]
+
+
+@pytest.mark.parametrize(
+    'lines,expected', [
+        (['[ ] todo\n'], [(0, 'todo-error')]),
+        (['   [x] indented todo\n'], [(0, 'todo-error')]),
+        (['- [ ] todo\n'], []),
+        (['Some $$math$$\n'], [(0, 'math-error')]),
+        (['#Heading\n'], [(0, 'required-space-after-header-symbol')]),
+        (
+            ['text\n', '#Heading\n'], [
+                (1, 'required-space-after-header-symbol'),
+                (1, 'newline-before-header-error'),
+            ],
+        ),
+        (
+            ['---\n', '# Heading\n'], [
+                (0, 'seperator-error'),
+                (1, 'newline-before-header-error'),
+            ],
+        ),
+        (['---\n', '\n', '# Heading\n'], []),
+        # The last line can not have a seperator error
+        (['text\n', '\n', '---'], []),
+        # The first line does not need a newline before it
+        (['# Heading\n'], []),
+        # Code blocks and front matter are not checked
+        (['```c\n', '#include <stdio.h>\n', '[ ] x\n', '```\n'], []),
+        (['---\n', 'title: x\n', '---\n', '\n', '#Heading\n'], [
+            (4, 'required-space-after-header-symbol'),
+        ]),
+        # Math errors are checked in math blocks
+        (['$$\n', 'x $$y$$ z\n'], [(1, 'math-error')]),
+        ([], []),
+    ],
+)
+def test_rule_engine_finds_errors(lines: List[str], expected):
+    engine = RuleEngine(CheckMode.possible_markdown_errors)
+    assert _found(engine, lines) == expected
+    found = [
+        (e['line_nr'], e['error_type'].get_error_name())
+        for e in engine.check_document(lines)
+    ]
+    assert found == expected
+
+
+def test_rule_engine_same_as_validate():
+    """Test that the engine finds the same errors as validate()"""
+    lines = [
+        '# Title\n', 'text $$math$$\n', '[ ] todo\n', '---\n', '#Head\n',
+        '\n', '##  ok\n', '  [x] done\n', '---\n', '\n', 'end $$a$$ $$b$$',
+    ]
+    expected = []
+    for line_nr, line in enumerate(lines):
+        for err in CheckMode.possible_markdown_errors:
+            if isinstance(err, SeperatorError):
+                if line_nr == len(lines) - 1:
+                    continue
+                valid = err.validate([line, lines[line_nr + 1]])
+            elif isinstance(err, NewlineBeforeHeaderError):
+                if line_nr == 0:
+                    continue
+                valid = err.validate([lines[line_nr - 1], line])
+            else:
+                valid = err.validate([line])
+            if not valid:
+                expected.append((line_nr, err.get_error_name()))
+
+    engine = RuleEngine(CheckMode.possible_markdown_errors)
+    assert _found(engine, lines) == expected
+
+
+def test_rule_engine_only_runs_given_rules():
+    engine = RuleEngine([MathError()])
+    assert _found(engine, ['[ ] todo $$x$$\n']) == [(0, 'math-error')]
+    engine = RuleEngine([TodoError()])
+    assert _found(engine, ['[ ] todo $$x$$\n']) == [(0, 'todo-error')]
+
+
+def test_rule_engine_iter_errors_accepts_iterators():
+    engine = RuleEngine(CheckMode.possible_markdown_errors)
+    errors = list(engine.iter_errors(iter(['text\n', '#Head\n']), 10))
+    assert [e['line_nr'] for e in errors] == [11, 11]
+
+
+def test_disabled_newline_before_header_error_is_not_returned(tmpdir):
+    file = tmpdir.join('test.md')
+    file.write('text\n# Heading\n')
+    check_mode = CheckMode()
+    check_mode._disabled_errors = [NewlineBeforeHeaderError.get_error_name()]
+    assert check_mode._check_file(file.strpath)['errors'] == []
+
+
+def test_iter_range_errors_equals_full_check():
+    """Test that checking a range gives the same errors as a full check"""
+    lines = [
+        'text\n', '#Heading\n', '---\n', '# Heading\n', '[ ] todo\n',
+        'text\n', '$$math$$\n', '\n', '```\n', '#code\n', '```\n',
+        '#Heading\n',
+    ]
+    engine = CheckMode()._get_rule_engine()
+    full = _found(engine, lines)
+    for start in range(len(lines)):
+        for end in range(start, len(lines) + 1):
+            found = [
+                (e['line_nr'], e['error_type'].get_error_name())
+                for e in engine.iter_range_errors(lines, start, end)
+            ]
+            assert found == [e for e in full if start <= e[0] < end]
+
+
+@pytest.mark.parametrize(
+    'lines', [
+        [
+            '---\n', 'title: x\n', '---\n', '#Heading\n', '[ ] todo\n',
+            '```\n', '#code\n', '[ ] x $$a$$\n', '````\n', 'text\n',
+            '  ~~~ py\n', '#code\n', '~~~\n', '$$\n', 'x $$y$$ z\n',
+            '\n', '---\n', '#Heading',
+        ],
+        # Lines can contain a newline, or miss it, when they come from
+        # somewhere else than a file
+        ['text\n#Heading\n', '#Heading'],
+        ['text', '#Heading\n'],
+        ['\t[ ] todo\n', '#\n', '---'],
+    ],
+)
+def test_check_document_equals_check(lines: List[str]):
+    engine = RuleEngine(CheckMode.possible_markdown_errors)
+    assert engine.check_document(lines) == engine.check(lines)